@@ -0,0 +1,61 @@
+"""
+Time safe_unicode_decode against the codec-based decoder it replaced, on
+generations of a few hundred KB.
+
+    python benchmarks/bench_unicode_decode.py [--size_kb 400] [--repeat 20]
+"""
+import argparse
+import codecs
+import os
+import re
+import sys
+import timeit
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from render_engine.render_utils import safe_unicode_decode  # noqa: E402
+
+
+def baseline_decode(text):
+    """The previous safe_unicode_decode of render_engine/main.py."""
+    try:
+        text = text.replace("&lt;", "<").replace("&gt;", ">")
+        return codecs.decode(text, "unicode_escape")
+    except Exception:
+        try:
+            fixed_text = re.sub(r'\\(?![\\\'\"abfnrtv]|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2})', r'\\\\', text)
+            return codecs.decode(fixed_text, "unicode_escape")
+        except Exception:
+            return text
+
+
+def generations(size_kb):
+    line = '<div class="card"><h2>Title {i}</h2><p>Some text for item {i}.</p></div>'
+    plain = "\n".join(line.format(i=i) for i in range(size_kb * 1024 // len(line)))
+    return {
+        "no escapes": plain,
+        "escaped": plain.replace("\n", "\\n").replace('"', '\\"'),
+        "escaped + non-ASCII": plain.replace("\n", "\\n").replace("Title", "Título 日本"),
+        "invalid escape": plain.replace("\n", "\\n") + " \\x4",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size_kb", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    print(f"{'input':<22}{'baseline ms':>14}{'safe_unicode_decode ms':>26}")
+    for name, text in generations(args.size_kb).items():
+        times = [
+            min(timeit.repeat(lambda: decode(text), number=1, repeat=args.repeat)) * 1000
+            for decode in (baseline_decode, safe_unicode_decode)
+        ]
+        print(f"{name:<22}{times[0]:>14.2f}{times[1]:>26.2f}")
+
+
+if __name__ == "__main__":
+    main()
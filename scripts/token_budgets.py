@@ -0,0 +1,87 @@
+"""
+Derive per-type max_tokens budgets from earlier inference outputs, for
+`structeval inference --max_tokens budgets.json`.
+
+The dataset has no reference outputs, so the budgets come from generations:
+per output type, a high percentile of the estimated token length of the
+generations that were not cut by a budget, with headroom for longer answers
+and for models that write more, rounded up. Types with too few generations
+are left out, so they run without a budget.
+
+    python scripts/token_budgets.py outputs/*.json [--percentile 95] [--headroom 1.5] [--output budgets.json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from concurrency import APPROX_CHARS_PER_TOKEN  # noqa: E402
+from render_engine.render_utils import determine_output_type  # noqa: E402
+
+
+def load_rows(path):
+    """Rows of an inference output (JSON list) or partial file (JSONL)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def token_lengths(paths):
+    """Estimated token lengths of the completed generations, by output type."""
+    lengths = defaultdict(list)
+    for path in paths:
+        for row in load_rows(path):
+            generation = row.get("generation")
+            if not generation or row.get("generation_stop") == "max_tokens":
+                continue
+            output_type = determine_output_type(row["task_id"])
+            if output_type:
+                lengths[output_type].append(len(generation) / APPROX_CHARS_PER_TOKEN)
+    return lengths
+
+
+def percentile(values, q):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)]
+
+
+def budgets(lengths, q=95.0, headroom=1.5, round_to=256, min_samples=20):
+    return {
+        output_type: math.ceil(percentile(values, q) * headroom / round_to) * round_to
+        for output_type, values in sorted(lengths.items())
+        if len(values) >= min_samples
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Inference outputs (.json) or partial files (.jsonl)")
+    parser.add_argument("--percentile", type=float, default=95.0)
+    parser.add_argument("--headroom", type=float, default=1.5)
+    parser.add_argument("--round_to", type=int, default=256)
+    parser.add_argument("--min_samples", type=int, default=20)
+    parser.add_argument("--output", help="JSON file to write (default: print)")
+    args = parser.parse_args()
+
+    lengths = token_lengths(args.paths)
+    result = budgets(lengths, args.percentile, args.headroom, args.round_to, args.min_samples)
+    for output_type, values in sorted(lengths.items()):
+        budget = result.get(output_type, "none (too few generations)")
+        print(f"{output_type:<12}{len(values):>6} generations, "
+              f"p{args.percentile:g} ~{percentile(values, args.percentile):.0f} tokens -> {budget}", file=sys.stderr)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ setup(
     install_requires=[
         "fire",
         "llm-engines",
+        "pyyaml",
         "playwright",
         "transformers",
         "sentencepiece",
@@ -24,9 +25,11 @@ setup(
         "pdf2image",
         "dotenv",
         "markdown",
-        "matplotlib"
+        "matplotlib",
+        "numpy",
+        "Pillow"
     ],
-    extras_require={}
+    extras_require={"fast": ["orjson", "pyahocorasick", "ijson"]}
 )
 
 
@@ -2,11 +2,127 @@ import fire
 import os
 import json
 import asyncio
+import glob
+import inspect
 from typing import Optional, List, Dict, Any
-from inference import run_inference
+from inference import generate_dataset, run_inference
 from render_engine.main import process_json_file as render_task
 from render_engine.render_utils import determine_output_type as get_rendering_type
 from eval_engine.main import evaluate_dataset
+from eval_engine.eval_utils import use_parse_cache
+from eval_engine.aggregate import aggregate_samples
+from pipeline import render_and_evaluate, run_benchmark
+from server import serve_forever
+from sharding import select_shard, shard_path
+from work_queue import WorkQueue, run_worker
+from results_store import ResultsStore
+
+
+def aggregate_sample_results(
+    evaluation_results: List[Dict[str, Any]], output_path: str, pass_threshold: float
+) -> Optional[Dict[str, Any]]:
+    """
+    Aggregate a multi-sample run (rows with sample_index) and write the
+    aggregates next to output_path as {name}_aggregate.json.
+    """
+    if not any("sample_index" in item for item in evaluation_results):
+        return None
+    aggregate = aggregate_samples(evaluation_results, pass_threshold=pass_threshold)
+    aggregate_path = f"{os.path.splitext(output_path)[0]}_aggregate.json"
+    with open(aggregate_path, "w", encoding="utf-8") as f:
+        json.dump(aggregate, f, indent=2)
+    print(f"Sample aggregates written to {aggregate_path}")
+    return aggregate
+
+
+def print_evaluation_summary(
+    evaluation_results: List[Dict[str, Any]],
+    sample_aggregate: Optional[Dict[str, Any]] = None,
+):
+    """Print the score summary of an evaluation run."""
+    total_tasks = len(evaluation_results)
+    avg_score = (
+        sum(item.get("final_eval_score", 0) for item in evaluation_results)
+        / total_tasks
+        if total_tasks > 0
+        else 0
+    )
+
+    print("\n=== EVALUATION SUMMARY ===")
+    print(f"Total tasks evaluated: {total_tasks}")
+    print(f"Average score: {avg_score:.2f}")
+
+    # Summarize by input/output types
+    renderable = [i for i in evaluation_results if i.get("rendering", False)]
+    non_renderable = [
+        i for i in evaluation_results if not i.get("rendering", False)
+    ]
+
+    print(
+        f"Renderable tasks: {len(renderable)}, Avg score: {sum(i.get('final_eval_score', 0) for i in renderable) / len(renderable) if renderable else 0:.2f}"
+    )
+    print(
+        f"Non-renderable tasks: {len(non_renderable)}, Avg score: {sum(i.get('final_eval_score', 0) for i in non_renderable) / len(non_renderable) if non_renderable else 0:.2f}"
+    )
+
+    truncated = [i for i in evaluation_results if i.get("generation_stop") == "max_tokens"]
+    if truncated:
+        print(
+            f"Generations cut at max_tokens: {len(truncated)}, Avg score: {sum(i.get('final_eval_score', 0) for i in truncated) / len(truncated):.2f}"
+        )
+
+    if sample_aggregate:
+        def format_group(summary):
+            metrics = ", ".join(f"{key}: {value:.2f}" for key, value in summary.items() if key.startswith("pass@"))
+            return f"{summary['num_tasks']} tasks, Mean score: {summary['mean_score']:.2f}, {metrics}"
+
+        print(f"Samples: {format_group(sample_aggregate['overall'])}")
+        for name, summary in sample_aggregate["categories"].items():
+            print(f"  {name}: {format_group(summary)}")
+        for code, summary in sample_aggregate["types"].items():
+            print(f"  type {code}: {format_group(summary)}")
+
+    parse_failures = sum(i.get("VQA_parse_failures", 0) for i in evaluation_results)
+    retried_questions = sum(i.get("VQA_retried_questions", 0) for i in evaluation_results)
+    if parse_failures or retried_questions:
+        print(f"VQA retries: {parse_failures} unparseable responses, {retried_questions} questions asked again")
+
+    cache_lookups = [i["VQA_cache_hit"] for i in evaluation_results if "VQA_cache_hit" in i]
+    if cache_lookups:
+        cache_hits = sum(cache_lookups)
+        print(
+            f"VQA cache: {cache_hits} hits, {len(cache_lookups) - cache_hits} misses ({cache_hits / len(cache_lookups):.0%} hit rate)"
+        )
+
+
+def apply_sharding(
+    data: List[Dict[str, Any]],
+    path: str,
+    shard_index: int,
+    num_shards: int,
+    balance_shards: bool,
+):
+    """Select a command's shard and the shard's file name for path."""
+    if num_shards <= 1:
+        return data, path
+    shard = select_shard(data, shard_index, num_shards, balance_shards)
+    print(f"Shard {shard_index} of {num_shards}: {len(shard)} of {len(data)} tasks")
+    return shard, shard_path(path, shard_index, num_shards)
+
+
+def open_results_store(
+    path: Optional[str], run_id: Optional[str], input_path: str
+) -> tuple:
+    """
+    The results store at path (None if no path) and the run a command's
+    results belong to: run_id, else the run that wrote input_path, else
+    input_path's file name.
+    """
+    if not path:
+        return None, None
+    store = ResultsStore(path)
+    run_id = run_id or store.find_run(input_path) or os.path.splitext(os.path.basename(input_path))[0]
+    return store, run_id
 
 
 class StructEvalCLI:
@@ -20,47 +136,136 @@ class StructEvalCLI:
         llm_engine: str,
         input_path: str,
         output_path: str,
+        generation_cache_path: Optional[str] = None,
+        generation_cache: str = "use",
+        partial_path: Optional[str] = None,
+        resume: bool = False,
+        stop: Optional[List[str]] = None,
+        max_tokens: Optional[Any] = None,
+        prompt_layout: str = "suffix",
+        dispatch_order: str = "dataset",
+        num_samples: int = 1,
+        shard_index: int = 0,
+        num_shards: int = 1,
+        balance_shards: bool = False,
+        results_store: Optional[str] = None,
+        run_id: Optional[str] = None,
         **kwargs,
     ):
-        """Run inference on the input dataset using the specified LLM."""
+        """
+        Run inference on the input dataset using the specified LLM.
+        With --generation_cache_path, generations are cached there and reused when
+        the model, engine, prompt and sampling params match; --generation_cache=refresh
+        regenerates and overwrites them, --generation_cache=off bypasses the cache.
+        Sampling is not greedy, so a cached run repeats the same samples.
+
+        Each completed generation is appended to --partial_path (default:
+        {output_path}.partial.jsonl) as it arrives. With --resume only the tasks
+        without a completed generation there are dispatched; otherwise the file
+        is started over. The output file is written in dataset order at the end.
+
+        Generation stops at <|END_CODE|> and any --stop sequences. No max_tokens
+        budget is sent unless --max_tokens gives one number for every type, a
+        dict of budgets by type, or a JSON file of them (such as
+        scripts/token_budgets.py derives from an earlier run). Every task
+        records its budget and whether it was likely cut by it
+        ("generation_stop").
+
+        --prompt_layout=prefix or system moves the shared output instruction in
+        front of the query or into the system message, where engines with
+        prefix caching reuse it; --dispatch_order=longest_first sends the tasks
+        with the largest budgets first. The output keeps the dataset order.
+
+        --num_samples=k generates k completions per task (with the engine's
+        native n where supported). Each becomes its own row with task_id
+        {task_id}_s{i}, base_task_id and sample_index, so render and evaluate
+        process every sample and the evaluation summary reports mean and pass@k.
+
+        With --num_shards=n, only the tasks of shard --shard_index (by a stable
+        hash of task_id, or balanced by expected cost per output type with
+        --balance_shards) are processed and the output goes to
+        {name}.shard{i}-of-{n}.json; combine the shards with `merge`.
+
+        With --results_store=path, each generation is also written to that
+        SQLite results store as it completes, under --run_id (default:
+        llm_model_name); later stages reading the output file add to the same run.
+        """
         with open(input_path, "r", encoding="utf-8") as file:
             data = json.load(file)
+        data, output_path = apply_sharding(data, output_path, shard_index, num_shards, balance_shards)
+        store = ResultsStore(results_store) if results_store else None
+        run_id = run_id or llm_model_name
 
-        queries = [
-            f"""{item['query']}
-            \n\nIMPORTANT: Only output the required output format. You must start the format/code with <|BEGIN_CODE|> and end the format/code with  <|END_CODE|>. No other text output (explanation, comments, etc.) are allowed.  Do not use markdown code fences.
-            {"\n\n/no_think" if llm_model_name == "Qwen/Qwen3-4B" else ""}
-            """
-            for item in data
-        ]
- 
-        if llm_model_name == "Qwen/Qwen3-4B":
-            print("Qwen3-4B I'm here")
-
-        generations = run_inference(llm_model_name, llm_engine, queries, **kwargs)
-
-        output_data = []
-        for item, generation in zip(data, generations):
-            item["generation"] = generation
-            output_data.append(item)
+        output_data = generate_dataset(
+            data,
+            llm_model_name,
+            llm_engine,
+            partial_path=partial_path or f"{output_path}.partial.jsonl",
+            resume=resume,
+            generation_cache_path=generation_cache_path,
+            generation_cache=generation_cache,
+            stop=stop,
+            max_tokens=max_tokens,
+            prompt_layout=prompt_layout,
+            dispatch_order=dispatch_order,
+            num_samples=num_samples,
+            results_store=store,
+            run_id=run_id,
+            **kwargs,
+        )
 
         with open(output_path, "w", encoding="utf-8") as out_file:
             json.dump(output_data, out_file, indent=2)
 
+        if store is not None:
+            store.start_run(run_id, llm_model=llm_model_name, paths=[output_path])
+            store.close()
+
         return output_path
 
     async def render(
-        self, input_path: str, img_output_path: str, non_renderable_output_dir: str
+        self,
+        input_path: str,
+        img_output_path: str,
+        non_renderable_output_dir: str,
+        save_non_renderable_files: bool = True,
+        parse_cache_path: Optional[str] = None,
+        shard_index: int = 0,
+        num_shards: int = 1,
+        balance_shards: bool = False,
+        results_store: Optional[str] = None,
+        run_id: Optional[str] = None,
     ):
         """
         Render the generated code to images using the render engine.
+        With --save_non_renderable_files=False, non-renderable code is kept in
+        the output JSON (extracted_code) instead of non_renderable_output_dir.
+        With --parse_cache_path, the structures parsed to validate non-renderable
+        code are stored there, and evaluate given the same path reuses them.
+
+        With --num_shards=n, the tasks of shard --shard_index are written to
+        {input name}.shard{i}-of-{n}.json and rendered there, leaving input_path
+        untouched (see inference for how tasks are assigned).
+
+        With --results_store=path, each render result is written to that
+        results store as it completes (see inference for how the run is found).
         """
         os.makedirs(img_output_path, exist_ok=True)
         os.makedirs(non_renderable_output_dir, exist_ok=True)
+        use_parse_cache(parse_cache_path)
 
         # Get metadata about renderable tasks
         with open(input_path, "r", encoding="utf-8") as f:
             tasks = json.load(f)
+        store, run_id = open_results_store(results_store, run_id, input_path)
+
+        if num_shards > 1:
+            shard, shard_file = apply_sharding(tasks, input_path, shard_index, num_shards, balance_shards)
+            # A shard file from a sharded inference is rendered in place
+            if len(shard) < len(tasks):
+                tasks, input_path = shard, shard_file
+                with open(input_path, "w", encoding="utf-8") as f:
+                    json.dump(tasks, f, indent=2)
 
         total_tasks = len(tasks)
         renderable_tasks = sum(1 for task in tasks if task.get("rendering", False))
@@ -78,8 +283,23 @@ class StructEvalCLI:
             f"Found {renderable_tasks} renderable tasks out of {total_tasks} total tasks."
         )
 
+        on_rendered = None
+        if store is not None:
+            store.start_run(run_id, paths=[input_path])
+
+            def on_rendered(task):
+                store.record_render(run_id, task)
+
         # Process rendering
-        await render_task(input_path, img_output_path, non_renderable_output_dir)
+        await render_task(
+            input_path,
+            img_output_path,
+            non_renderable_output_dir,
+            save_non_renderable_files,
+            on_rendered=on_rendered,
+        )
+        if store is not None:
+            store.close()
 
     def evaluate(
         self,
@@ -89,15 +309,51 @@ class StructEvalCLI:
         output_path: str,
         img_path: str,
         non_renderable_output_dir: str,
+        streaming_validation: bool = False,
+        parse_cache_path: Optional[str] = None,
+        vqa_num_proc: int = 8,
+        vqa_cache_path: Optional[str] = None,
+        vqa_cache_mode: str = "exact",
+        pass_threshold: float = 1.0,
+        shard_index: int = 0,
+        num_shards: int = 1,
+        balance_shards: bool = False,
+        results_store: Optional[str] = None,
+        run_id: Optional[str] = None,
         **kwargs,
     ):
         """
         Evaluate the generated code from the LLM.
+        With --streaming_validation, non-renderable outputs are checked while
+        parsing, materializing only the parts raw_output_metric refers to.
+        With --parse_cache_path, structures already parsed by render (given the
+        same path) are reused instead of parsed again.
+        --vqa_num_proc sets how many VLM requests are in flight at once.
+        VQA verdicts are cached per task in --vqa_cache_path if it is given;
+        --vqa_cache_mode=phash also reuses them for near-identical images.
+        Image preprocessing options (--vqa_max_image_side, --vqa_crop_whitespace,
+        --vqa_preprocess_workers, --vqa_debug_images_dir), --vqa_max_retries and
+        --vqa_adaptive_concurrency/--vqa_max_concurrency and the --vqa_hedge_*
+        options are passed on to vqa_eval.
+        For multi-sample inference output, mean score and pass@k (a sample
+        passes at final_eval_score >= --pass_threshold) are reported per task,
+        type code and category, and written to {output_path stem}_aggregate.json.
+
+        With --num_shards=n, only the tasks of shard --shard_index (by a stable
+        hash of task_id, or balanced by expected cost per output type with
+        --balance_shards) are processed and the output goes to
+        {name}.shard{i}-of-{n}.json; combine the shards with `merge`.
+
+        With --results_store=path, the scores and VQA verdicts are also written
+        to that results store (see inference for how the run is found).
         """
         print(f"Evaluating model with vlm_model_name: {vlm_model_name}")
+        use_parse_cache(parse_cache_path)
 
         with open(input_path, "r", encoding="utf-8") as file:
             data = json.load(file)
+        store, run_id = open_results_store(results_store, run_id, input_path)
+        data, output_path = apply_sharding(data, output_path, shard_index, num_shards, balance_shards)
 
         images = {
             item["task_id"]: f"{img_path}/{item['task_id']}.png"
@@ -138,40 +394,427 @@ class StructEvalCLI:
             vlm_model_name,
             vlm_engine,
             non_renderable_dir=non_renderable_dir,
+            streaming_validation=streaming_validation,
+            vqa_num_proc=vqa_num_proc,
+            vqa_cache_path=vqa_cache_path,
+            vqa_cache_mode=vqa_cache_mode,
             **kwargs,
         )
 
         with open(output_path, "w", encoding="utf-8") as out_file:
             json.dump(evaluation_results, out_file, indent=2)
 
-        # Print summary statistics
-        total_tasks = len(evaluation_results)
-        avg_score = (
-            sum(item.get("final_eval_score", 0) for item in evaluation_results)
-            / total_tasks
-            if total_tasks > 0
-            else 0
+        if store is not None:
+            store.start_run(run_id, vlm_model=vlm_model_name, paths=[output_path])
+            store.record_evaluation(run_id, evaluation_results)
+            store.close()
+
+        sample_aggregate = aggregate_sample_results(evaluation_results, output_path, pass_threshold)
+        print_evaluation_summary(evaluation_results, sample_aggregate)
+
+        return output_path
+
+    async def pipeline(
+        self,
+        vlm_model_name: str,
+        vlm_engine: str,
+        input_path: str,
+        output_path: str,
+        img_output_path: str,
+        non_renderable_output_dir: str,
+        save_non_renderable_files: bool = True,
+        streaming_validation: bool = False,
+        queue_size: int = 16,
+        pass_threshold: float = 1.0,
+        results_store: Optional[str] = None,
+        run_id: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Render and evaluate in one pass. Each rendered task goes straight to
+        evaluation, so VQA overlaps with rendering; --queue_size bounds how many
+        rendered tasks wait for evaluation. input_path and output_path end up
+        the same as running render, then evaluate. Takes the render and
+        evaluate options, and --results_store as render and evaluate do.
+        """
+        with open(input_path, "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+
+        store, run_id = open_results_store(results_store, run_id, input_path)
+        on_rendered = None
+        if store is not None:
+            store.start_run(run_id, vlm_model=vlm_model_name, paths=[input_path, output_path])
+
+            def on_rendered(task):
+                store.record_render(run_id, task)
+
+        evaluation_results = await render_and_evaluate(
+            tasks,
+            img_output_path,
+            non_renderable_output_dir,
+            vlm_model_name,
+            vlm_engine,
+            save_non_renderable_files=save_non_renderable_files,
+            streaming_validation=streaming_validation,
+            queue_size=queue_size,
+            on_rendered=on_rendered,
+            **kwargs,
         )
+        if store is not None:
+            store.record_evaluation(run_id, evaluation_results)
+            store.close()
 
-        print("\n=== EVALUATION SUMMARY ===")
-        print(f"Total tasks evaluated: {total_tasks}")
-        print(f"Average score: {avg_score:.2f}")
+        # Rendered tasks are saved back to the input file, as render does
+        with open(input_path, "w", encoding="utf-8") as f:
+            json.dump(tasks, f, indent=2)
 
-        # Summarize by input/output types
-        renderable = [i for i in evaluation_results if i.get("rendering", False)]
-        non_renderable = [
-            i for i in evaluation_results if not i.get("rendering", False)
-        ]
+        with open(output_path, "w", encoding="utf-8") as out_file:
+            json.dump(evaluation_results, out_file, indent=2)
 
-        print(
-            f"Renderable tasks: {len(renderable)}, Avg score: {sum(i.get('final_eval_score', 0) for i in renderable) / len(renderable) if renderable else 0:.2f}"
+        sample_aggregate = aggregate_sample_results(evaluation_results, output_path, pass_threshold)
+        print_evaluation_summary(evaluation_results, sample_aggregate)
+
+        return output_path
+
+    async def run(
+        self,
+        llm_model_name: str,
+        llm_engine: str,
+        vlm_model_name: str,
+        vlm_engine: str,
+        input_path: str,
+        output_dir: str,
+        resume: bool = False,
+        save_non_renderable_files: bool = True,
+        streaming_validation: bool = False,
+        queue_size: int = 16,
+        pass_threshold: float = 1.0,
+        results_store: Optional[str] = None,
+        run_id: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Inference, render and evaluate in one process, with the tasks passed
+        between the stages in memory. output_dir receives the inference
+        checkpoint (inference_output.json), rendered_images/,
+        non_renderable_format_files/ and evaluation_results.json; --resume
+        keeps the generations of an interrupted run. Takes the inference
+        options and the evaluate options. With --results_store=path, every
+        stage writes to that results store under --run_id (default: llm_model_name).
+        """
+        with open(input_path, "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+
+        # Options of inference go to inference, the rest to evaluation
+        inference_params = {
+            name
+            for func in (generate_dataset, run_inference)
+            for name, param in inspect.signature(func).parameters.items()
+            if param.default is not inspect.Parameter.empty
+        }
+        inference_options = {key: kwargs.pop(key) for key in list(kwargs) if key in inference_params}
+        store = ResultsStore(results_store) if results_store else None
+
+        evaluation_results = await run_benchmark(
+            tasks,
+            llm_model_name,
+            llm_engine,
+            vlm_model_name,
+            vlm_engine,
+            output_dir,
+            resume=resume,
+            save_non_renderable_files=save_non_renderable_files,
+            streaming_validation=streaming_validation,
+            queue_size=queue_size,
+            inference_options=inference_options,
+            results_store=store,
+            run_id=run_id,
+            **kwargs,
         )
-        print(
-            f"Non-renderable tasks: {len(non_renderable)}, Avg score: {sum(i.get('final_eval_score', 0) for i in non_renderable) / len(non_renderable) if non_renderable else 0:.2f}"
+        if store is not None:
+            store.close()
+
+        output_path = os.path.join(output_dir, "evaluation_results.json")
+        sample_aggregate = aggregate_sample_results(evaluation_results, output_path, pass_threshold)
+        print_evaluation_summary(evaluation_results, sample_aggregate)
+
+        return output_path
+
+    def merge(
+        self,
+        output_path: str,
+        num_shards: Optional[int] = None,
+        input_paths: Optional[List[str]] = None,
+        dataset_path: Optional[str] = None,
+        pass_threshold: float = 1.0,
+    ):
+        """
+        Combine the shard files of a sharded command into output_path. The
+        shards are {name}.shard{i}-of-{n}.json next to output_path (or
+        --input_paths). Fails if a shard file is missing, a task appears twice
+        or, with --dataset_path, a dataset task is in no shard. Rows are written
+        in dataset order (task_id order without --dataset_path) and the
+        evaluation summary is recomputed over all shards.
+        """
+        if not input_paths:
+            root, ext = os.path.splitext(output_path)
+            if num_shards is None:
+                found = glob.glob(f"{glob.escape(root)}.shard*-of-*{ext}")
+                counts = {int(path.rsplit("-of-", 1)[1][: -len(ext) or None]) for path in found}
+                if len(counts) != 1:
+                    raise ValueError(f"Cannot tell the number of shards of {output_path} from {sorted(found)}")
+                num_shards = counts.pop()
+            input_paths = [shard_path(output_path, i, num_shards) for i in range(num_shards)]
+
+        missing_files = [path for path in input_paths if not os.path.exists(path)]
+        if missing_files:
+            raise ValueError(f"Missing shard files: {missing_files}")
+
+        rows = []
+        for path in input_paths:
+            with open(path, "r", encoding="utf-8") as f:
+                rows.extend(json.load(f))
+
+        counts = {}
+        for row in rows:
+            counts[row["task_id"]] = counts.get(row["task_id"], 0) + 1
+        duplicates = sorted(task_id for task_id, count in counts.items() if count > 1)
+        if duplicates:
+            raise ValueError(f"{len(duplicates)} tasks appear in more than one shard: {duplicates[:20]}")
+
+        if dataset_path:
+            with open(dataset_path, "r", encoding="utf-8") as f:
+                order = {item["task_id"]: idx for idx, item in enumerate(json.load(f))}
+            present = {row.get("base_task_id", row["task_id"]) for row in rows}
+            missing = [task_id for task_id in order if task_id not in present]
+            unknown = sorted(present - order.keys())
+            if missing or unknown:
+                raise ValueError(
+                    f"{len(missing)} dataset tasks are in no shard: {missing[:20]}; "
+                    f"{len(unknown)} tasks are not in the dataset: {unknown[:20]}"
+                )
+            rows.sort(key=lambda row: (order[row.get("base_task_id", row["task_id"])], row.get("sample_index", 0)))
+        else:
+            rows.sort(key=lambda row: row["task_id"])
+
+        for row in rows:
+            row.pop("shard", None)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Merged {len(rows)} tasks from {len(input_paths)} shards into {output_path}")
+
+        if any("final_eval_score" in row for row in rows):
+            sample_aggregate = aggregate_sample_results(rows, output_path, pass_threshold)
+            print_evaluation_summary(rows, sample_aggregate)
+        elif any("generation" in row for row in rows):
+            failed = sum(1 for row in rows if row.get("generation") is None)
+            print(f"Generations: {len(rows) - failed} completed, {failed} missing")
+
+        return output_path
+
+    def enqueue(
+        self,
+        input_path: str,
+        queue_path: str,
+        img_output_path: str,
+        non_renderable_output_dir: str,
+        vlm_model_name: Optional[str] = None,
+        vlm_engine: Optional[str] = None,
+        save_non_renderable_files: bool = True,
+        streaming_validation: bool = False,
+        retry_failed: bool = False,
+        **kwargs,
+    ):
+        """
+        Publish a render + evaluate job per task of input_path to the queue at
+        queue_path, for `structeval worker` processes to pick up. Takes the
+        pipeline options; image and file directories must be reachable by every
+        worker. Publishing again only adds tasks that are not queued yet, and
+        --retry_failed puts failed jobs back.
+        """
+        with open(input_path, "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+
+        options = {
+            "img_output_path": img_output_path,
+            "non_renderable_output_dir": non_renderable_output_dir,
+            "vlm_model_name": vlm_model_name,
+            "vlm_engine": vlm_engine,
+            "save_non_renderable_files": save_non_renderable_files,
+            "streaming_validation": streaming_validation,
+            **kwargs,
+        }
+        work_queue = WorkQueue(queue_path)
+        try:
+            added = work_queue.publish(tasks, options)
+            if retry_failed:
+                print(f"Retrying {work_queue.reset_failed()} failed jobs")
+            counts = work_queue.counts()
+        finally:
+            work_queue.close()
+        print(f"Published {added} new jobs to {queue_path}: {counts}")
+        return queue_path
+
+    def worker(
+        self,
+        queue_path: str,
+        worker_id: Optional[str] = None,
+        batch_size: int = 1,
+        poll_interval: float = 5.0,
+        exit_when_empty: bool = True,
+        visibility_timeout: float = 300.0,
+        max_attempts: int = 3,
+        warm_angular: bool = True,
+        warm_latex: bool = True,
+    ):
+        """
+        Render and evaluate jobs from the queue at queue_path until it is
+        drained. Start as many workers as wanted, on one or several machines
+        sharing the queue file; each leases the next job when it is free, so
+        slow renderers do not hold up the others. Jobs of a worker that stops
+        responding are handed out again after --visibility_timeout seconds.
+        """
+        stats = run_worker(
+            queue_path,
+            worker_id=worker_id,
+            batch_size=batch_size,
+            poll_interval=poll_interval,
+            exit_when_empty=exit_when_empty,
+            visibility_timeout=visibility_timeout,
+            max_attempts=max_attempts,
+            warm_angular=warm_angular,
+            warm_latex=warm_latex,
         )
+        print(f"Worker finished: {stats['completed']} jobs completed, {stats['failed']} failed")
+        return stats
 
+    def collect(self, queue_path: str, output_path: str, pass_threshold: float = 1.0):
+        """
+        Write the results of the queue at queue_path to output_path in input
+        order, like the output of `structeval pipeline`, and print the
+        evaluation summary. Unfinished jobs are written as published, failed
+        ones with their error in queue_error.
+        """
+        work_queue = WorkQueue(queue_path)
+        try:
+            counts = work_queue.counts()
+            results = work_queue.results()
+        finally:
+            work_queue.close()
+
+        if counts["pending"] or counts["leased"] or counts["failed"]:
+            print(
+                f"Warning: {counts['pending']} jobs pending, {counts['leased']} in progress, "
+                f"{counts['failed']} failed; only the {counts['done']} done jobs are scored"
+            )
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+        evaluated = [item for item in results if "final_eval_score" in item]
+        if evaluated:
+            sample_aggregate = aggregate_sample_results(evaluated, output_path, pass_threshold)
+            print_evaluation_summary(evaluated, sample_aggregate)
         return output_path
 
+    def import_results(
+        self,
+        results_store: str,
+        input_path: str,
+        run_id: Optional[str] = None,
+        llm_model_name: Optional[str] = None,
+        vlm_model_name: Optional[str] = None,
+    ):
+        """
+        Load an existing inference or evaluation JSON file into the results
+        store at results_store, as run --run_id (default: the run that wrote
+        input_path, else its file name).
+        """
+        with open(input_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+
+        store, run_id = open_results_store(results_store, run_id, input_path)
+        try:
+            store.start_run(run_id, llm_model_name, vlm_model_name, paths=[input_path])
+            store.add_tasks(rows)
+            if any("generation" in row for row in rows):
+                store.record_generations(run_id, rows)
+            evaluated = [row for row in rows if "final_eval_score" in row]
+            if evaluated:
+                store.record_evaluation(run_id, evaluated)
+        finally:
+            store.close()
+        print(f"Imported {len(rows)} rows ({len(evaluated)} evaluated) into {results_store} as run {run_id}")
+        return run_id
+
+    def leaderboard(
+        self,
+        results_store: str,
+        by: Optional[str] = None,
+        model: Optional[str] = None,
+        type_code: Optional[str] = None,
+        input_type: Optional[str] = None,
+        run_ids: Optional[List[str]] = None,
+        pass_threshold: float = 1.0,
+        compare: Optional[List[str]] = None,
+        task_id: Optional[str] = None,
+    ):
+        """
+        Print average scores per run from the results store, best first,
+        optionally per --by (type_code, input_type or category) and filtered
+        by --model, --type_code, --input_type or --run_ids. --compare=run_a,run_b
+        lists the tasks whose score differs most between two runs instead, and
+        --task_id the scores of one task in every run.
+        """
+        store = ResultsStore(results_store)
+        try:
+            if compare:
+                rows = store.compare(*compare)
+            elif task_id:
+                rows = store.task_scores(task_id)
+            else:
+                rows = store.leaderboard(by, model, type_code, input_type, run_ids, pass_threshold)
+        finally:
+            store.close()
+
+        if not rows:
+            print("No results")
+            return
+        columns = list(rows[0])
+        cells = [[("" if row[c] is None else str(row[c])) for c in columns] for row in rows]
+        widths = [max(len(c), *(len(line[i]) for line in cells)) for i, c in enumerate(columns)]
+        print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+        for line in cells:
+            print("  ".join(cell.ljust(w) for cell, w in zip(line, widths)))
+
+    def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix_socket: Optional[str] = None,
+        vlm_model_name: Optional[str] = None,
+        vlm_engine: Optional[str] = None,
+        warm_angular: bool = True,
+        warm_latex: bool = True,
+        **kwargs,
+    ):
+        """
+        Keep the browser, Angular workspace, LaTeX preamble and VLM warm and
+        accept render/evaluate/pipeline jobs over a local HTTP API (or a Unix
+        socket with --unix_socket). Each job takes the options of the matching
+        command, e.g.
+            curl -X POST localhost:8765/evaluate -d '{"input_path": "out.json", "img_path": "images"}'
+        """
+        serve_forever(
+            host,
+            port,
+            unix_socket,
+            vlm_model_name=vlm_model_name,
+            vlm_engine=vlm_engine,
+            warm_angular=warm_angular,
+            warm_latex=warm_latex,
+            **kwargs,
+        )
+
 
 def main():
     def async_to_sync(async_func):
@@ -183,6 +826,8 @@ def main():
     StructEvalCLI.render = async_to_sync(StructEvalCLI.render)
     StructEvalCLI.evaluate = async_to_sync(StructEvalCLI.evaluate)
     StructEvalCLI.inference = async_to_sync(StructEvalCLI.inference)
+    StructEvalCLI.pipeline = async_to_sync(StructEvalCLI.pipeline)
+    StructEvalCLI.run = async_to_sync(StructEvalCLI.run)
 
     fire.Fire(StructEvalCLI)
 
@@ -0,0 +1,400 @@
+import re
+import time
+import random
+import logging
+import functools
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+# Concurrency control for requests to hosted engines, shared by inference and
+# VQA. The limit follows AIMD: it grows by one per window of healthy requests
+# and is halved on rate-limit or timeout responses, after which all requests
+# pause for a jittered exponential backoff before the throttled one is retried.
+# Requests still running past a latency percentile can be hedged with a
+# duplicate, within a budget, and the first response wins.
+#
+# llm_engines' call_model reports any failure as None, so a None result is a
+# failure here: the limiter retries it and the hedger waits for the other
+# request. The limiter is the only retry layer, models are loaded without the
+# engine's own retries (see take_retry_budget).
+
+# Engines return text only, so token throughput is estimated from the length
+APPROX_CHARS_PER_TOKEN = 3.5
+
+_THROTTLE_STATUS = re.compile(r"\b(429|529)\b")
+_THROTTLE_MARKERS = ("rate limit", "rate_limit", "too many requests", "overloaded")
+_TIMEOUT_MARKERS = ("timeout", "timed out", "deadline exceeded")
+
+
+def root_error(error: BaseException) -> BaseException:
+    """
+    The error behind an llm_engines MaxRetriesExceededError, which is raised
+    while handling the engine's own exception and keeps it as __context__.
+    """
+    while type(error).__name__ == "MaxRetriesExceededError":
+        inner = error.__cause__ or error.__context__
+        if inner is None:
+            break
+        error = inner
+    return error
+
+
+def engine_call(llm: Any, model_name: str) -> Callable[..., Any]:
+    """
+    Request function for model_name on a loaded LLMEngine, taking the
+    arguments of call_model after the model name. It returns None for a
+    failed request, which the limiter and the hedger count as a failure.
+    """
+    return functools.partial(llm.call_model, model_name)
+
+
+def take_retry_budget(kwargs: Dict[str, Any], default: int = 5) -> int:
+    """
+    Remove llm_engines' max_retry from the load_model kwargs and return it as
+    the limiter's retry budget (default if unset). The engine then makes one
+    attempt per call, so a request is sent at most budget + 1 times instead
+    of the product of both retry counts.
+    """
+    max_retry = kwargs.pop("max_retry", None)
+    return default if max_retry is None else max(0, int(max_retry))
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """
+    "throttle" for rate-limit responses, "timeout" for timeouts, None for
+    other failures. Works on the exception types of the common API clients
+    without importing them.
+    """
+    error = root_error(error)
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in (429, 529):
+        return "throttle"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    name = type(error).__name__.lower()
+    message = str(error).lower()
+    if "ratelimit" in name or _THROTTLE_STATUS.search(message) or any(m in message for m in _THROTTLE_MARKERS):
+        return "throttle"
+    if "timeout" in name or any(marker in message for marker in _TIMEOUT_MARKERS):
+        return "timeout"
+    return None
+
+
+def estimate_tokens(output: Any) -> int:
+    """Approximate token count of a completion (or a list of completions)."""
+    if isinstance(output, str):
+        return int(len(output) / APPROX_CHARS_PER_TOKEN)
+    if isinstance(output, list):
+        return sum(estimate_tokens(o) for o in output)
+    return 0
+
+
+class AdaptiveLimiter:
+    """
+    Bounds the requests in flight and adapts the bound to the engine.
+
+    Args:
+        initial: Starting concurrency (the command's num_proc)
+        max_limit: Upper bound (default: 4x initial when adaptive)
+        min_limit: Lower bound
+        adaptive: Grow and shrink the limit; False keeps it at initial, with
+            rate-limit backoff still applied
+        max_retries: Retries of a throttled, timed-out or failed (None) request
+        backoff_base: First backoff in seconds, doubled per consecutive throttle
+            and per retry of a failed request
+        backoff_max: Longest backoff in seconds
+        latency_tolerance: Growth stops while the average latency exceeds this
+            multiple of the best average seen
+        report_interval: Seconds between throughput reports, 0 to disable
+        name: Label of the reports
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        max_limit: Optional[int] = None,
+        min_limit: int = 1,
+        adaptive: bool = True,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        latency_tolerance: float = 3.0,
+        report_interval: float = 30.0,
+        name: str = "requests",
+    ):
+        self.min_limit = max(1, min_limit)
+        self.limit = max(self.min_limit, initial)
+        self.max_limit = max(self.limit, max_limit or (4 * self.limit if adaptive else self.limit))
+        self.adaptive = adaptive
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_tolerance = latency_tolerance
+        self.report_interval = report_interval
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._consecutive_throttles = 0
+        self._healthy_streak = 0
+        self._last_decrease = 0.0
+        self._latency = None  # EWMA of successful request latency
+        self._best_latency = None
+        self._error_rate = 0.0  # EWMA of non-throttle failures
+
+        self._started = time.time()
+        self._last_report = self._started
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.tokens = 0
+
+    @property
+    def max_workers(self) -> int:
+        """Threads needed so that the limiter, not the pool, is the bound."""
+        return self.max_limit
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._resume_at - time.time()
+                if wait <= 0 and self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, latency: float, outcome: Optional[str] = None, tokens: int = 0) -> None:
+        """
+        Args:
+            latency: Seconds the request took
+            outcome: None for success, "throttle", "timeout" or "error"
+            tokens: Output tokens of a successful request
+        """
+        now = time.time()
+        with self._cond:
+            self._in_flight -= 1
+            if outcome is None:
+                self.completed += 1
+                self.tokens += tokens
+                self._consecutive_throttles = 0
+                self._error_rate *= 0.9
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                self._best_latency = min(self._best_latency or self._latency, self._latency)
+                self._grow(now)
+            elif outcome in ("throttle", "timeout"):
+                if outcome == "throttle":
+                    self.throttled += 1
+                else:
+                    self.timeouts += 1
+                # Responses to requests sent before the pause belong to the
+                # same event and do not lengthen the backoff
+                if now >= self._resume_at:
+                    self._consecutive_throttles += 1
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** (self._consecutive_throttles - 1))
+                    self._resume_at = now + delay / 2 + random.uniform(0, delay / 2)
+                self._shrink(now, factor=0.5)
+            else:
+                self.failed += 1
+                self._error_rate = 0.9 * self._error_rate + 0.1
+            self._cond.notify_all()
+            report = bool(self.report_interval) and now - self._last_report >= self.report_interval
+            if report:
+                self._last_report = now
+        if report:
+            print(self.report())
+
+    def _grow(self, now: float) -> None:
+        if not self.adaptive:
+            return
+        if self._latency > self.latency_tolerance * self._best_latency:
+            # Latency degraded: the engine is queueing, back off gently
+            self._shrink(now, factor=None)
+            return
+        if self._error_rate > 0.1 or self.limit >= self.max_limit:
+            return
+        self._healthy_streak += 1
+        if self._healthy_streak >= self.limit:
+            self._healthy_streak = 0
+            self.limit += 1
+
+    def _shrink(self, now: float, factor: Optional[float]) -> None:
+        self._healthy_streak = 0
+        if not self.adaptive:
+            return
+        # Requests already in flight when the engine pushed back report it
+        # too; decrease once per latency window, not once per response
+        if now - self._last_decrease < (self._latency or 1.0):
+            return
+        self._last_decrease = now
+        new_limit = int(self.limit * factor) if factor else self.limit - 1
+        self.limit = max(self.min_limit, new_limit)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn under the limit. Throttled and timed-out calls are retried
+        after the backoff, other exceptions are raised to the caller. A None
+        result (how engines report a failure they handled) is retried after a
+        delay of its own, without pausing other requests, and returned once
+        the retries are used up.
+        """
+        result = None
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            start = time.time()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                outcome = classify_error(e) or "error"
+                self.release(time.time() - start, outcome)
+                if outcome == "error" or attempt == self.max_retries:
+                    raise
+                logging.warning(f"{self.name}: {outcome} ({e}), retrying after backoff")
+                continue
+            if result is not None:
+                self.release(time.time() - start, tokens=estimate_tokens(result))
+                return result
+            self.release(time.time() - start, "error")
+            if attempt < self.max_retries:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                logging.warning(f"{self.name}: request failed, retrying after backoff")
+                time.sleep(delay / 2 + random.uniform(0, delay / 2))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self._started, 1e-9)
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "timeouts": self.timeouts,
+            "requests_per_sec": round(self.completed / elapsed, 2),
+            "tokens_per_sec": round(self.tokens / elapsed, 1),
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (
+            f"{self.name}: concurrency {s['limit']}, {s['completed']} done, "
+            f"{s['requests_per_sec']:.2f} req/s, ~{s['tokens_per_sec']:.0f} tokens/s, "
+            f"{s['throttled']} throttled, {s['timeouts']} timeouts, {s['failed']} failed"
+        )
+
+
+class Hedger:
+    """
+    Sends a duplicate of a request that is slower than the given percentile
+    of recent latencies and returns whichever response arrives first. The
+    slower request is not cancelled (engines offer no way to), its response
+    is dropped.
+
+    Args:
+        percentile: Latency percentile after which a request is hedged
+        budget: Maximum hedges as a fraction of requests
+        max_workers: Requests (originals and hedges) that can be in flight
+        min_samples: Latencies observed before hedging starts
+        window: Recent latencies the percentile is computed over
+        name: Label of the report
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        max_workers: int = 64,
+        min_samples: int = 20,
+        window: int = 500,
+        name: str = "requests",
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.name = name
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(2, max_workers), thread_name_prefix="structeval-hedge")
+        self.requests = 0
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def threshold(self) -> Optional[float]:
+        """Seconds after which a request is hedged, None until enough latencies are known."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+    @staticmethod
+    def _succeeded(future) -> bool:
+        return future.exception() is None and future.result() is not None
+
+    def _record(self, start: float, future) -> None:
+        # Failures often return fast and would pull the percentile down
+        if self._succeeded(future):
+            with self._lock:
+                self._latencies.append(time.time() - start)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def call(self, fn: Callable[[], Any], hedge_fn: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Run fn, hedged with hedge_fn (default: fn again) if it is slow.
+        A None response counts as a failure, so the other request can still
+        answer. If every request sent failed, raises the first exception, or
+        returns None when they all returned None.
+        """
+        with self._lock:
+            self.requests += 1
+        threshold = self.threshold()
+        start = time.time()
+        primary = self._pool.submit(fn)
+        # Only originals feed the percentile, hedged outcomes would pull it down
+        primary.add_done_callback(lambda f: self._record(start, f))
+        if threshold is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._take_budget():
+            return primary.result()
+
+        hedge = self._pool.submit(hedge_fn or fn)
+        futures = [primary, hedge]
+        error = None
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                if self._succeeded(future):
+                    if future is hedge:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return future.result()
+                error = error or future.exception()
+        if error is not None:
+            raise error
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "hedged": self.hedged, "hedges_won": self.hedges_won}
+
+    def report(self) -> str:
+        share = self.hedged / self.requests if self.requests else 0.0
+        return (
+            f"{self.name} hedging: {self.hedged} duplicate requests for {self.requests} requests "
+            f"({share:.1%} extra), {self.hedges_won} answered first"
+        )
+
+    def close(self) -> None:
+        # Losing requests may still be running; do not wait for them
+        self._pool.shutdown(wait=False)
@@ -1 +1,2 @@
-from .main import evaluate_dataset 
\ No newline at end of file
+from .main import evaluate_dataset, evaluate_stream
+from .aggregate import aggregate_samples, pass_at_k
@@ -0,0 +1,102 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def pass_at_k(n: int, c: int, k: int) -> float:
+    """
+    Unbiased pass@k estimator: the probability that at least one of k samples
+    drawn without replacement from n, of which c pass, passes.
+
+    Args:
+        n: Number of samples
+        c: Number of passing samples
+        k: Samples drawn
+
+    Returns:
+        pass@k in [0, 1]
+    """
+    if n - c < k:
+        return 1.0
+    # 1 - C(n-c, k) / C(n, k), as a product to stay within float range
+    fail = 1.0
+    for i in range(n - c + 1, n + 1):
+        fail *= 1.0 - k / i
+    return 1.0 - fail
+
+
+def task_category(task: Dict[str, Any]) -> str:
+    """Evaluation category of a task, as counted by `structeval evaluate`."""
+    source = "text" if task.get("input_type") == "Text" else "nontext"
+    target = "renderable" if task.get("rendering", False) else "nonrenderable"
+    return f"{source}_to_{target}"
+
+
+def _summarize(tasks: List[Dict[str, Any]], ks: List[int]) -> Dict[str, Any]:
+    summary = {
+        "num_tasks": len(tasks),
+        "mean_score": round(sum(t["mean_score"] for t in tasks) / len(tasks), 4),
+    }
+    for k in ks:
+        # pass@k is only defined for tasks with at least k samples
+        eligible = [t[f"pass@{k}"] for t in tasks if f"pass@{k}" in t]
+        if eligible:
+            summary[f"pass@{k}"] = round(sum(eligible) / len(eligible), 4)
+    return summary
+
+
+def aggregate_samples(
+    results: Iterable[Dict[str, Any]],
+    ks: Optional[List[int]] = None,
+    pass_threshold: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Aggregate evaluated samples (rows from `structeval inference --num_samples`)
+    into per-task mean score and pass@k, averaged per type code and category.
+
+    Args:
+        results: Evaluated rows; rows without base_task_id count as one sample
+            of their own task
+        ks: Values of k (default: 1 and the largest sample count)
+        pass_threshold: final_eval_score at or above which a sample passes
+
+    Returns:
+        {"tasks": {base_task_id: ...}, "types": {type_code: ...},
+         "categories": {category: ...}, "overall": ...}
+    """
+    samples = defaultdict(list)
+    for item in results:
+        samples[item.get("base_task_id", item["task_id"])].append(item)
+    if not samples:
+        return {"tasks": {}, "types": {}, "categories": {}, "overall": {}}
+
+    if ks is None:
+        ks = sorted({1, max(len(rows) for rows in samples.values())})
+
+    tasks = {}
+    for task_id, rows in samples.items():
+        scores = [row.get("final_eval_score", 0) for row in rows]
+        n, c = len(scores), sum(score >= pass_threshold for score in scores)
+        task = {
+            "type_code": task_id[2:4],
+            "category": task_category(rows[0]),
+            "num_samples": n,
+            "num_passed": c,
+            "mean_score": round(sum(scores) / n, 4),
+        }
+        for k in ks:
+            if k <= n:
+                task[f"pass@{k}"] = round(pass_at_k(n, c, k), 4)
+        tasks[task_id] = task
+
+    by_type = defaultdict(list)
+    by_category = defaultdict(list)
+    for task in tasks.values():
+        by_type[task["type_code"]].append(task)
+        by_category[task["category"]].append(task)
+
+    return {
+        "tasks": tasks,
+        "types": {code: _summarize(group, ks) for code, group in sorted(by_type.items())},
+        "categories": {name: _summarize(group, ks) for name, group in sorted(by_category.items())},
+        "overall": _summarize(list(tasks.values()), ks),
+    }
@@ -1,18 +1,24 @@
+import io
 import logging
 import os
 import json
-from typing import Dict, List, Any
-from .eval_utils import load_file_structure, determine_output_type, path_exists
+from typing import Dict, List, Any, Optional, Tuple
+from .eval_utils import load_file_structure, parse_structure, determine_output_type, compile_path_query
+from .eval_stream import stream_validate_paths
 
-def evaluate_nonrenderable(items: List[Dict[str, Any]], saved_files_dir: str) -> List[Dict[str, Any]]:
+def evaluate_nonrenderable(
+    items: List[Dict[str, Any]], saved_files_dir: str, streaming: bool = False
+) -> List[Dict[str, Any]]:
     """
     Evaluate tasks with non-renderable output, regardless of input type.
-    This function saves the extracted code to files and then uses path validation
-    to check if the paths in raw_output_metric exist in the output structure.
+    The code extracted at render time is parsed (from the saved file, or from
+    extracted_code when it was not saved) and path validation checks if the
+    paths in raw_output_metric exist in the output structure.
     
     Args:
         items: List of tasks to evaluate
         output_dir: Directory to save extracted files
+        streaming: Check the paths while parsing instead of building the full structure
         
     Returns:
         Evaluated tasks with scores
@@ -38,25 +44,46 @@ def evaluate_nonrenderable(items: List[Dict[str, Any]], saved_files_dir: str) ->
         task_id = item.get("task_id", "unknown")
         output_type = determine_output_type(task_id)
         
+        # Code the render stage did not save to a file is kept on the task
+        code = item.get("extracted_code")
         file_path = item.get("output_file", None)
-        if file_path is None:
-            item["key_validation_score"] = 0
-            break
+        raw_output_metric = item.get("raw_output_metric", [])
 
-        structure, parsed_success = load_file_structure(file_path, output_type.lower())
+        if streaming and (code is not None or file_path is not None):
+            results, parsed_success = _stream_validate(code, file_path, output_type.lower(), raw_output_metric)
+        else:
+            if code is not None:
+                structure, parsed_success = parse_structure(code, output_type.lower())
+            elif file_path is not None:
+                structure, parsed_success = load_file_structure(file_path, output_type.lower())
+            else:
+                item["key_validation_score"] = 0
+                continue
+            if parsed_success:
+                results = compile_path_query(tuple(raw_output_metric)).evaluate(structure)
 
         if parsed_success == 0:
             item["key_validation_score"] = 0
             continue
 
-        raw_output_metric = item.get("raw_output_metric", [])
-
         if len(raw_output_metric) > 0:
-            for path in raw_output_metric:
-                if path_exists(structure, path):
-                    item["key_validation_score"] += 1
+            item["key_validation_score"] += sum(results)
         
         # Aggregate key validation score
         item["key_validation_score"] = item["key_validation_score"] / len(raw_output_metric)
 
-    return items 
\ No newline at end of file
+    return items
+
+def _stream_validate(
+    code: Optional[str], file_path: Optional[str], output_type: str, raw_output_metric: List[str]
+) -> Tuple[Optional[List[bool]], int]:
+    """Stream-validate the saved file, or the in-memory code when there is no file."""
+    if file_path is not None:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return stream_validate_paths(f, output_type, raw_output_metric)
+        except OSError as e:
+            if code is None:
+                logging.error(f"Error loading file {file_path}: {str(e)}")
+                return None, 0
+    return stream_validate_paths(io.StringIO(code), output_type, raw_output_metric)
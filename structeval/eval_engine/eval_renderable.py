@@ -1,6 +1,6 @@
 import logging
 from typing import Dict, List, Any, Optional
-from .eval_utils import raw_output_eval
+from .eval_utils import raw_output_eval_batch
 
 def evaluate_renderable(
     items: List[Dict[str, Any]],
@@ -26,8 +26,7 @@ def evaluate_renderable(
     logging.info(f"Evaluating {len(items)} renderable tasks")
     
     # Apply raw output evaluation
-    for item in items:
-        raw_output_eval(item)
+    raw_output_eval_batch(items)
     
     # If VLM is provided, run VQA evaluation on images
     if vlm_model_name and vlm_engine:
@@ -0,0 +1,281 @@
+import io
+import csv
+import logging
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, IO, List, Optional, Tuple
+from .eval_utils import PathQuery, _PathTrieNode, compile_path_query, parse_structure
+
+# Streaming key validation: instead of building the whole parsed structure,
+# only the parts reachable by the task's raw_output_metric paths are
+# materialized while parsing. Everything else is replaced by a None
+# placeholder under the same key, which keeps dict keys, list lengths and
+# xmltodict's single-vs-list layout (and therefore every path result)
+# identical to a full parse.
+
+_CHUNK_SIZE = 1 << 16
+
+def _index_matches(tok: str, index: int) -> bool:
+    if tok == "*":
+        return True
+    if tok.startswith("[") and tok.endswith("]"):
+        try:
+            return int(tok[1:-1]) == index
+        except ValueError:
+            return False
+    return False
+
+def _key_tries(tries: List[_PathTrieNode], key: str, index: int) -> List[_PathTrieNode]:
+    """
+    Trie nodes that can reach into the value stored under `key`, which is the
+    `index`-th value for that key (it may end up in a list).
+    """
+    result = []
+    for trie in tries:
+        for tok in (key, "@" + key):
+            child = trie.children.get(tok)
+            if child is None:
+                continue
+            result.append(child)
+            result.extend(
+                grandchild for grand_tok, grandchild in child.children.items()
+                if _index_matches(grand_tok, index)
+            )
+    return result
+
+def _item_tries(tries: List[_PathTrieNode], index: int) -> List[_PathTrieNode]:
+    """Trie nodes that can reach into the `index`-th item of a list."""
+    return [
+        child for trie in tries
+        for tok, child in trie.children.items()
+        if _index_matches(tok, index)
+    ]
+
+def _wants_csv_headers(tries: List[_PathTrieNode]) -> bool:
+    return any(tok.startswith("csv::") for trie in tries for tok in trie.children)
+
+# ---------------------------- CSV ----------------------------------- #
+def _stream_csv(source: IO[str], query: PathQuery) -> Optional[Any]:
+    # Only csv:: header paths can be answered from the header row alone
+    if not all(path.startswith("csv::") for path in query.paths):
+        return None
+    header = next(csv.reader(source), None)
+    return {"csv_headers": header, "csv_rows": []}
+
+# ---------------------------- XML ----------------------------------- #
+class _FallbackToFullParse(Exception):
+    pass
+
+class _PrunedXMLBuilder:
+    """
+    ElementTree parser target that builds xmltodict's layout, keeping only
+    the elements a PathQuery can reach.
+    """
+
+    def __init__(self, root: _PathTrieNode):
+        # Frames: [tries, item, data, occurrence counts, keep everything],
+        # None for skipped elements
+        self.stack: List[Optional[list]] = [[[root], None, [], {}, False]]
+
+    @staticmethod
+    def _push(item: Optional[Dict[str, Any]], key: str, value: Any) -> Dict[str, Any]:
+        if item is None:
+            item = {}
+        if key not in item:
+            item[key] = value
+        elif isinstance(item[key], list):
+            item[key].append(value)
+        else:
+            item[key] = [item[key], value]
+        return item
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        parent = self.stack[-1]
+        if parent is None:
+            self.stack.append(None)
+            return
+        if "{" in tag or any("{" in key for key in attrib):
+            raise _FallbackToFullParse("namespaced name")
+
+        index = parent[3].get(tag, 0)
+        parent[3][tag] = index + 1
+        if parent[4]:
+            tries, keep_all = parent[0], True
+        else:
+            tries = _key_tries(parent[0], tag, index)
+            keep_all = tag == "csv_headers" and _wants_csv_headers(parent[0])
+        if not tries and not keep_all:
+            parent[1] = self._push(parent[1], tag, None)
+            self.stack.append(None)
+            return
+
+        item = {"@" + key: value for key, value in attrib.items()} or None
+        self.stack.append([tries, item, [], {}, keep_all])
+
+    def data(self, text: str) -> None:
+        frame = self.stack[-1]
+        if frame is not None:
+            frame[2].append(text)
+
+    def end(self, tag: str) -> None:
+        frame = self.stack.pop()
+        if frame is None:
+            return
+        item, data = frame[1], frame[2]
+        data = "".join(data).strip() or None
+        if item is None:
+            value = data
+        else:
+            if data:
+                item["#text"] = data
+            value = item
+        parent = self.stack[-1]
+        parent[1] = self._push(parent[1], tag, value)
+
+    def close(self) -> Any:
+        return self.stack[0][1]
+
+def _stream_xml(source: IO[str], query: PathQuery) -> Optional[Any]:
+    parser = ET.XMLParser(target=_PrunedXMLBuilder(query.root))
+    tail = ""
+    while True:
+        chunk = source.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        # DTDs and namespaces are parsed differently from xmltodict
+        window = tail + chunk
+        if "<!DOCTYPE" in window or "xmlns" in window:
+            raise _FallbackToFullParse("DTD or namespace declaration")
+        tail = chunk[-16:]
+        parser.feed(chunk)
+    return parser.close()
+
+# ---------------------------- JSON ---------------------------------- #
+class _Bytes(io.RawIOBase):
+    """Byte stream over a text stream, encoded lazily for ijson."""
+
+    def __init__(self, text_source: IO[str]):
+        self.text_source = text_source
+        self.pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            chunk = self.text_source.read(_CHUNK_SIZE)
+            if not chunk:
+                return 0
+            self.pending = chunk.encode("utf-8")
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+# Whether the missing-ijson warning was already logged
+_WARNED_NO_IJSON = False
+
+def _stream_json(source: IO[str], query: PathQuery) -> Optional[Any]:
+    global _WARNED_NO_IJSON
+    try:
+        import ijson
+    except ImportError:
+        if not _WARNED_NO_IJSON:
+            _WARNED_NO_IJSON = True
+            logging.warning("ijson is not installed, JSON outputs are fully parsed instead of streamed (pip install ijson)")
+        return None
+
+    # Frames: [tries, container, pending key, next list index, keep everything]
+    document: List[Any] = []
+    stack: List[list] = [[[query.root], document, None, 0, False]]
+    skip_depth = 0
+
+    def child_frame(frame: list) -> Tuple[List[_PathTrieNode], bool]:
+        tries, container, key, index, keep_all = frame
+        if keep_all:
+            return tries, True
+        if container is document:
+            return tries, False
+        if isinstance(container, dict):
+            return _key_tries(tries, key, 0), key == "csv_headers" and _wants_csv_headers(tries)
+        return _item_tries(tries, index), False
+
+    def store(frame: list, value: Any) -> None:
+        container = frame[1]
+        if isinstance(container, dict):
+            container[frame[2]] = value
+        else:
+            container.append(value)
+            frame[3] += 1
+
+    for _, event, value in ijson.parse(_Bytes(source)):
+        if skip_depth:
+            if event in ("start_map", "start_array"):
+                skip_depth += 1
+            elif event in ("end_map", "end_array"):
+                skip_depth -= 1
+            continue
+
+        frame = stack[-1]
+        if event == "map_key":
+            frame[2] = value
+            continue
+        if event in ("end_map", "end_array"):
+            stack.pop()
+            continue
+
+        tries, keep_all = child_frame(frame)
+        if not tries and not keep_all:
+            store(frame, None)
+            if event in ("start_map", "start_array"):
+                skip_depth = 1
+            continue
+
+        if event in ("start_map", "start_array"):
+            container = {} if event == "start_map" else []
+            store(frame, container)
+            stack.append([tries, container, None, 0, keep_all])
+        else:
+            store(frame, value)
+
+    return document[0] if document else None
+
+_STREAMERS = {
+    "csv": _stream_csv,
+    "xml": _stream_xml,
+    "json": _stream_json,
+}
+
+def stream_validate_paths(
+    source: IO[str], format_type: str, paths: List[str]
+) -> Tuple[Optional[List[bool]], int]:
+    """
+    Check raw_output_metric paths while parsing, materializing only the parts
+    of the structure the paths can reach. CSV is read up to the header when
+    only csv:: paths are checked. Formats without an event parser (YAML, TOML,
+    or JSON without ijson) fall back to a full parse.
+
+    Args:
+        source: Text stream with the payload (open file or io.StringIO)
+        format_type: Format type (json, yaml, csv, toml, xml)
+        paths: Paths to check (dot notation)
+
+    Returns:
+        (per-path results, success)
+    """
+    query = compile_path_query(tuple(paths))
+
+    streamer = _STREAMERS.get(format_type)
+    if streamer is not None:
+        start = source.tell()
+        try:
+            structure = streamer(source, query)
+            if structure is not None:
+                return query.evaluate(structure), 1
+        except Exception as e:
+            logging.debug(f"Streaming {format_type} validation fell back to a full parse: {str(e)}")
+        source.seek(start)
+
+    structure, parsed_success = parse_structure(source.read(), format_type)
+    if parsed_success == 0:
+        return None, 0
+    return query.evaluate(structure), 1
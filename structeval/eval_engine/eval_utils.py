@@ -1,13 +1,19 @@
 import re
 import json
+import hashlib
+import functools
+import importlib.util
 import yaml
 import csv
 import io
 import logging
 import os
+import pickle
+import xml.etree.ElementTree as ET
 import xmltodict
 import toml
-from typing import Dict, List, Any, Union, Optional, Tuple
+from typing import Callable, Dict, List, Any, Union, Optional, Tuple
+from sqlite_cache import SQLiteCache
 
 
 def determine_output_type(task_id: str) -> str:
@@ -33,13 +39,223 @@ def determine_output_type(task_id: str) -> str:
         return type_mapping.get(type_code, "")
     return ""
 
-def load_file_structure(file_path: str, format_type: str) -> Tuple[Any, int]:
+# Integer literals that may not fit in 64 bits, which orjson reads as floats
+_JSON_BIG_INT = re.compile(r"\d{19}")
+
+def _parse_json_orjson(text: str) -> Any:
+    import orjson
+    if _JSON_BIG_INT.search(text):
+        return json.loads(text)
+    try:
+        return orjson.loads(text)
+    except ValueError:
+        # stdlib json also accepts NaN/Infinity and integers beyond 64 bits
+        return json.loads(text)
+
+def _parse_yaml_c(text: str) -> Any:
+    try:
+        return yaml.load(text, Loader=yaml.CSafeLoader)
+    except yaml.YAMLError:
+        return yaml.safe_load(text)
+
+def _parse_toml_tomllib(text: str) -> Any:
+    import tomllib
+    try:
+        return tomllib.loads(text)
+    except tomllib.TOMLDecodeError:
+        # the toml package accepts some pre-1.0 documents tomllib rejects
+        return toml.loads(text)
+
+class _UnsupportedXML(Exception):
+    pass
+
+def _etree_to_dict(elem: ET.Element) -> Any:
+    """Convert an Element the same way xmltodict.parse converts the element."""
+    if "{" in elem.tag or any("{" in key for key in elem.attrib):
+        raise _UnsupportedXML("namespaced name")
+    item = {"@" + key: value for key, value in elem.attrib.items()} or None
+    texts = [elem.text] if elem.text else []
+    for child in elem:
+        value = _etree_to_dict(child)
+        if item is None:
+            item = {}
+        if child.tag not in item:
+            item[child.tag] = value
+        elif isinstance(item[child.tag], list):
+            item[child.tag].append(value)
+        else:
+            item[child.tag] = [item[child.tag], value]
+        if child.tail:
+            texts.append(child.tail)
+    data = "".join(texts).strip() or None
+    if item is None:
+        return data
+    if data:
+        item["#text"] = data
+    return item
+
+def _parse_xml_etree(text: str) -> Any:
+    # Namespaces and DTDs are handled differently by ElementTree, leave them to xmltodict
+    if "xmlns" in text or "<!DOCTYPE" in text:
+        return xmltodict.parse(text)
+    try:
+        root = ET.fromstring(text)
+        return {root.tag: _etree_to_dict(root)}
+    except (ET.ParseError, _UnsupportedXML, RecursionError):
+        return xmltodict.parse(text)
+
+def _parse_csv(text: str) -> Any:
+    reader = csv.DictReader(io.StringIO(text))
+    return {"csv_headers": reader.fieldnames, "csv_rows": list(reader)}
+
+# Parser backends per format, fastest first: (name, is_available, parse).
+# Every backend must produce the same structure as the last (reference) one,
+# the fast ones fall back to it for inputs they cannot handle identically.
+PARSER_BACKENDS: Dict[str, List[Tuple[str, Callable[[], bool], Callable[[str], Any]]]] = {
+    "json": [
+        ("orjson", lambda: importlib.util.find_spec("orjson") is not None, _parse_json_orjson),
+        ("json", lambda: True, json.loads),
+    ],
+    "yaml": [
+        ("yaml_c", lambda: hasattr(yaml, "CSafeLoader"), _parse_yaml_c),
+        ("yaml", lambda: True, yaml.safe_load),
+    ],
+    "toml": [
+        ("tomllib", lambda: importlib.util.find_spec("tomllib") is not None, _parse_toml_tomllib),
+        ("toml", lambda: True, toml.loads),
+    ],
+    "xml": [
+        ("etree", lambda: True, _parse_xml_etree),
+        ("xmltodict", lambda: True, xmltodict.parse),
+    ],
+    "csv": [
+        ("csv", lambda: True, _parse_csv),
+    ],
+}
+
+def available_parser_backends(format_type: str) -> List[str]:
+    """
+    List the parser backends usable on this machine for a format, fastest first.
+    """
+    return [name for name, is_available, _ in PARSER_BACKENDS.get(format_type, []) if is_available()]
+
+def get_parser_backend(format_type: str, backend: Optional[str] = None) -> Tuple[str, Callable[[str], Any]]:
+    """
+    Select a parser backend for a format.
+    
+    Args:
+        format_type: Format type (json, yaml, csv, toml, xml)
+        backend: Backend name to force, or None for the fastest available one
+        
+    Returns:
+        (backend name, parse function)
+    """
+    for name, is_available, parse in PARSER_BACKENDS.get(format_type, []):
+        if (backend is None or backend == name) and is_available():
+            return name, parse
+    raise ValueError(f"No parser backend {backend or ''} available for format {format_type!r}")
+
+# Parsed structures keyed by (format_type, backend, content hash), shared by
+# the render and evaluate stages so a payload is only parsed once per process
+_STRUCTURE_CACHE: Dict[Tuple[str, str, str], Tuple[Any, int]] = {}
+_STRUCTURE_CACHE_SIZE = 4096
+
+class ParseCache(SQLiteCache):
+    """
+    On-disk cache of parse results keyed by the SHA-256 of format and
+    content, so render and evaluate, run as separate processes, parse each
+    payload once. Results are stored pickled: only open cache files you wrote.
+    
+    Args:
+        path: SQLite database file
+    """
+
+    table = "parsed_structures"
+    columns = ("format TEXT", "parsed BLOB")
+    value_column = "parsed"
+
+    @staticmethod
+    def make_key(text: str, format_type: str) -> str:
+        digest = hashlib.sha256(format_type.encode("utf-8") + b"\0")
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Any, int]]:
+        parsed = super().get(key)
+        return pickle.loads(parsed) if parsed is not None else None
+
+    def put(self, key: str, format_type: str, parsed: Tuple[Any, int]) -> None:
+        try:
+            data = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logging.warning(f"Not caching unpicklable {format_type} structure: {e}")
+            return
+        self._put(key, (format_type, data))
+
+# Parse cache shared by later runs and stages, set by use_parse_cache()
+_PARSE_CACHE: Optional[ParseCache] = None
+
+def use_parse_cache(path: Optional[str]) -> None:
+    """
+    Look up and store parse results in the parse cache at path for the rest
+    of this process, None to stop using one.
+    """
+    global _PARSE_CACHE
+    if _PARSE_CACHE is not None:
+        _PARSE_CACHE.close()
+    _PARSE_CACHE = ParseCache(path) if path else None
+
+def parse_structure(text: str, format_type: str, backend: Optional[str] = None) -> Tuple[Any, int]:
+    """
+    Parse structure from an in-memory string, caching the result by content hash.
+    
+    Args:
+        text: Text to parse
+        format_type: Format type to use (json, yaml, csv, toml, xml)
+        backend: Parser backend to force, defaults to the fastest available one
+        
+    Returns:
+        (parsed_obj, success)
+    """
+    try:
+        backend_name, parse = get_parser_backend(format_type, backend)
+    except ValueError as e:
+        logging.error(str(e))
+        return None, 0
+
+    key = (format_type, backend_name, hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest())
+    if key in _STRUCTURE_CACHE:
+        return _STRUCTURE_CACHE[key]
+
+    # All backends of a format parse alike, so the on-disk entry ignores the backend
+    parse_cache = _PARSE_CACHE
+    parsed = None
+    if parse_cache is not None:
+        cache_key = ParseCache.make_key(text, format_type)
+        parsed = parse_cache.get(cache_key)
+
+    if parsed is None:
+        try:
+            parsed = (parse(text), 1)
+        except Exception as e:
+            logging.error(f"Error parsing {format_type} content: {str(e)}")
+            parsed = (None, 0)
+        if parse_cache is not None:
+            parse_cache.put(cache_key, format_type, parsed)
+
+    if len(_STRUCTURE_CACHE) >= _STRUCTURE_CACHE_SIZE:
+        _STRUCTURE_CACHE.pop(next(iter(_STRUCTURE_CACHE)))
+    _STRUCTURE_CACHE[key] = parsed
+    return parsed
+
+def load_file_structure(file_path: str, format_type: str, backend: Optional[str] = None) -> Tuple[Any, int]:
     """
     Load and parse structure directly from a file.
     
     Args:
         file_path: Path to the file to load
         format_type: Format type to use (json, yaml, csv, toml, xml)
+        backend: Parser backend to force, defaults to the fastest available one
         
     Returns:
         (parsed_obj, success)
@@ -48,34 +264,17 @@ def load_file_structure(file_path: str, format_type: str) -> Tuple[Any, int]:
         return None, 0
     
     try:
-        if format_type == "json":
-            with open(file_path, 'r', encoding='utf-8') as f:
-                result = json.load(f)
-            return result, 1
-        elif format_type == "yaml":
-            with open(file_path, 'r', encoding='utf-8') as f:
-                result = yaml.safe_load(f)
-            return result, 1
-        elif format_type == "toml":
-            with open(file_path, 'r', encoding='utf-8') as f:
-                result = toml.load(f)
-            return result, 1
-        elif format_type == "xml":
-            with open(file_path, 'r', encoding='utf-8') as f:
-                result = xmltodict.parse(f.read())
-            return result, 1
-        elif format_type == "csv":
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                return {"csv_headers": reader.fieldnames, "csv_rows": list(reader)}, 1
-        else:
-            raise ValueError("Unsupported file format.")
-        
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
     except Exception as e:
         logging.error(f"Error loading file {file_path}: {str(e)}")
         return None, 0
 
+    return parse_structure(text, format_type, backend)
+
 # Path checking functions from check_paths.py
+_PATH_DELIMITERS = re.compile(r"[`.\[]")
+
 def tokenize_path(path: str) -> List[str]:
     """
     Tokenize a dot-notation path, handling back-ticks and array indices.
@@ -94,42 +293,159 @@ def tokenize_path(path: str) -> List[str]:
     i, n = 0, len(path)
 
     while i < n:
-        ch = path[i]
+        # Inside back-ticks only the closing back-tick is special
+        if in_bt:
+            j = path.find("`", i)
+            if j == -1:
+                buf += path[i:]
+                break
+            buf += path[i:j]
+            in_bt = False
+            i = j + 1
+            continue
+
+        m = _PATH_DELIMITERS.search(path, i)
+        if m is None:
+            buf += path[i:]
+            break
+        j = m.start()
+        buf += path[i:j]
+        ch = path[j]
 
         # Toggle back-tick state
         if ch == "`":
-            in_bt = not in_bt
-            i += 1
-            continue
-
-        # Dot delimiter (when not inside back-ticks)
-        if ch == "." and not in_bt:
-            if buf:
-                tokens.append(buf)
-                buf = ""
-            i += 1
+            in_bt = True
+            i = j + 1
             continue
 
-        # Bracket "[index]" treated as separate token
-        if ch == "[" and not in_bt:
+        # Dot delimiter
+        if ch == ".":
             if buf:
                 tokens.append(buf)
                 buf = ""
-            j = path.find("]", i)
-            if j == -1:
-                raise ValueError(f"Unclosed '[' in path: {path}")
-            tokens.append(path[i : j + 1])  # e.g. "[0]"
             i = j + 1
             continue
 
-        # Regular character
-        buf += ch
-        i += 1
+        # Bracket "[index]" treated as separate token
+        if buf:
+            tokens.append(buf)
+            buf = ""
+        k = path.find("]", j)
+        if k == -1:
+            raise ValueError(f"Unclosed '[' in path: {path}")
+        tokens.append(path[j : k + 1])  # e.g. "[0]"
+        i = k + 1
 
     if buf:
         tokens.append(buf)
     return tokens
 
+class _PathTrieNode:
+    """One token of a PathQuery trie."""
+
+    __slots__ = ("children", "terminal", "paths")
+
+    def __init__(self):
+        self.children: Dict[str, "_PathTrieNode"] = {}
+        self.terminal: List[int] = []  # indices of the paths ending here
+        self.paths: List[int] = []     # indices of all paths through this node
+
+class PathQuery:
+    """
+    A set of paths compiled into a prefix trie of tokens, so all of them are
+    checked in a single traversal of a parsed structure.
+    """
+
+    def __init__(self, paths: Tuple[str, ...]):
+        self.paths = paths
+        self.root = _PathTrieNode()
+        for idx, path in enumerate(paths):
+            node = self.root
+            node.paths.append(idx)
+            for tok in tokenize_path(path):
+                node = node.children.setdefault(tok, _PathTrieNode())
+                node.paths.append(idx)
+            node.terminal.append(idx)
+
+    def evaluate(self, data: Any) -> List[bool]:
+        """
+        Check which paths exist in a structured data object.
+        
+        Args:
+            data: The structured data to check
+            
+        Returns:
+            One boolean per path, same order as the compiled paths
+        """
+        results = [False] * len(self.paths)
+        # (data node, trie node) pairs already walked, so wildcard branches and
+        # shared subtrees (e.g. YAML anchors) are only visited once
+        visited = set()
+        stack = [(data, self.root)]
+
+        while stack:
+            node, trie = stack.pop()
+            key = (id(node), id(trie))
+            if key in visited:
+                continue
+            visited.add(key)
+
+            for idx in trie.terminal:
+                results[idx] = True
+
+            for tok, child in trie.children.items():
+                # Every path below is already known to exist
+                if all(results[idx] for idx in child.paths):
+                    continue
+
+                # CSV header rule (must be terminal)
+                if isinstance(node, dict) and "csv_headers" in node and tok.startswith("csv::"):
+                    if tok[5:] in (node["csv_headers"] or []):
+                        for idx in child.terminal:
+                            results[idx] = True
+                    continue
+
+                # Wildcard
+                if tok == "*":
+                    if isinstance(node, list):
+                        stack.extend((item, child) for item in node)
+                    continue
+
+                # Fixed index [n]
+                if tok.startswith("[") and tok.endswith("]"):
+                    try:
+                        idx = int(tok[1:-1])
+                    except ValueError:
+                        continue
+                    if isinstance(node, list) and 0 <= idx < len(node):
+                        stack.append((node[idx], child))
+                    continue
+
+                # Dict key handling (JSON/YAML/TOML/XML)
+                if isinstance(node, dict):
+                    # Literal key match (works for "@id" too)
+                    if tok in node:
+                        stack.append((node[tok], child))
+                    # XML attribute fallback: "@id" → "id"
+                    elif tok.startswith("@") and tok[1:] in node:
+                        stack.append((node[tok[1:]], child))
+
+        return results
+
+@functools.lru_cache(maxsize=4096)
+def compile_path_query(paths: Tuple[str, ...]) -> PathQuery:
+    """
+    Compile paths into a PathQuery, cached (least recently used first out)
+    so each distinct path list of a dataset is usually only compiled once.
+    
+    Args:
+        paths: The paths to check (dot notation)
+        
+    Returns:
+        Compiled PathQuery
+    """
+    return PathQuery(paths)
+
 def path_exists(data: Any, path: str) -> bool:
     """
     Check if a path exists in a structured data object.
@@ -141,51 +457,106 @@ def path_exists(data: Any, path: str) -> bool:
     Returns:
         True if path exists, False otherwise
     """
-    tokens = tokenize_path(path)
-
-    def walk(node: Any, toks: List[str]) -> bool:
-        if not toks:
-            return True
-        tok, *rest = toks
-
-        # CSV header rule (root level only)
-        if isinstance(node, dict) and "csv_headers" in node and tok.startswith("csv::"):
-            header = tok[5:]
-            return header in node["csv_headers"] and not rest  # must be terminal
-
-        # Wildcard
-        if tok == "*":
-            if isinstance(node, list):
-                return any(walk(item, rest) for item in node)
-            return False
-
-        # Fixed index [n]
-        if tok.startswith("[") and tok.endswith("]"):
-            try:
-                idx = int(tok[1:-1])
-            except ValueError:
-                return False
-            return (
-                isinstance(node, list)
-                and 0 <= idx < len(node)
-                and walk(node[idx], rest)
-            )
-
-        # Dict key handling (JSON/YAML/TOML/XML)
-        if isinstance(node, dict):
-            # 1️⃣ Literal key match (works for "@id" too)
-            if tok in node:
-                return walk(node[tok], rest)
-
-            # 2️⃣ XML attribute fallback: "@id" → "id"
-            if tok.startswith("@"):
-                attr = tok[1:]
-                if attr in node:
-                    return walk(node[attr], rest)
-
-        return False
-
-    return walk(data, tokens)
+    return compile_path_query((path,)).evaluate(data)[0]
+
+class KeywordMatcher:
+    """
+    A raw_output_metric keyword list, compiled once for matching.
+    
+    All keywords are found in a single pass over the generation: with an
+    Aho-Corasick automaton when pyahocorasick is installed, otherwise with one
+    regex alternation of the keywords, longest first, tried at every position.
+    The alternation only reports the longest keyword starting at a position;
+    the shorter ones starting there are its prefixes and are found with it.
+    """
+
+    def __init__(self, keywords: Tuple[str, ...]):
+        self.keywords = keywords
+        self.distinct = list(dict.fromkeys(keyword.lower() for keyword in keywords))
+        self.index = [self.distinct.index(keyword.lower()) for keyword in keywords]
+        self.automaton = None
+        self.pattern = None
+        try:
+            import ahocorasick
+        except ImportError:
+            ahocorasick = None
+
+        idxs = [idx for idx, keyword in enumerate(self.distinct) if keyword]
+        if not idxs:
+            return
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for idx in idxs:
+                automaton.add_word(self.distinct[idx], idx)
+            automaton.make_automaton()
+            self.automaton = automaton
+            return
+
+        idxs.sort(key=lambda idx: -len(self.distinct[idx]))
+        self.pattern = re.compile(
+            "(?=(" + "|".join(re.escape(self.distinct[idx]) for idx in idxs) + "))"
+        )
+        self.lookup = {self.distinct[idx]: idx for idx in idxs}
+        # Keywords found along with each keyword: itself and its prefixes
+        self.prefixes = {
+            idx: [other for other in idxs if self.distinct[idx].startswith(self.distinct[other])]
+            for idx in idxs
+        }
+
+    def match(self, generation: str) -> List[bool]:
+        """
+        Check which keywords occur in a lowercased generation.
+        
+        Args:
+            generation: Lowercased generation text
+            
+        Returns:
+            One boolean per keyword, same order as the keywords
+        """
+        # The empty keyword is in every string but cannot be searched for
+        found = [not keyword for keyword in self.distinct]
+        remaining = found.count(False)
+        if self.automaton is not None:
+            for _, idx in self.automaton.iter(generation):
+                if not found[idx]:
+                    found[idx] = True
+                    remaining -= 1
+                    if remaining == 0:
+                        break
+        elif self.pattern is not None:
+            for m in self.pattern.finditer(generation):
+                for idx in self.prefixes[self.lookup[m.group(1)]]:
+                    if not found[idx]:
+                        found[idx] = True
+                        remaining -= 1
+                if remaining == 0:
+                    break
+        return [found[idx] for idx in self.index]
+
+@functools.lru_cache(maxsize=4096)
+def compile_keyword_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    """
+    Compile keywords into a KeywordMatcher, cached so tasks sharing a keyword
+    list share the matcher.
+    
+    Args:
+        keywords: raw_output_metric keywords
+        
+    Returns:
+        Compiled KeywordMatcher
+    """
+    return KeywordMatcher(keywords)
+
+def _score_raw_output(item: Dict[str, Any], matcher: KeywordMatcher) -> float:
+    found = matcher.match(item.get("generation", "").lower())
+    
+    # Store evaluation details
+    item["raw_output_eval"] = ["True" if hit else "False" for hit in found]
+    
+    # Calculate and return score
+    score = sum(found) / len(found)
+    item["raw_output_score"] = score
+    return score
 
 def raw_output_eval(item: Dict[str, Any]) -> float:
     """
@@ -197,30 +568,34 @@ def raw_output_eval(item: Dict[str, Any]) -> float:
     Returns:
         Score between, 0 and 1
     """
-    generation = item.get("generation", "").lower()
     raw_output_metric = item.get("raw_output_metric", [])
     
     if not raw_output_metric:
         return 0.0
     
-    matches = 0
-    results = []
-    
+    return _score_raw_output(item, compile_keyword_matcher(tuple(raw_output_metric)))
+
+def raw_output_eval_batch(items: List[Dict[str, Any]]) -> List[float]:
+    """
+    Evaluate a whole model's generations using raw output metric (keyword matching).
+    Items are grouped by keyword list, and each group is matched with one
+    compiled matcher.
     
-    for keyword in raw_output_metric:
-        keyword_lower = keyword.lower()
+    Args:
+        items: Task items to evaluate
         
-        # Standard keyword matching against extracted code
-        if keyword_lower in generation:
-            matches += 1
-            results.append("True")
-        else:
-            results.append("False")
-    
-    # Store evaluation details
-    item["raw_output_eval"] = results
+    Returns:
+        Score between 0 and 1 for each item
+    """
+    scores = [0.0] * len(items)
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for i, item in enumerate(items):
+        keywords = tuple(item.get("raw_output_metric") or ())
+        if keywords:
+            groups.setdefault(keywords, []).append(i)
     
-    # Calculate and return score
-    score = matches / len(raw_output_metric) if raw_output_metric else 0.0
-    item["raw_output_score"] = score
-    return score 
\ No newline at end of file
+    for keywords, indices in groups.items():
+        matcher = compile_keyword_matcher(keywords)
+        for i in indices:
+            scores[i] = _score_raw_output(items[i], matcher)
+    return scores
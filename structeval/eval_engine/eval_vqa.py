@@ -1,156 +1,397 @@
 import os
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Any, Optional
 from PIL import Image
-import torch
 import json
+import re
 import sys
+from .vqa_cache import VQACache
+from .vqa_image import preprocess_vqa_image
+from concurrency import AdaptiveLimiter, Hedger, engine_call, take_retry_budget
+
+# Bump whenever the prompt or the way verdicts are collected changes, so cached
+# verdicts of the old version are not reused
+VQA_PROMPT_VERSION = 2
+VQA_DECODING_PARAMS = {"temperature": 0.0, "max_tokens": None}
 
 # Make sure llm_engines is in the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+def build_vqa_messages(vqa_questions: List[Dict[str, Any]], image: Image.Image) -> List[Dict[str, Any]]:
+    """
+    Build the VLM prompt asking all of a task's VQA questions in a single call.
+
+    Args:
+        vqa_questions: The task's VQA list ({"question": ..., "answer": ...})
+        image: Rendered image of the task
+
+    Returns:
+        Chat messages for the VLM
+    """
+    # Build the question-answer list for the prompt
+    qa_list = ""
+    for idx, vqa in enumerate(vqa_questions, 1):
+        qa_list += f"{idx}. Question: {vqa['question']} Expected Answer: {vqa['answer']}\n"
+
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": (
+                        "You are given an image and a list of question-answer pairs. "
+                        "For each pair, verify if the image content supports the expected answer based on the corresponding question. "
+                        "If the image is fully white, then you should always output false"
+                        "Base your judgment solely on the visual content of the provided image, and the question. Do not imagine anything. "
+                        "Do not use any external information or common-sense reasoning beyond what is visible. "
+                        "Respond with a JSON object mapping each question number to true or false (e.g., {\"1\": true, \"2\": false}). "
+                        "If the image is unclear or does not contain enough information to answer, use null for that question. "
+                        "Here are the question-answer pairs:\n"
+                        f"{qa_list}"
+                    )
+                },
+                {
+                    "type": "image",
+                    "image": image
+                }
+            ]
+        }
+    ]
+
+_FENCED_BLOCK = re.compile(r"```[a-zA-Z]*\s*\n(.*?)```", re.DOTALL)
+_VERDICT_WORDS = {"true": True, "yes": True, "false": False, "no": False, "null": None, "none": None}
+
+
+def _normalize_verdict(value: Any) -> Optional[bool]:
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        return _VERDICT_WORDS.get(value.strip().lower())
+    return None
+
+
+def _json_candidates(response: str):
+    """The whole response, fenced blocks, then every JSON object or array embedded in prose."""
+    yield response
+    for block in _FENCED_BLOCK.findall(response):
+        yield block
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        starts = [i for i in (response.find("{", pos), response.find("[", pos)) if i != -1]
+        if not starts:
+            return
+        start = min(starts)
+        try:
+            value, end = decoder.raw_decode(response, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        yield value
+        pos = end
+
+
+def parse_vqa_verdicts(response: str, total_questions: int) -> Optional[List[Optional[bool]]]:
+    """
+    Parse the VLM's verdicts, tolerating markdown fences and surrounding prose.
+
+    Args:
+        response: Raw VLM response
+        total_questions: Number of questions asked
+
+    Returns:
+        One verdict per question (True, False or None when unanswered), or
+        None if the response contains no usable JSON
+    """
+    if not isinstance(response, str):
+        return None
+    best, best_answered = None, -1
+    for candidate in _json_candidates(response):
+        if isinstance(candidate, str):
+            try:
+                candidate = json.loads(candidate)
+            except ValueError:
+                continue
+        if isinstance(candidate, dict):
+            keys = [str(idx) for idx in range(1, total_questions + 1)]
+            if not any(key in candidate for key in keys):
+                continue
+            verdicts = [_normalize_verdict(candidate.get(key)) for key in keys]
+        elif isinstance(candidate, list) and len(candidate) == total_questions:
+            verdicts = [_normalize_verdict(value) for value in candidate]
+            if all(verdict is None for verdict in verdicts):
+                continue
+        else:
+            continue
+        answered = sum(1 for verdict in verdicts if verdict is not None)
+        if answered > best_answered:
+            best, best_answered = verdicts, answered
+        if answered == total_questions:
+            break
+    return best
+
+
+def _evaluate_vqa_item(
+    llm,
+    model_name: str,
+    item: Dict[str, Any],
+    img_file: Optional[str],
+    image_future: Optional[Future],
+    cache: Optional[VQACache] = None,
+    max_retries: int = 2,
+    limiter: Optional[AdaptiveLimiter] = None,
+    hedger: Optional[Hedger] = None,
+    hedge_llm=None,
+) -> None:
+    """
+    Run VQA for one task and set VQA_score / VQAeval on it. A response
+    without usable JSON is asked again in full; questions left unanswered
+    are asked again on their own, up to max_retries extra requests.
+    """
+    task_id = item.get("task_id")
+
+    # Blank or error screenshots (flagged at render time) answer nothing
+    if item.get("image_flag") and img_file and os.path.exists(img_file):
+        logging.info(f"Skipping VQA for {task_id}: image flagged as {item['image_flag']}")
+        item["VQA_score"] = 0.0
+        item["VQAeval"] = [False] * len(item.get("VQA", []))
+        return
+
+    # If image is not available, skip VQA
+    image = image_future.result() if image_future is not None else None
+    if image is None:
+        item["VQA_score"] = 0.0
+        item["render_score"] = item.get("render_score", 0.0)
+        item["VQAeval"] = []
+        return
+
+    # Run VQA evaluation in a single call with JSON output
+    vqa_questions = item.get("VQA", [])
+    total_questions = len(vqa_questions)
+    if total_questions == 0:
+        item["VQA_score"] = 0.0
+        item["VQAeval"] = []
+        return
+
+    cache_key = None
+    if cache is not None:
+        image_hash = cache.image_hash(image)
+        cache_key = cache.make_key(task_id, model_name, VQA_DECODING_PARAMS, image_hash, VQA_PROMPT_VERSION, vqa_questions)
+        evaluations = cache.get(cache_key)
+        item["VQA_cache_hit"] = evaluations is not None
+        if evaluations is not None:
+            item["VQA_score"] = sum(1 for ans in evaluations if ans is True) / total_questions
+            item["VQAeval"] = evaluations
+            return
+
+    evaluations = [None] * total_questions
+    pending = list(range(total_questions))
+    attempts = parse_failures = retried_questions = 0
+    answered_once = False
+    while pending and attempts <= max_retries:
+        if attempts:
+            retried_questions += len(pending)
+        attempts += 1
+        messages = build_vqa_messages([vqa_questions[idx] for idx in pending], image)
+        try:
+            def request(engine, messages=messages):
+                if limiter is not None:
+                    return lambda: limiter.call(engine_call(engine, model_name), messages, **VQA_DECODING_PARAMS)
+                return lambda: engine.call_model(model_name, messages, **VQA_DECODING_PARAMS)
+
+            if hedger is not None:
+                response = hedger.call(request(llm), request(hedge_llm or llm))
+            else:
+                response = request(llm)()
+        except Exception as e:
+            logging.error(f"VQA evaluation failed for {task_id} (attempt {attempts}): {e}")
+            continue
+        verdicts = parse_vqa_verdicts(response, len(pending))
+        if verdicts is None:
+            parse_failures += 1
+            logging.warning(f"Unparseable VQA response for {task_id} (attempt {attempts}): {str(response)[:200]!r}")
+            continue
+        answered_once = True
+        for idx, verdict in zip(pending, verdicts):
+            evaluations[idx] = verdict
+        pending = [idx for idx in pending if evaluations[idx] is None]
+
+    true_count = sum(1 for ans in evaluations if ans is True)
+    item["VQA_attempts"] = attempts
+    item["VQA_parse_failures"] = parse_failures
+    item["VQA_retried_questions"] = retried_questions
+    # Only answered requests are cached, failures are asked again next run
+    if answered_once and cache_key is not None:
+        cache.put(cache_key, model_name, image_hash, evaluations)
+
+    item["VQA_score"] = true_count / total_questions
+    item["VQAeval"] = evaluations
+
 def vqa_eval(
     model_name: str,
     vlm_engine: str,
-    data: List[Dict[str, Any]] = None,
+    data: Iterable[Dict[str, Any]] = None,
     images: Dict[str, str] = None,
+    total: Optional[int] = None,
+    vqa_num_proc: int = 8,
+    vqa_cache_path: Optional[str] = None,
+    vqa_cache_mode: str = "exact",
+    vqa_max_image_side: Optional[int] = 2048,
+    vqa_crop_whitespace: bool = True,
+    vqa_preprocess_workers: int = 4,
+    vqa_debug_images_dir: Optional[str] = None,
+    vqa_max_retries: int = 2,
+    vqa_adaptive_concurrency: bool = False,
+    vqa_max_concurrency: Optional[int] = None,
+    vqa_hedge_percentile: Optional[float] = None,
+    vqa_hedge_budget: float = 0.05,
+    vqa_hedge_engine: Optional[str] = None,
+    llm=None,
     **kwargs
 ) -> List[Dict[str, Any]]:
     """
     Visual Question Answering evaluation for renderable outputs.
-    
+
     Args:
         model_name: Name of the VLM model
         vlm_engine: Engine for VLM evaluation
         additional_args: Additional arguments to pass to the VLM
-        data: List of tasks to evaluate
-        images: Dictionary mapping task_id to image paths
-        
+        data: Tasks to evaluate, a list or a stream of tasks as they are rendered
+        images: Dictionary mapping task_id to image paths, looked up when a task is reached
+        total: Number of tasks for progress output, defaults to len(data)
+        vqa_num_proc: Number of VLM requests in flight at once
+        vqa_cache_path: SQLite file caching VQA verdicts across runs (default: no cache)
+        vqa_cache_mode: "exact" to reuse verdicts for identical pixels, "phash" to
+            also reuse them for near-identical images
+        vqa_max_image_side: Longest image side sent to the VLM, larger screenshots are downscaled
+        vqa_crop_whitespace: Crop the uniform border around rendered content
+        vqa_preprocess_workers: Threads decoding and resizing images ahead of the VLM requests
+        vqa_debug_images_dir: If set, save each image as sent to the VLM there
+        vqa_max_retries: Extra requests per task for unparseable responses or unanswered questions
+        vqa_adaptive_concurrency: Adapt the requests in flight to the VLM, starting
+            at vqa_num_proc; rate-limited requests are retried after a backoff either way
+        vqa_max_concurrency: Upper bound of the adaptive concurrency
+        vqa_hedge_percentile: Send a duplicate of VLM requests slower than this
+            percentile of recent latencies, first response wins (None disables)
+        vqa_hedge_budget: Maximum duplicates as a fraction of VLM requests
+        vqa_hedge_engine: Engine serving the same VLM to send duplicates to
+        llm: An LLMEngine with model_name already loaded (e.g. kept warm by
+            `structeval serve`); loaded here when None
+
     Returns:
-        List of evaluated tasks with VQA scores
+        List of evaluated tasks with VQA scores, in the order of data
     """
     # Handle default parameters
     if data is None:
         data = []
     if images is None:
         images = {}
-        
-    try:
-        from llm_engines import LLMEngine
-    except ImportError:
-        logging.error("LLMEngine not found. VQA evaluation not available.")
-        for item in data:
-            item["VQA_score"] = 0.0
-            item["VQAeval"] = ["NONE"]
-        return data
-    
-    logging.info(f"Running VQA evaluation with model {model_name} on {len(data)} tasks")
-    
-    llm = LLMEngine()
-    
-    try:
-        llm.load_model(
-            model_name=model_name,
-            engine=vlm_engine,
-            use_cache=False,
-            **kwargs
-        )
-    except Exception as e:
-        logging.error(f"Failed to load VLM model: {e}")
-        for item in data:
-            item["VQA_score"] = 0.0
-            item["VQAeval"] = ["FAILURE: Model loading error"]
-        return data
-    
-    # Ensure debug images directory exists
-    os.makedirs("debug_images", exist_ok=True)
-    
-    output_data = []
-    counter = 0
-    for item in data:
-        counter += 1
-        print(f"Evaluating VQA task {counter} of {len(data)}")
-        
-        task_id = item.get("task_id")
-        img_file = images.get(task_id)
-
-        # Load image if available
-        if img_file and os.path.exists(img_file):
-            try:
-                with Image.open(img_file) as img:
-                    image = img.convert("RGB")
-                
-                # Save a copy for debugging
-                debug_image_path = f"debug_images/{task_id}.png"
-                image.save(debug_image_path)
-                logging.info(f"Saved debug image for task_id {task_id}")
-            except Exception as e:
-                logging.error(f"Failed to load image for {task_id}: {e}")
-                image = None
-        else:
-            image = None 
-            
-        # If image is not available, skip VQA
-        if image is None:
-            item["VQA_score"] = 0.0
-            item["render_score"] = item.get("render_score", 0.0)
-            item["VQAeval"] = []
-            output_data.append(item)
-            continue
-        
-        # Run VQA evaluation in a single call with JSON output
-        vqa_questions = item.get("VQA", [])
-        total_questions = len(vqa_questions)
-        if total_questions == 0:
-            item["VQA_score"] = 0.0
-            item["VQAeval"] = []
-            output_data.append(item)
-            continue
+    if total is None:
+        total = len(data) if hasattr(data, "__len__") else "?"
 
-        # Build the question-answer list for the prompt
-        qa_list = ""
-        for idx, vqa in enumerate(vqa_questions, 1):
-            qa_list += f"{idx}. Question: {vqa['question']} Expected Answer: {vqa['answer']}\n"
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "You are given an image and a list of question-answer pairs. "
-                            "For each pair, verify if the image content supports the expected answer based on the corresponding question. "
-                            "If the image is fully white, then you should always output false"
-                            "Base your judgment solely on the visual content of the provided image, and the question. Do not imagine anything. "
-                            "Do not use any external information or common-sense reasoning beyond what is visible. "
-                            "Respond with a JSON object mapping each question number to true or false (e.g., {\"1\": true, \"2\": false}). "
-                            "If the image is unclear or does not contain enough information to answer, use null for that question. "
-                            "Here are the question-answer pairs:\n"
-                            f"{qa_list}"
-                        )
-                    },
-                    {
-                        "type": "image",
-                        "image": image
-                    }
-                ]
-            }
-        ]
+    max_retries = take_retry_budget(kwargs)
+    if llm is None:
+        try:
+            from llm_engines import LLMEngine
+        except ImportError:
+            logging.error("LLMEngine not found. VQA evaluation not available.")
+            data = list(data)
+            for item in data:
+                item["VQA_score"] = 0.0
+                item["VQAeval"] = ["NONE"]
+            return data
+
+        llm = LLMEngine()
 
         try:
-            response = llm.call_model(model_name, messages, temperature=0.0, max_tokens=None)
-            parsed = json.loads(response)
-            evaluations = [parsed.get(str(idx)) for idx in range(1, total_questions + 1)]
-            true_count = sum(1 for ans in evaluations if ans is True)
+            llm.load_model(
+                model_name=model_name,
+                engine=vlm_engine,
+                use_cache=False,
+                **kwargs
+            )
         except Exception as e:
-            logging.error(f"VQA evaluation failed for {task_id}: {e}")
-            evaluations = [None] * total_questions
-            true_count = 0
-
-        item["VQA_score"] = true_count / total_questions
-        item["VQAeval"] = evaluations
-        output_data.append(item)
-    
+            logging.error(f"Failed to load VLM model: {e}")
+            data = list(data)
+            for item in data:
+                item["VQA_score"] = 0.0
+                item["VQAeval"] = ["FAILURE: Model loading error"]
+            return data
+
+    logging.info(f"Running VQA evaluation with model {model_name} on {total} tasks "
+                 f"({vqa_num_proc} parallel requests)")
+
+    if vqa_debug_images_dir:
+        os.makedirs(vqa_debug_images_dir, exist_ok=True)
+
+    cache = VQACache(vqa_cache_path, vqa_cache_mode) if vqa_cache_path else None
+
+    # Images are preprocessed in their own pool, ahead of the VLM requests.
+    # The window bounds how many tasks are queued or in flight, so at most
+    # that many preprocessed images are held in memory at once.
+    limiter = AdaptiveLimiter(
+        vqa_num_proc, vqa_max_concurrency, adaptive=vqa_adaptive_concurrency, max_retries=max_retries, name="VQA"
+    )
+    num_proc = limiter.max_workers
+    window = threading.BoundedSemaphore(2 * num_proc + max(1, vqa_preprocess_workers))
+
+    hedger = None
+    hedge_llm = None
+    if vqa_hedge_percentile:
+        hedger = Hedger(vqa_hedge_percentile, vqa_hedge_budget, max_workers=2 * num_proc, name="VQA")
+        if vqa_hedge_engine and vqa_hedge_engine != vlm_engine:
+            from llm_engines import LLMEngine
+
+            hedge_llm = LLMEngine()
+            hedge_llm.load_model(model_name=model_name, engine=vqa_hedge_engine, use_cache=False, **kwargs)
+    progress_lock = threading.Lock()
+    completed = [0]
+
+    def on_done(future: Future, item: Dict[str, Any]) -> None:
+        window.release()
+        error = future.exception()
+        with progress_lock:
+            completed[0] += 1
+            print(f"Evaluated VQA task {completed[0]} of {total} ({item.get('task_id')})")
+            if error is not None:
+                logging.error(f"VQA evaluation failed for {item.get('task_id')}: {error}")
+                item["VQA_score"] = 0.0
+                item["VQAeval"] = [None] * len(item.get("VQA", []))
+
+    # Every item is scored in place, so the output keeps the order of data
+    # whatever order the requests complete in
+    output_data = []
+    with ThreadPoolExecutor(max_workers=max(1, vqa_preprocess_workers)) as preprocess_pool, \
+            ThreadPoolExecutor(max_workers=num_proc) as vlm_pool:
+        for item in data:
+            output_data.append(item)
+            task_id = item.get("task_id")
+            img_file = images.get(task_id)
+            window.acquire()
+            # Flagged screenshots are never sent, so they are not preprocessed
+            image_future = None
+            if not item.get("image_flag"):
+                image_future = preprocess_pool.submit(
+                    preprocess_vqa_image, img_file, task_id,
+                    vqa_max_image_side, vqa_crop_whitespace, vqa_debug_images_dir,
+                )
+            future = vlm_pool.submit(
+                _evaluate_vqa_item, llm, model_name, item, img_file, image_future, cache, vqa_max_retries,
+                limiter, hedger, hedge_llm,
+            )
+            future.add_done_callback(lambda f, item=item: on_done(f, item))
+
+    print(limiter.report())
+    if hedger is not None:
+        print(hedger.report())
+        hedger.close()
+    if cache is not None:
+        stats = cache.stats()
+        logging.info(f"VQA cache {vqa_cache_path}: {stats['hits']} hits, {stats['misses']} misses")
+        cache.close()
+
     logging.info(f"VQA evaluation completed for {len(output_data)} tasks")
-    return output_data
\ No newline at end of file
+    return output_data
@@ -1,11 +1,12 @@
 import json
 import logging
 import re
-from typing import Dict, List, Any, Union, Optional
+from typing import Dict, Iterable, List, Any, Union, Optional
 
 # Import specialized evaluation modules
 from .eval_renderable import evaluate_renderable
 from .eval_nonrenderable import evaluate_nonrenderable
+from .eval_utils import raw_output_eval_batch
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -16,6 +17,7 @@ def evaluate_dataset(
     vlm_engine: Optional[str] = None,
     output_dir: str = "output_files",
     non_renderable_dir: str = "non_renderable_format_files",
+    streaming_validation: bool = False,
     **kwargs
 ) -> List[Dict[str, Any]]:
     """
@@ -28,6 +30,7 @@ def evaluate_dataset(
         vlm_engine: Engine to use for VLM evaluation
         output_dir: Directory for output files
         non_renderable_dir: Directory where non-renderable files are saved by render_engine
+        streaming_validation: Validate non-renderable paths while parsing instead of building the full structure
         additional_args: Additional arguments to pass to the VLM
         
     Returns:
@@ -60,7 +63,7 @@ def evaluate_dataset(
     
     # Case 2: Non-renderable output (both text and non-text input)
     if nonrenderable_items:
-        results.extend(evaluate_nonrenderable(nonrenderable_items, non_renderable_dir))
+        results.extend(evaluate_nonrenderable(nonrenderable_items, non_renderable_dir, streaming_validation))
     
     # Calculate final scores for all items
     for item in results:
@@ -69,6 +72,66 @@ def evaluate_dataset(
     logging.info(f"Evaluation completed for {len(results)} tasks")
     return results
 
+def evaluate_stream(
+    stream: Iterable[Dict[str, Any]],
+    images: Dict[str, str],
+    vlm_model_name: Optional[str] = None,
+    vlm_engine: Optional[str] = None,
+    non_renderable_dir: str = "non_renderable_format_files",
+    streaming_validation: bool = False,
+    total_renderable: Optional[int] = None,
+    **kwargs
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate tasks as they arrive, e.g. straight from the render stage.
+    Non-renderable tasks are validated on arrival and renderable tasks are
+    queued for VQA right away. The result matches evaluate_dataset on the
+    same tasks: renderable tasks first, then non-renderable, each in arrival order.
+
+    Args:
+        stream: Tasks in dataset order
+        images: Dictionary mapping task_id to image paths, filled in before each task arrives
+        vlm_model_name: Name of the VLM model to use (for renderable outputs)
+        vlm_engine: Engine to use for VLM evaluation
+        non_renderable_dir: Directory where non-renderable files are saved by render_engine
+        streaming_validation: Validate non-renderable paths while parsing instead of building the full structure
+        total_renderable: Number of renderable tasks, for progress output
+        additional_args: Additional arguments to pass to the VLM
+
+    Returns:
+        List of evaluated task items with scores
+    """
+    nonrenderable_items = []
+
+    def renderable_stream():
+        for item in stream:
+            if item.get("rendering", False):
+                raw_output_eval_batch([item])
+                yield item
+            else:
+                nonrenderable_items.extend(
+                    evaluate_nonrenderable([item], non_renderable_dir, streaming_validation)
+                )
+
+    if vlm_model_name and vlm_engine:
+        from .eval_vqa import vqa_eval
+        renderable_items = vqa_eval(
+            vlm_model_name, vlm_engine, renderable_stream(), images, total_renderable, **kwargs
+        )
+    else:
+        # If no VLM, set VQA score to None
+        renderable_items = list(renderable_stream())
+        for item in renderable_items:
+            item["VQA_score"] = None
+            item["VQAeval"] = []
+
+    results = renderable_items + nonrenderable_items
+    for item in results:
+        calculate_final_score(item)
+
+    logging.info(f"Evaluation completed for {len(results)} tasks")
+    return results
+
 def calculate_final_score(item: Dict[str, Any]) -> None:
     """
     Calculate the final evaluation score based on item type.
@@ -0,0 +1,83 @@
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+import numpy as np
+from PIL import Image
+from sqlite_cache import SQLiteCache
+
+# On-disk cache of VQA verdicts. An entry is keyed by the task and everything
+# that can change the VLM's answer: model, decoding params, image, prompt
+# template version and the QA list, so a re-run only asks the VLM about
+# images or questions that actually changed. Verdicts are never shared
+# between tasks, even in phash mode where near-identical images share a hash.
+
+CACHE_MODES = ("exact", "phash")
+
+
+def exact_image_hash(image: Image.Image) -> str:
+    """Hash of the decoded pixels, independent of how the PNG was encoded."""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_image_hash(image: Image.Image, hash_size: int = 16) -> str:
+    """
+    Difference hash (dHash): near-identical images (anti-aliasing, a few pixels
+    of layout shift) share the same hash.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int("".join("1" if bit else "0" for bit in bits), 2)
+    return f"dhash{hash_size}:{value:0{hash_size * hash_size // 4}x}"
+
+
+def qa_list_hash(vqa_questions: List[Dict[str, Any]]) -> str:
+    pairs = [[vqa.get("question"), vqa.get("answer")] for vqa in vqa_questions]
+    return hashlib.sha256(json.dumps(pairs, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class VQACache(SQLiteCache):
+    """
+    SQLite-backed VQA verdict cache, safe to share between the VQA threads.
+
+    Args:
+        path: SQLite database file
+        mode: "exact" to key on the decoded pixels, "phash" (opt-in) to key on
+            a perceptual hash so near-identical images of a task share verdicts
+    """
+
+    table = "vqa_verdicts"
+    columns = ("model TEXT", "image_hash TEXT", "evaluations TEXT")
+    value_column = "evaluations"
+
+    def __init__(self, path: str, mode: str = "exact"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown VQA cache mode {mode!r}, expected one of {CACHE_MODES}")
+        super().__init__(path)
+        self.mode = mode
+
+    def image_hash(self, image: Image.Image) -> str:
+        if self.mode == "phash":
+            return perceptual_image_hash(image)
+        return exact_image_hash(image)
+
+    def make_key(
+        self,
+        task_id: str,
+        model_name: str,
+        decoding_params: Dict[str, Any],
+        image_hash: str,
+        prompt_version: int,
+        vqa_questions: List[Dict[str, Any]],
+    ) -> str:
+        fields = [task_id, model_name, decoding_params, image_hash, prompt_version, qa_list_hash(vqa_questions)]
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        evaluations = super().get(key)
+        return json.loads(evaluations) if evaluations is not None else None
+
+    def put(self, key: str, model_name: str, image_hash: str, evaluations: List[Any]) -> None:
+        self._put(key, (model_name, image_hash, json.dumps(evaluations)))
@@ -0,0 +1,87 @@
+import os
+import logging
+from typing import Optional
+import numpy as np
+from PIL import Image, ImageChops
+
+
+def crop_whitespace(image: Image.Image, tolerance: int = 8, padding: int = 8) -> Image.Image:
+    """
+    Crop the uniform border around the rendered content. The border colour is
+    taken from the corners, so nothing is cropped unless all four agree.
+
+    Args:
+        image: RGB image
+        tolerance: Per-channel distance under which a pixel counts as background
+        padding: Background pixels kept around the content
+
+    Returns:
+        The cropped image, or the image itself if there is nothing to crop
+    """
+    width, height = image.size
+    if width == 0 or height == 0:
+        return image
+
+    corner_xy = ((0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1))
+    corners = np.array([image.getpixel(xy) for xy in corner_xy], dtype=np.int16)
+    background = tuple(int(v) for v in corners[0])
+    if (np.abs(corners - corners[0]) > tolerance).any():
+        return image
+
+    # Pillow does the full-size pass in C: distance to the background, thresholded
+    diff = ImageChops.difference(image, Image.new(image.mode, image.size, background))
+    content = diff.point(lambda v: 255 if v > tolerance else 0).getbbox()
+    if content is None:
+        return image  # blank image, keep it as rendered
+
+    left, top, right, bottom = content
+    box = (
+        max(left - padding, 0),
+        max(top - padding, 0),
+        min(right + padding, width),
+        min(bottom + padding, height),
+    )
+    if box == (0, 0, width, height):
+        return image
+    return image.crop(box)
+
+
+def preprocess_vqa_image(
+    img_file: str,
+    task_id: str = "",
+    max_side: Optional[int] = 2048,
+    crop: bool = True,
+    debug_dir: Optional[str] = None,
+) -> Optional[Image.Image]:
+    """
+    Prepare a rendered screenshot for the VLM: decode, crop the surrounding
+    whitespace and downscale to the VLM's maximum resolution, once per task.
+
+    Args:
+        img_file: Path to the rendered PNG
+        task_id: Task ID, names the debug copy
+        max_side: Longest side the VLM uses; larger images are downscaled (None or 0 keeps full size)
+        crop: Crop the uniform border around the content
+        debug_dir: If set, save the preprocessed image there as {task_id}.png
+
+    Returns:
+        The RGB image sent to the VLM, or None if it cannot be loaded
+    """
+    if not img_file or not os.path.exists(img_file):
+        return None
+    try:
+        with Image.open(img_file) as img:
+            image = img.convert("RGB")
+
+        if crop:
+            image = crop_whitespace(image)
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        if debug_dir:
+            image.save(os.path.join(debug_dir, f"{task_id}.png"))
+            logging.info(f"Saved debug image for task_id {task_id}")
+        return image
+    except Exception as e:
+        logging.error(f"Failed to load image for {task_id}: {e}")
+        return None
@@ -0,0 +1,38 @@
+import json
+import hashlib
+from typing import Any, Dict, List, Union
+from sqlite_cache import SQLiteCache
+
+# On-disk cache of generations. An entry is keyed by everything that
+# determines the completion: model, engine, the full prompt, sampling params
+# and the sample index, so unrelated setting changes or a crashed run reuse
+# the completions that were already paid for.
+
+CACHE_MODES = ("use", "refresh", "off")
+
+
+class GenerationCache(SQLiteCache):
+    """
+    SQLite-backed generation cache, safe to share between inference threads.
+
+    Args:
+        path: SQLite database file
+    """
+
+    table = "generations"
+    columns = ("model TEXT", "engine TEXT", "generation TEXT")
+    value_column = "generation"
+
+    @staticmethod
+    def make_key(
+        model_name: str,
+        engine: str,
+        prompt: Union[str, List[Any]],
+        sampling_params: Dict[str, Any],
+        sample_index: int = 0,
+    ) -> str:
+        fields = [model_name, engine, prompt, sampling_params, sample_index]
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def put(self, key: str, model_name: str, engine: str, generation: str) -> None:
+        self._put(key, (model_name, engine, generation))
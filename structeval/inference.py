@@ -1,23 +1,519 @@
 from dotenv import load_dotenv
 import os
+import json
+import logging
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from llm_engines import LLMEngine
-import torch
-
-def run_inference(model_name: str, llm_engine: str, queries: list[str], **kwargs):
-    """Using llm_engines to run inference."""
-    
-    llm = LLMEngine()
-
-    llm.load_model(
-        model_name=model_name, 
-        engine=llm_engine,
-        num_workers=1, 
-        num_gpu_per_worker=1,
-        use_cache=False,
-        **kwargs
-    )   
-
-    responses = llm.batch_call_model(model_name, queries,num_proc=32, timeout=None,  disable_batch_api=True, temperature=1.0, max_tokens=None)
+from generation_cache import GenerationCache, CACHE_MODES
+from concurrency import AdaptiveLimiter, Hedger, engine_call, take_retry_budget
+from results_store import ResultsStore
+from render_engine.render_utils import determine_output_type
+
+SAMPLING_PARAMS = {"temperature": 1.0, "max_tokens": None}
+
+# Output instruction shared by every prompt
+FORMAT_INSTRUCTION = (
+    "IMPORTANT: Only output the required output format. You must start the format/code with <|BEGIN_CODE|> "
+    "and end the format/code with  <|END_CODE|>. No other text output (explanation, comments, etc.) are allowed.  "
+    "Do not use markdown code fences."
+)
+# Models whose thinking mode is switched off in the prompt
+NO_THINK_MODELS = ("Qwen/Qwen3-4B",)
+
+# suffix: query first, instruction last (the original layout)
+# prefix: instruction first, so engines with prefix caching reuse it
+# system: instruction in the system message, the query alone as the user turn
+PROMPT_LAYOUTS = ("suffix", "prefix", "system")
+DISPATCH_ORDERS = ("dataset", "longest_first")
+
+# Every prompt asks the model to close its answer with this tag
+END_CODE_TAG = "<|END_CODE|>"
+
+# Stop sequences go to the API under this name where it is not "stop"
+STOP_PARAM_BY_ENGINE = {"claude": "stop_sequences"}
+
+# Engines return text only, so lengths in tokens are estimated
+APPROX_CHARS_PER_TOKEN = 3.5
+
+# finish_reason values of the APIs for a completion cut by max_tokens
+LENGTH_FINISH_REASONS = ("length", "max_tokens")
+
+
+def build_prompt(query: str, model_name: str, layout: str = "suffix") -> Tuple[str, Optional[str]]:
+    """
+    Combine a task query with the shared output instruction.
+
+    Args:
+        query: Task query
+        model_name: Name of the LLM
+        layout: One of PROMPT_LAYOUTS
+
+    Returns:
+        (prompt, system message or None)
+    """
+    no_think = "\n\n/no_think" if model_name in NO_THINK_MODELS else ""
+    if layout == "suffix":
+        # Kept byte for byte so earlier cached generations still match
+        indent = "\n" + " " * 12
+        return f"{query}{indent}\n\n{FORMAT_INSTRUCTION}{indent}{no_think}{indent}", None
+    instruction = FORMAT_INSTRUCTION + no_think
+    if layout == "prefix":
+        return f"{instruction}\n\n{query}", None
+    if layout == "system":
+        return query, instruction
+    raise ValueError(f"Unknown prompt layout {layout!r}, expected one of {PROMPT_LAYOUTS}")
+
+
+def load_max_tokens(budgets: Union[int, str, Dict[str, int], None]) -> Union[int, Dict[str, int], None]:
+    """
+    Resolve a max_tokens argument: a string is the path of a JSON file of
+    budgets by type, as written by scripts/token_budgets.py.
+    """
+    if isinstance(budgets, str):
+        with open(budgets, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return budgets
+
+
+def max_tokens_for(output_type: str, budgets: Union[int, Dict[str, int], None] = None) -> Optional[int]:
+    """
+    Generation budget of an output type.
+
+    Args:
+        output_type: Output type as returned by determine_output_type
+        budgets: None or 0 for no limit, a budget for every type, or a dict
+            of budgets by type (types not in it have no limit)
+
+    Returns:
+        max_tokens to request, None for no limit
+    """
+    if not budgets:
+        return None
+    if isinstance(budgets, int):
+        return budgets
+    if isinstance(budgets, dict):
+        return {k.lower(): v for k, v in budgets.items()}.get(output_type.lower()) or None
+    raise ValueError(f"max_tokens must be a number, a dict of budgets by type or a JSON file of them, got {budgets!r}")
+
+
+def generation_stop_reason(generation: Optional[str], max_tokens: Optional[int]) -> Optional[str]:
+    """
+    Why a generation ended, for auditing truncation. A generation carrying
+    the API's finish_reason (as an attribute) is judged by it. llm_engines
+    returns only the message text for every backend, and the APIs drop the
+    stop sequence that ended it, so otherwise this is judged by length: a
+    generation of about the whole budget (at APPROX_CHARS_PER_TOKEN) counts
+    as cut.
+
+    Returns:
+        "max_tokens" if it (likely) ran out of budget, "stop" otherwise, None
+        for a failed generation
+    """
+    if generation is None:
+        return None
+    finish_reason = getattr(generation, "finish_reason", None)
+    if finish_reason is not None:
+        return "max_tokens" if str(finish_reason).lower() in LENGTH_FINISH_REASONS else "stop"
+    if max_tokens and len(generation) / APPROX_CHARS_PER_TOKEN >= 0.9 * max_tokens:
+        return "max_tokens"
+    return "stop"
+
+
+def engine_sampling_params(engine: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Sampling params under the names the engine's client takes."""
+    stop_param = STOP_PARAM_BY_ENGINE.get(engine)
+    if stop_param is None or "stop" not in params:
+        return params
+    params = dict(params)
+    params[stop_param] = params.pop("stop")
+    return params
+
+
+def sample_task_id(task_id: str, sample_index: int, num_samples: int) -> str:
+    """
+    Task ID of one sample. With a single sample it is the task's own ID;
+    otherwise a suffix keeps the type code at task_id[2:4] intact.
+    """
+    return task_id if num_samples <= 1 else f"{task_id}_s{sample_index}"
+
+
+def load_partial_generations(path: str) -> Dict[str, str]:
+    """
+    Read the completed generations of an interrupted run.
+
+    Args:
+        path: Append-only JSONL written by `structeval inference`, one
+            {"task_id", "generation"} record per line
+
+    Returns:
+        Generations by task_id; a line cut off by a crash is ignored
+    """
+    completed: Dict[str, str] = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping incomplete line {line_no} of {path}")
+                continue
+            if record.get("generation") is not None:
+                completed[record["task_id"]] = record["generation"]
+    return completed
+
+
+def run_inference(
+    model_name: str,
+    llm_engine: str,
+    queries: list[str],
+    num_proc: int = 32,
+    cache_path: Optional[str] = None,
+    cache_mode: str = "use",
+    on_result: Optional[Callable[[int, Optional[str]], None]] = None,
+    stop: Optional[List[str]] = None,
+    max_tokens: Union[int, List[Optional[int]], None] = None,
+    system_message: Optional[str] = None,
+    dispatch_order: str = "dataset",
+    num_samples: int = 1,
+    adaptive_concurrency: bool = False,
+    max_concurrency: Optional[int] = None,
+    hedge_percentile: Optional[float] = None,
+    hedge_budget: float = 0.05,
+    hedge_engine: Optional[str] = None,
+    **kwargs,
+) -> List[Optional[str]]:
+    """
+    Using llm_engines to run inference.
+
+    Args:
+        model_name: Name of the LLM
+        llm_engine: Engine for running inference
+        queries: Prompts, one per task
+        num_proc: Number of requests in flight at once (initial number when adaptive)
+        cache_path: SQLite generation cache, None to disable
+        cache_mode: "use" to reuse cached generations, "refresh" to regenerate
+            and overwrite them, "off" to bypass the cache
+        on_result: Called with (result index, generation) as each generation
+            completes, cached ones included
+        stop: Stop sequences, END_CODE_TAG is always included
+        max_tokens: Generation budget for all queries, or one per query
+        system_message: System message sent with every query
+        dispatch_order: "dataset" sends queries in order, "longest_first" sends
+            those with the largest max_tokens budget (the expected output
+            length) first, so long generations do not trail at the end
+        num_samples: Completions per query. They are requested in one call with
+            the engine's native n parameter, so the prompt is prefilled once;
+            engines without it get one call per sample
+        adaptive_concurrency: Adapt the requests in flight to the engine,
+            starting at num_proc; otherwise num_proc is fixed. Rate-limited and
+            timed-out requests are retried after a backoff either way
+        max_concurrency: Upper bound of the adaptive concurrency
+        hedge_percentile: Send a duplicate of requests slower than this
+            percentile of recent latencies, first response wins (None disables)
+        hedge_budget: Maximum duplicates as a fraction of requests
+        hedge_engine: Engine serving the same model to send duplicates to
+            (default: llm_engine)
+        additional_args: Additional arguments to pass to load_model
+
+    Returns:
+        Generations in the order of queries, num_samples consecutive entries
+        per query (None for failed requests)
+    """
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"Unknown generation cache mode {cache_mode!r}, expected one of {CACHE_MODES}")
+    if dispatch_order not in DISPATCH_ORDERS:
+        raise ValueError(f"Unknown dispatch order {dispatch_order!r}, expected one of {DISPATCH_ORDERS}")
+    num_samples = max(1, num_samples)
+    cache = GenerationCache(cache_path) if cache_path and cache_mode != "off" else None
+
+    stop = [END_CODE_TAG] + [seq for seq in (stop or []) if seq != END_CODE_TAG]
+    if not isinstance(max_tokens, list):
+        max_tokens = [max_tokens] * len(queries)
+    sampling_params = [{**SAMPLING_PARAMS, "max_tokens": budget, "stop": stop} for budget in max_tokens]
+
+    # Results are indexed query-major: query idx, sample k -> idx * num_samples + k
+    responses: List[Optional[str]] = [None] * (len(queries) * num_samples)
+    keys = [None] * len(responses)
+    pending: Dict[int, List[int]] = {}
+    for idx, query in enumerate(queries):
+        for k in range(num_samples):
+            pos = idx * num_samples + k
+            if cache is not None:
+                prompt = [system_message, query] if system_message else query
+                keys[pos] = GenerationCache.make_key(model_name, llm_engine, prompt, sampling_params[idx], k)
+                if cache_mode == "use":
+                    cached = cache.get(keys[pos])
+                    if cached is not None:
+                        responses[pos] = cached
+                        if on_result is not None:
+                            on_result(pos, cached)
+                        continue
+            pending.setdefault(idx, []).append(k)
+
+    total_pending = sum(len(samples) for samples in pending.values())
+    if cache is not None:
+        logging.info(f"Generation cache {cache_path}: {len(responses) - total_pending} cached, {total_pending} to generate")
+
+    order = list(pending)
+    if dispatch_order == "longest_first":
+        # Responses are stored by query index, so the order only affects scheduling
+        order.sort(key=lambda idx: (max_tokens[idx] or float("inf"), len(queries[idx])), reverse=True)
+
+    if pending:
+        max_retries = take_retry_budget(kwargs)
+        llm = LLMEngine()
+
+        llm.load_model(
+            model_name=model_name,
+            engine=llm_engine,
+            num_workers=1,
+            num_gpu_per_worker=1,
+            use_cache=False,
+            **kwargs
+        )
+
+        def messages_for(query):
+            # llm_engines takes the system message from the messages and
+            # overrides a conv_system_msg passed alongside a plain string
+            if not system_message:
+                return query
+            return [{"role": "system", "content": system_message}, {"role": "user", "content": query}]
+        native_n = [True]
+        limiter = AdaptiveLimiter(
+            num_proc, max_concurrency, adaptive=adaptive_concurrency, max_retries=max_retries, name="Inference"
+        )
+
+        hedger = None
+        hedge_llm = llm
+        if hedge_percentile:
+            hedger = Hedger(hedge_percentile, hedge_budget, max_workers=2 * limiter.max_workers, name="Inference")
+            if hedge_engine and hedge_engine != llm_engine:
+                hedge_llm = LLMEngine()
+                hedge_llm.load_model(
+                    model_name=model_name,
+                    engine=hedge_engine,
+                    num_workers=1,
+                    num_gpu_per_worker=1,
+                    use_cache=False,
+                    **kwargs
+                )
+
+        primary_call = engine_call(llm, model_name)
+        hedge_call = engine_call(hedge_llm, model_name)
+
+        def call(idx, **extra):
+            def request(engine_fn, engine_name):
+                params = engine_sampling_params(engine_name, sampling_params[idx])
+                return lambda: limiter.call(
+                    engine_fn, messages_for(queries[idx]), timeout=None, **params, **extra
+                )
+
+            if hedger is None:
+                return request(primary_call, llm_engine)()
+            return hedger.call(
+                request(primary_call, llm_engine), request(hedge_call, hedge_engine or llm_engine)
+            )
+
+        def generate(idx):
+            samples = pending[idx]
+            outputs = []
+            if len(samples) > 1 and native_n[0]:
+                try:
+                    sampled = call(idx, n=len(samples))
+                    if isinstance(sampled, list) and len(sampled) == len(samples):
+                        return sampled
+                    if isinstance(sampled, str):
+                        # The engine ignored n and sampled once, keep that one
+                        logging.warning(f"{llm_engine} does not support n, sampling with one call per sample")
+                        native_n[0] = False
+                        outputs.append(sampled)
+                    elif sampled is None:
+                        # call_model hides why it failed, most likely the
+                        # engine's client does not take n
+                        logging.warning(f"Sampling with n failed for query {idx}, sampling with one call per sample")
+                        native_n[0] = False
+                except Exception as e:
+                    logging.warning(f"Sampling with n failed for query {idx}, retrying one call per sample: {e}")
+            for k in samples[len(outputs):]:
+                try:
+                    outputs.append(call(idx))
+                except Exception as e:
+                    logging.error(f"Generation failed for query {idx} sample {k}: {e}")
+                    outputs.append(None)
+            return outputs
+
+        # Entries are written as they complete, so a crash keeps what was generated
+        with ThreadPoolExecutor(max_workers=limiter.max_workers) as executor:
+            futures = {executor.submit(generate, idx): idx for idx in order}
+            counter = 0
+            for future in as_completed(futures):
+                idx = futures[future]
+                for k, generation in zip(pending[idx], future.result()):
+                    pos = idx * num_samples + k
+                    responses[pos] = generation
+                    if cache is not None and generation is not None:
+                        cache.put(keys[pos], model_name, llm_engine, generation)
+                    if on_result is not None:
+                        on_result(pos, generation)
+                    counter += 1
+                    if counter % 50 == 0 or counter == total_pending:
+                        print(f"Generated {counter} of {total_pending}")
+        print(limiter.report())
+        if hedger is not None:
+            print(hedger.report())
+            hedger.close()
+
+    if cache is not None:
+        cache.close()
     return responses
-    
-    
\ No newline at end of file
+
+
+def generate_dataset(
+    data: List[Dict[str, Any]],
+    llm_model_name: str,
+    llm_engine: str,
+    partial_path: Optional[str] = None,
+    resume: bool = False,
+    generation_cache_path: Optional[str] = None,
+    generation_cache: str = "use",
+    stop: Optional[List[str]] = None,
+    max_tokens: Union[int, str, Dict[str, int], None] = None,
+    prompt_layout: str = "suffix",
+    dispatch_order: str = "dataset",
+    num_samples: int = 1,
+    results_store: Optional[ResultsStore] = None,
+    run_id: Optional[str] = None,
+    **kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    Generate the dataset's tasks, as `structeval inference` does.
+
+    Args:
+        data: Tasks of the input dataset
+        llm_model_name: Name of the LLM
+        llm_engine: Engine for running inference
+        partial_path: Append-only JSONL receiving each generation as it
+            completes, None to keep them in memory only
+        resume: Reuse the generations already in partial_path
+        generation_cache_path: SQLite generation cache (default: no cache)
+        generation_cache: "use", "refresh" or "off"
+        stop: Extra stop sequences
+        max_tokens: See max_tokens_for, or the path of a JSON file of
+            budgets by type (default: no limit)
+        prompt_layout: One of PROMPT_LAYOUTS
+        dispatch_order: One of DISPATCH_ORDERS
+        num_samples: Completions per task
+        results_store: Store receiving each generation as it completes
+        run_id: Run of the generations in results_store (default: llm_model_name)
+        additional_args: Additional arguments to pass to run_inference
+
+    Returns:
+        The tasks with their generations in dataset order, one row per sample
+    """
+    completed = load_partial_generations(partial_path) if resume and partial_path else {}
+    sample_ids = [
+        [sample_task_id(item["task_id"], k, num_samples) for k in range(num_samples)]
+        for item in data
+    ]
+    todo = [
+        item for item, ids in zip(data, sample_ids)
+        if any(task_id not in completed for task_id in ids)
+    ]
+    if completed:
+        print(f"Resuming from {partial_path}: {len(data) - len(todo)} completed, {len(todo)} to generate")
+
+    prompts = [build_prompt(item["query"], llm_model_name, prompt_layout) for item in todo]
+    queries = [prompt for prompt, _ in prompts]
+    system_message = prompts[0][1] if prompts else None
+
+    run_id = run_id or llm_model_name
+    if results_store is not None:
+        results_store.start_run(run_id, llm_model=llm_model_name)
+        results_store.add_tasks(data)
+
+    if llm_model_name == "Qwen/Qwen3-4B":
+        print("Qwen3-4B I'm here")
+
+    def result_task_id(pos):
+        return sample_task_id(todo[pos // num_samples]["task_id"], pos % num_samples, num_samples)
+
+    max_tokens = load_max_tokens(max_tokens)
+    budgets = [max_tokens_for(determine_output_type(item["task_id"]), max_tokens) for item in todo]
+    # Generations written to the results store as they completed
+    recorded = set()
+
+    if partial_path:
+        partial = open(partial_path, "a" if resume else "w", encoding="utf-8")
+    else:
+        partial = contextlib.nullcontext()
+    with partial as partial_file:
+        if partial_file is not None and partial_file.tell() > 0:
+            partial_file.write("\n")  # ends a line cut off by a crash; blank lines are skipped
+
+        def write_partial(pos, generation):
+            if generation is None:
+                return
+            if results_store is not None:
+                base_task_id = todo[pos // num_samples]["task_id"]
+                results_store.record_generation(
+                    run_id, result_task_id(pos), generation, base_task_id, pos % num_samples,
+                    max_tokens=budgets[pos // num_samples],
+                )
+                recorded.add(result_task_id(pos))
+            if partial_file is None:
+                return
+            record = {"task_id": result_task_id(pos), "generation": generation}
+            partial_file.write(json.dumps(record) + "\n")
+            partial_file.flush()
+
+        generations = run_inference(
+            llm_model_name,
+            llm_engine,
+            queries,
+            cache_path=generation_cache_path,
+            cache_mode=generation_cache,
+            on_result=write_partial,
+            stop=stop,
+            max_tokens=budgets,
+            system_message=system_message,
+            dispatch_order=dispatch_order,
+            num_samples=num_samples,
+            **kwargs,
+        )
+
+    for pos, generation in enumerate(generations):
+        if generation is not None:
+            completed[result_task_id(pos)] = generation
+
+    output_data = []
+    for item, ids in zip(data, sample_ids):
+        for k, task_id in enumerate(ids):
+            if num_samples > 1:
+                row = {**item, "task_id": task_id, "base_task_id": item["task_id"], "sample_index": k}
+            else:
+                row = item
+            row["generation"] = completed.get(task_id)
+            row["generation_max_tokens"] = max_tokens_for(determine_output_type(task_id), max_tokens)
+            row["generation_stop"] = generation_stop_reason(row["generation"], row["generation_max_tokens"])
+            output_data.append(row)
+
+    if results_store is not None:
+        # Completed generations were recorded as they came in and only get the
+        # final fields; resumed and failed ones are recorded now
+        results_store.update_generations(run_id, [row for row in output_data if row["task_id"] in recorded])
+        unrecorded = [row for row in output_data if row["task_id"] not in recorded]
+        if unrecorded:
+            results_store.record_generations(run_id, unrecorded)
+
+    truncated = sum(1 for item in output_data if item["generation_stop"] == "max_tokens")
+    if truncated:
+        print(f"{truncated} generations likely cut at their max_tokens budget")
+    missing = sum(1 for item in output_data if item["generation"] is None)
+    if missing:
+        print(f"{missing} generations failed, rerun with --resume to retry them")
+    return output_data
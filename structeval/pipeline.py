@@ -0,0 +1,220 @@
+import os
+import json
+import queue
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from render_engine.main import render_task
+from eval_engine.main import evaluate_stream
+from inference import generate_dataset
+from results_store import ResultsStore
+
+# Marks the end of the render stream
+_DONE = object()
+
+
+def _put(
+    tasks_queue: queue.Queue, task: Any, consumer: threading.Thread, errors: List[BaseException]
+) -> None:
+    """
+    Blocking put that gives up if the evaluation thread died, raising from
+    the error that stopped it.
+    """
+    while True:
+        if not consumer.is_alive():
+            error = RuntimeError("Evaluation stage stopped before rendering finished")
+            raise error from (errors[0] if errors else None)
+        try:
+            tasks_queue.put(task, timeout=1.0)
+            return
+        except queue.Full:
+            pass
+
+
+async def render_and_evaluate(
+    tasks: List[Dict[str, Any]],
+    img_output_path: str,
+    non_renderable_dir: str,
+    vlm_model_name: Optional[str] = None,
+    vlm_engine: Optional[str] = None,
+    save_non_renderable_files: bool = True,
+    streaming_validation: bool = False,
+    queue_size: int = 16,
+    copy_tasks: bool = True,
+    on_rendered: Optional[Callable[[Dict[str, Any]], None]] = None,
+    **kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    Render and evaluate in one pass: every task is handed to evaluation as
+    soon as it is rendered, so VQA runs while the remaining tasks render.
+    A bounded queue between the stages pauses rendering when evaluation
+    falls behind.
+
+    The tasks are updated with their render results exactly like
+    `structeval render`, and the returned list is what `structeval evaluate`
+    produces on the rendered file.
+
+    Args:
+        tasks: Tasks with generations, in dataset order
+        img_output_path: Directory to save rendered images
+        non_renderable_dir: Directory to save non-renderable outputs
+        vlm_model_name: Name of the VLM model to use (for renderable outputs)
+        vlm_engine: Engine to use for VLM evaluation
+        save_non_renderable_files: Write non-renderable code to non_renderable_dir
+        streaming_validation: Validate non-renderable paths while parsing
+        queue_size: Rendered tasks waiting for evaluation before rendering pauses
+        copy_tasks: Evaluate a copy of each rendered task, as the two-step flow
+            reads it back from the rendered file; False evaluates the task dicts
+            themselves, which then also receive the scores
+        on_rendered: Called with each task once it is rendered
+        additional_args: Additional arguments to pass to the VLM
+
+    Returns:
+        List of evaluated task items with scores
+    """
+    os.makedirs(img_output_path, exist_ok=True)
+    os.makedirs(non_renderable_dir, exist_ok=True)
+
+    tasks_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    images: Dict[str, str] = {}
+    results: List[Dict[str, Any]] = []
+    errors: List[BaseException] = []
+
+    def stream():
+        while True:
+            task = tasks_queue.get()
+            if task is _DONE:
+                return
+            yield task
+
+    def evaluate():
+        try:
+            results.extend(evaluate_stream(
+                stream(),
+                images,
+                vlm_model_name,
+                vlm_engine,
+                non_renderable_dir=non_renderable_dir,
+                streaming_validation=streaming_validation,
+                total_renderable=sum(1 for task in tasks if task.get("rendering", False)),
+                **kwargs,
+            ))
+        except BaseException as e:
+            errors.append(e)
+
+    consumer = threading.Thread(target=evaluate, name="structeval-evaluate", daemon=True)
+    consumer.start()
+
+    try:
+        for counter, task in enumerate(tasks, 1):
+            print(f"Rendering task {task['task_id']} of {counter} out of {len(tasks)}")
+            await render_task(task, img_output_path, non_renderable_dir, save_non_renderable_files)
+            if on_rendered is not None:
+                on_rendered(task)
+
+            image_path = f"{img_output_path}/{task['task_id']}.png"
+            if os.path.exists(image_path):
+                images[task["task_id"]] = image_path
+            # Evaluation gets what the two-step flow would read back from the rendered file
+            handoff = json.loads(json.dumps(task)) if copy_tasks else task
+            await asyncio.to_thread(_put, tasks_queue, handoff, consumer, errors)
+    finally:
+        if consumer.is_alive():
+            await asyncio.to_thread(_put, tasks_queue, _DONE, consumer, errors)
+        await asyncio.to_thread(consumer.join)
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+async def run_benchmark(
+    tasks: List[Dict[str, Any]],
+    llm_model_name: str,
+    llm_engine: str,
+    vlm_model_name: str,
+    vlm_engine: str,
+    output_dir: str,
+    resume: bool = False,
+    save_non_renderable_files: bool = True,
+    streaming_validation: bool = False,
+    queue_size: int = 16,
+    inference_options: Optional[Dict[str, Any]] = None,
+    results_store: Optional[ResultsStore] = None,
+    run_id: Optional[str] = None,
+    **kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    Inference, render and evaluation in one process. Task records are handed
+    from stage to stage in memory; files are only written as checkpoints, in output_dir:
+
+      inference_output.json                 generations, once inference is done
+      inference_output.json.partial.jsonl   each generation as it arrives
+      rendered_images/                      screenshots
+      non_renderable_format_files/          non-renderable code (optional)
+      evaluation_results.json               final results
+
+    Args:
+        tasks: Tasks of the input dataset
+        llm_model_name: Name of the LLM
+        llm_engine: Engine for running inference
+        vlm_model_name: Name of the VLM model to use (for renderable outputs)
+        vlm_engine: Engine to use for VLM evaluation
+        output_dir: Directory for the checkpoints and results
+        resume: Keep the generations of an interrupted run in output_dir
+        save_non_renderable_files: Write non-renderable code to output_dir
+        streaming_validation: Validate non-renderable paths while parsing
+        queue_size: Rendered tasks waiting for evaluation before rendering pauses
+        inference_options: Options of generate_dataset (sampling, cache, concurrency, ...)
+        results_store: Store receiving generations, renders and scores as each stage produces them
+        run_id: Run in results_store (default: llm_model_name)
+        additional_args: Additional arguments to pass to the VLM
+
+    Returns:
+        List of evaluated task items with scores
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    inference_path = os.path.join(output_dir, "inference_output.json")
+    run_id = run_id or llm_model_name
+    on_rendered = None
+    if results_store is not None:
+        results_store.start_run(run_id, llm_model_name, vlm_model_name, paths=[inference_path])
+
+        def on_rendered(task):
+            results_store.record_render(run_id, task)
+
+    rows = await asyncio.to_thread(
+        generate_dataset,
+        tasks,
+        llm_model_name,
+        llm_engine,
+        partial_path=f"{inference_path}.partial.jsonl",
+        resume=resume,
+        results_store=results_store,
+        run_id=run_id,
+        **(inference_options or {}),
+    )
+    with open(inference_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+    logging.info(f"Inference checkpoint written to {inference_path}")
+
+    results = await render_and_evaluate(
+        rows,
+        os.path.join(output_dir, "rendered_images"),
+        os.path.join(output_dir, "non_renderable_format_files"),
+        vlm_model_name,
+        vlm_engine,
+        save_non_renderable_files=save_non_renderable_files,
+        streaming_validation=streaming_validation,
+        queue_size=queue_size,
+        copy_tasks=False,
+        on_rendered=on_rendered,
+        **kwargs,
+    )
+    if results_store is not None:
+        results_store.record_evaluation(run_id, results)
+
+    with open(os.path.join(output_dir, "evaluation_results.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return results
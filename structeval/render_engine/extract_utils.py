@@ -0,0 +1,81 @@
+import re
+from typing import NamedTuple, Optional, Tuple
+
+# Literal patterns only, so every search is a single linear scan
+_BEGIN_CODE = re.compile(r"<\|BEGIN_CODE\|>", re.IGNORECASE)
+_END_CODE = re.compile(r"<\|END_CODE\|>", re.IGNORECASE)
+_FENCE = "```"
+
+
+class CodeMatch(NamedTuple):
+    """Code extracted from a generation."""
+
+    payload: str    # extracted code, stripped
+    delimiter: str  # "begin_end" for <|BEGIN_CODE|> … <|END_CODE|>, "fence" for ``` blocks
+    start: int      # offset of the payload in the generation
+    end: int        # offset just past the payload in the generation
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[str, int, int]:
+    raw = text[start:end]
+    payload = raw.strip()
+    if payload:
+        start += len(raw) - len(raw.lstrip())
+        end = start + len(payload)
+    else:
+        end = start
+    return payload, start, end
+
+
+def _find_begin_end(text: str) -> Optional[Tuple[int, CodeMatch]]:
+    """<|BEGIN_CODE|> … <|END_CODE|>, closing tag optional."""
+    m = _BEGIN_CODE.search(text)
+    if m is None:
+        return None
+    start = m.end()
+    end_m = _END_CODE.search(text, start)
+    end = end_m.start() if end_m else len(text)
+    payload, start, end = _strip_span(text, start, end)
+    return m.start(), CodeMatch(payload, "begin_end", start, end)
+
+
+def _find_fence(text: str) -> Optional[Tuple[int, CodeMatch]]:
+    """``` fenced block with any header line, closing fence optional."""
+    pos = text.find(_FENCE)
+    if pos == -1:
+        return None
+    # The header runs to the end of the line, a fence without one is no block
+    newline = text.find("\n", pos + len(_FENCE))
+    if newline == -1:
+        return None
+    start = newline + 1
+    close = text.find(_FENCE, start)
+    end = close if close != -1 else len(text)
+    payload, start, end = _strip_span(text, start, end)
+    return pos, CodeMatch(payload, "fence", start, end)
+
+
+def extract_code(text: str, prefer_fence: bool = False) -> Optional[CodeMatch]:
+    """
+    Extract the code block from a generation in linear time.
+
+    By default the delimiter that appears first wins:
+      1. <|BEGIN_CODE|> … <|END_CODE|>   (closing tag optional)
+      2. ```fenced``` block              (any header, closing fence optional)
+
+    Args:
+        text: The generation
+        prefer_fence: Use a fenced block whenever there is one, even if it comes
+            after (or inside) a <|BEGIN_CODE|> block
+
+    Returns:
+        CodeMatch, or None if the generation has neither delimiter
+    """
+    begin_end = _find_begin_end(text)
+    fence = _find_fence(text)
+
+    if fence is not None and (prefer_fence or begin_end is None or fence[0] < begin_end[0]):
+        return fence[1]
+    if begin_end is not None:
+        return begin_end[1]
+    return None
@@ -8,27 +8,77 @@ import json
 import random
 from .render_utils import start_browser
 
+ANGULAR_PACKAGE_JSON = {
+    "name": "angular-render",
+    "version": "0.0.0",
+    "scripts": {"start": "ng serve"},
+    "dependencies": {
+        "@angular/common": "^16.0.0",
+        "@angular/compiler": "^16.0.0",
+        "@angular/core": "^16.0.0",
+        "@angular/forms": "^16.0.0",
+        "@angular/platform-browser": "^16.0.0",
+        "@angular/platform-browser-dynamic": "^16.0.0",
+        "@angular/router": "^16.0.0",
+        "rxjs": "~7.8.0",
+        "tslib": "^2.3.0",
+        "zone.js": "~0.13.0",
+    },
+    "devDependencies": {
+        "@angular-devkit/build-angular": "^16.0.0",
+        "@angular/cli": "^16.0.0",
+        "@angular/compiler-cli": "^16.0.0",
+        "typescript": "~5.0.2",
+    },
+}
 
-def extract_angular_component_from_code_tag(generation):
-    """Extract code content from <code> tags."""
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    if match:
-        code = match.group(1)
-    else:
-        # 2. Try to extract from ```<output_type>``` fenced block
-        code_fence_pattern = rf"```{output_type}\s*(.*?)```"
-        match = re.search(code_fence_pattern, generation, re.DOTALL)
-        if match:
-            code = match.group(1).strip() if match else generation.strip()
-        else:
-            fence_pattern = r"```\s*(.*?)```"
-            match = re.search(fence_pattern, generation, re.DOTALL)
-            if match:
-                code = match.group(1).strip() if match else generation.strip()
-            else:
-                code = ""
-                logging.warning(f"No correct tag found for task {task_id}")
-    return code
+# Workspace with node_modules installed once by prepare_angular_workspace(),
+# linked into every task's project instead of running npm install per task
+_ANGULAR_WORKSPACE = None
+
+
+def prepare_angular_workspace(workspace_dir=None):
+    """
+    Install the Angular dependencies once, so renders skip `npm install`.
+
+    Args:
+        workspace_dir: Where to keep the workspace (default: ~/.cache/structeval/angular-workspace)
+
+    Returns:
+        The workspace directory, or None if the install failed
+    """
+    global _ANGULAR_WORKSPACE
+    workspace_dir = os.path.abspath(
+        workspace_dir or os.path.join(os.path.expanduser("~"), ".cache", "structeval", "angular-workspace")
+    )
+    os.makedirs(workspace_dir, exist_ok=True)
+
+    package_path = os.path.join(workspace_dir, "package.json")
+    package_text = json.dumps(ANGULAR_PACKAGE_JSON, indent=2)
+    installed = os.path.isdir(os.path.join(workspace_dir, "node_modules"))
+    if installed and os.path.exists(package_path):
+        with open(package_path, "r") as f:
+            installed = f.read() == package_text
+
+    if not installed:
+        logging.info(f"Installing Angular dependencies into {workspace_dir}...")
+        with open(package_path, "w") as f:
+            f.write(package_text)
+        try:
+            subprocess.run(
+                ["npm", "install", "--legacy-peer-deps"],
+                cwd=workspace_dir,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.error(f"Failed to prepare Angular workspace: {e}")
+            return None
+
+    _ANGULAR_WORKSPACE = workspace_dir
+    logging.info(f"Angular workspace ready at {workspace_dir}")
+    return workspace_dir
 
 
 async def render_angular_and_screenshot(task_id, angular_code, img_output_path):
@@ -70,31 +120,8 @@ async def render_angular_and_screenshot(task_id, angular_code, img_output_path):
             os.chdir(tmpdir)
 
             # Create package.json
-            package_json = {
-                "name": "angular-render",
-                "version": "0.0.0",
-                "scripts": {"start": "ng serve"},
-                "dependencies": {
-                    "@angular/common": "^16.0.0",
-                    "@angular/compiler": "^16.0.0",
-                    "@angular/core": "^16.0.0",
-                    "@angular/forms": "^16.0.0",
-                    "@angular/platform-browser": "^16.0.0",
-                    "@angular/platform-browser-dynamic": "^16.0.0",
-                    "@angular/router": "^16.0.0",
-                    "rxjs": "~7.8.0",
-                    "tslib": "^2.3.0",
-                    "zone.js": "~0.13.0",
-                },
-                "devDependencies": {
-                    "@angular-devkit/build-angular": "^16.0.0",
-                    "@angular/cli": "^16.0.0",
-                    "@angular/compiler-cli": "^16.0.0",
-                    "typescript": "~5.0.2",
-                },
-            }
             with open("package.json", "w") as f:
-                json.dump(package_json, f, indent=2)
+                json.dump(ANGULAR_PACKAGE_JSON, f, indent=2)
 
             # Create Angular project structure
             os.makedirs("src/app", exist_ok=True)
@@ -343,31 +370,35 @@ import 'zone.js';
 """
                 )
 
-            # Install Angular CLI globally if not already installed
-            try:
-                subprocess.run(
-                    ["npm", "install", "-g", "@angular/cli"],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            except subprocess.CalledProcessError:
-                logging.warning(
-                    "Failed to install Angular CLI globally, will try to proceed with local installation"
-                )
+            if _ANGULAR_WORKSPACE is not None:
+                # Dependencies are already installed in the warm workspace
+                os.symlink(os.path.join(_ANGULAR_WORKSPACE, "node_modules"), "node_modules")
+            else:
+                # Install Angular CLI globally if not already installed
+                try:
+                    subprocess.run(
+                        ["npm", "install", "-g", "@angular/cli"],
+                        check=True,
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                    )
+                except subprocess.CalledProcessError:
+                    logging.warning(
+                        "Failed to install Angular CLI globally, will try to proceed with local installation"
+                    )
 
-            # Install dependencies
-            logging.info("Installing Angular dependencies...")
-            try:
-                subprocess.run(
-                    ["npm", "install", "--legacy-peer-deps"],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Failed to install dependencies: {e}")
-                raise
+                # Install dependencies
+                logging.info("Installing Angular dependencies...")
+                try:
+                    subprocess.run(
+                        ["npm", "install", "--legacy-peer-deps"],
+                        check=True,
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                    )
+                except subprocess.CalledProcessError as e:
+                    logging.error(f"Failed to install dependencies: {e}")
+                    raise
 
             # Start Angular development server with output capture for error detection
             logging.info(f"Starting Angular development server on port {port}...")
@@ -1,29 +1,9 @@
 # render_canvas.py
 import os
-import re
 import logging
 from .render_utils import start_browser
 from .render_html import render_html_and_screenshot
 
-def extract_canvas_html_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    if match:
-        code = match.group(1)
-    else:
-        # 2. Try to extract from ```<output_type>``` fenced block
-        code_fence_pattern = rf"```{output_type}\s*(.*?)```"
-        match = re.search(code_fence_pattern, generation, re.DOTALL)
-        if match:
-            code = match.group(1).strip() if match else generation.strip()
-        else:
-            fence_pattern = r"```\s*(.*?)```"
-            match = re.search(fence_pattern, generation, re.DOTALL)
-            if match:
-                code = match.group(1).strip() if match else generation.strip()
-            else:
-                raise ValueError("Parsing error: No correct tag found")
-    return code
-
 async def render_canvas_and_screenshot(task_id, canvas_html, img_output_path):
     """
     Renders HTML+Canvas code and captures a screenshot using Playwright.
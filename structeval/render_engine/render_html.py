@@ -1,14 +1,9 @@
 import os
 import logging
-import re
 import asyncio
 from playwright.async_api import async_playwright
 from .render_utils import start_browser, close_browser
 
-def extract_html_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 async def render_html_and_screenshot(task_id, html_content, img_output_path):
 
     browser, context, page, playwright = await start_browser()
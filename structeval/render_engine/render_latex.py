@@ -1,5 +1,6 @@
 import os, re, subprocess, tempfile, logging, shutil, time
 from pdf2image import convert_from_path
+from .extract_utils import extract_code
 
 
 # ---------------------------- helper -------------------------------- #
@@ -23,6 +24,51 @@ def _build_document(body: str) -> str:
     )
 
 
+# ------------------------ warm preamble ----------------------------- #
+# (directory, name) of the _build_document preamble dumped into a pdflatex
+# format by prepare_latex_format(), None to load the packages on every compile
+_LATEX_FORMAT = None
+_FORMAT_NAME = "structeval-preamble"
+
+
+def prepare_latex_format(format_dir: str = None):
+    """
+    Precompile the packages of _build_document into a pdflatex format
+    (mylatexformat), so wrapped TikZ/LaTeX fragments skip loading them.
+
+    Args:
+        format_dir: Where to keep the format (default: ~/.cache/structeval/latex-format)
+
+    Returns:
+        The format directory, or None if pdflatex or mylatexformat is unavailable
+    """
+    global _LATEX_FORMAT
+    if not shutil.which("pdflatex"):
+        return None
+    format_dir = os.path.abspath(
+        format_dir or os.path.join(os.path.expanduser("~"), ".cache", "structeval", "latex-format")
+    )
+    os.makedirs(format_dir, exist_ok=True)
+
+    with open(os.path.join(format_dir, f"{_FORMAT_NAME}.tex"), "w", encoding="utf8") as f:
+        f.write(_build_document(""))
+    try:
+        subprocess.run(
+            ["pdflatex", "-ini", f"-jobname={_FORMAT_NAME}", "&pdflatex", "mylatexformat.ltx", f"{_FORMAT_NAME}.tex"],
+            cwd=format_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning(f"Could not precompile the LaTeX preamble: {e}")
+        return None
+    if not os.path.isfile(os.path.join(format_dir, f"{_FORMAT_NAME}.fmt")):
+        logging.warning("Could not precompile the LaTeX preamble (is mylatexformat installed?)")
+        return None
+
+    _LATEX_FORMAT = (format_dir, _FORMAT_NAME)
+    logging.info(f"LaTeX preamble precompiled into {format_dir}")
+    return format_dir
+
+
 # ---------------------------- core ---------------------------------- #
 def render_latex_to_png(latex_code: str, output_path: str, task_id: str, dpi: int = 300) -> bool:
     """
@@ -42,7 +88,8 @@ def render_latex_to_png(latex_code: str, output_path: str, task_id: str, dpi: in
             pdf_file = os.path.join(tmp, "doc.pdf")
 
             # Wrap a fragment only if it has no \begin{document}
-            if r"\begin{document}" not in latex_code:
+            wrapped = r"\begin{document}" not in latex_code
+            if wrapped:
                 latex_code = _build_document(latex_code)   # ★
 
             with open(tex_file, "w", encoding="utf8") as f:
@@ -67,8 +114,18 @@ def render_latex_to_png(latex_code: str, output_path: str, task_id: str, dpi: in
                 cmd = ["pdflatex", "-interaction=nonstopmode", "-file-line-error",
                        "-output-directory", tmp, tex_file]
 
-                for _ in range(2):         # two passes for references/TikZ sizes
-                    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=_remaining())
+                if wrapped and _LATEX_FORMAT is not None:
+                    # Same preamble, loaded from the precompiled format
+                    format_dir, format_name = _LATEX_FORMAT
+                    env = dict(os.environ, TEXFORMATS=format_dir + os.pathsep)
+                    fmt_cmd = cmd[:1] + [f"-fmt={format_name}"] + cmd[1:]
+                    for _ in range(2):
+                        proc = subprocess.run(fmt_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=_remaining(), env=env)
+                    pdf_ok = os.path.isfile(pdf_file) and os.path.getsize(pdf_file) > 0
+
+                if not pdf_ok:
+                    for _ in range(2):         # two passes for references/TikZ sizes
+                        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=_remaining())
 
                 # even if return‑code ≠ 0, accept the run provided a PDF exists
                 pdf_ok = os.path.isfile(pdf_file) and os.path.getsize(pdf_file) > 0
@@ -115,28 +172,13 @@ def render_latex_to_png(latex_code: str, output_path: str, task_id: str, dpi: in
 
 def extract_latex_from_code_tag(generation, output_type):
     """
-    Extract LaTeX code from <code> tags and clean it up.
-    Removes control characters and converts double backslashes to single ones.
+    Extract LaTeX code from <|BEGIN_CODE|> tags or a fenced block and clean it up.
+    Removes control characters.
     """
-    begin_end_pat = (
-        r"<\|BEGIN_CODE\|\>[ \t]*\n?"        # literal opener (pipes escaped)
-        r"(?P<payload1>.*?)"                 # everything after it…
-        r"(?:<\|END_CODE\|\>|$)"             # …until END tag *or* EOS
-    )
-
-    # 2)  ``` fenced block  (closing fence optional)
-    fence_pat = (
-        rf"```(?:{re.escape(output_type)}|[^\n]*)[ \t]*\n"  # header
-        r"(?P<payload2>.*?)"                               # payload
-        r"(?:```|$)"                                       # end fence or EOS
-    )
-
-    pattern = rf"(?:{begin_end_pat})|(?:{fence_pat})"
-    m = re.search(pattern, generation, re.DOTALL | re.IGNORECASE)
-    if m:
-        # whichever group matched, return it
-        payload = m.group("payload1") or m.group("payload2")
-        code = payload.strip()
+    match = extract_code(generation)
+    if match is None:
+        raise ValueError("No LaTeX code found")
+    code = match.payload
 
     if code:
         # Remove control characters (ASCII 0-31, excluding \t, \n, \r)
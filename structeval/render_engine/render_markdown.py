@@ -1,5 +1,4 @@
 import os
-import re
 import tempfile
 import logging
 import markdown
@@ -7,10 +6,6 @@ import markdown
 from .render_utils import start_browser
 from .render_html import render_html_and_screenshot
 
-def extract_markdown_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 async def render_markdown_and_screenshot(task_id, markdown_content, img_output_path):
     os.makedirs(img_output_path, exist_ok=True)
     render_score = 0
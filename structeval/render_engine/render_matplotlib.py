@@ -1,15 +1,10 @@
 import os
-import re
 import logging
 import tempfile
 import traceback
 
 import matplotlib.pyplot as plt
 
-def extract_matplotlib_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 def render_matplotlib_and_screenshot(task_id, python_code, img_output_path):
     """
     Executes Python code that generates a matplotlib figure and saves the figure as a PNG.
@@ -1,13 +1,8 @@
 import os
-import re
 import json  # Import json for escaping
 import logging
 from .render_utils import start_browser
 
-def extract_mermaid_code_from_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 async def render_mermaid_and_screenshot(task_id, mermaid_code, img_output_path):
     """
     Renders Mermaid diagram in a headless browser and takes a screenshot.
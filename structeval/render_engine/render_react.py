@@ -1,7 +1,6 @@
 import os
 import logging
 import re
-import html
 from .render_utils import start_browser
 
 REACT_RENDER_DIR = os.path.join(
@@ -9,16 +8,6 @@ REACT_RENDER_DIR = os.path.join(
 )
 
 
-def extract_react_from_code_tag(generation):
-    """
-    Return all text between the first <code> and the last </code>.
-    Greedy match ensures we keep multi‑segment code blocks intact.
-    """
-    match = re.search(r"<code>(.*)</code>", generation, re.DOTALL)
-    extracted_code = match.group(1).strip() if match else generation.strip()
-    return html.unescape(extracted_code)  # Decode HTML entities
-
-
 def create_simple_react_app(task_id, react_content):
     task_dir = os.path.join(REACT_RENDER_DIR, task_id)
     os.makedirs(task_dir, exist_ok=True)
@@ -1,12 +1,7 @@
 import os
-import re
 import logging
 from .render_utils import start_browser
 
-def extract_svg_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 async def render_svg_and_screenshot(task_id, svg_code, img_output_path):
     """
     Renders inline SVG by injecting it into an HTML wrapper and using Playwright to take a screenshot.
@@ -1,13 +1,8 @@
 import os
-import re
 import logging
 import tempfile
 import subprocess
 
-def extract_typst_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 def render_typst_and_screenshot(task_id, typst_code, img_output_path):
     """
     Renders Typst code to PNG using the typst compiler and ImageMagick.
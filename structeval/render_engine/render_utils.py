@@ -1,14 +1,14 @@
-import json
-import yaml
-import csv
 import io
 import logging
 import codecs
+import unicodedata
 import re
 import os
+import numpy as np
+from PIL import Image, ImageChops
 from playwright.async_api import async_playwright
-import xmltodict
-import toml
+from eval_engine.eval_utils import parse_structure
+from .extract_utils import extract_code
 
 
 # Copy of TYPE_CODES from main.py to avoid circular imports
@@ -34,10 +34,74 @@ TYPE_CODES = {
     "YAML": "18",
 }
 
+# Error screens some renderers screenshot instead of the real output.
+# Each output type lists its banners, a banner being a list of (RGB colour,
+# minimum fraction of pixels with that colour); a banner is only detected
+# when all of its colours are present.
+# Angular needs no entry: render_angular saves its error screens as
+# {task_id}_error.png, never as the image VQA reads.
+ERROR_BANNERS = {
+    # Fill of render_mermaid's ".render-error" status box, about 5% of the
+    # 1280x720 error screenshot (4% once downscaled to 512px). Its #A94442 text is anti-aliased to other
+    # colours and covers too few pixels to be matched.
+    "mermaid": [[((0xF2, 0xDE, 0xDE), 0.01)]],
+}
 
-async def start_browser(headless=True):
+
+class _Shared:
+    """
+    Warm browser or Playwright handed to a renderer: it is used as usual, but
+    the renderer's close()/stop() leaves it running for the next task.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    async def close(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# Browser kept running between tasks by warm_browser(), None when every task
+# launches its own
+_WARM_BROWSER = None
+
+
+async def warm_browser(headless=True):
+    """
+    Keep one browser running for all following renders in this event loop.
+    Every task still gets its own context and page, closed when it is done.
+    """
+    global _WARM_BROWSER
+    if _WARM_BROWSER is not None and _WARM_BROWSER[0].is_connected():
+        return
     playwright = await async_playwright().start()
     browser = await playwright.chromium.launch(headless=headless)
+    _WARM_BROWSER = (browser, playwright)
+    logging.info("Browser warmed up, renders will reuse it")
+
+
+async def shutdown_browser():
+    """Close the browser started by warm_browser()."""
+    global _WARM_BROWSER
+    if _WARM_BROWSER is None:
+        return
+    browser, playwright = _WARM_BROWSER
+    _WARM_BROWSER = None
+    await close_browser(browser, None, None, playwright)
+
+
+async def start_browser(headless=True):
+    if _WARM_BROWSER is not None and _WARM_BROWSER[0].is_connected():
+        browser, playwright = _Shared(_WARM_BROWSER[0]), _Shared(_WARM_BROWSER[1])
+    else:
+        playwright = await async_playwright().start()
+        browser = await playwright.chromium.launch(headless=headless)
     context = await browser.new_context(ignore_https_errors=True)
     page = await context.new_page()
     return browser, context, page, playwright
@@ -60,6 +124,114 @@ async def close_browser(browser, context, page, playwright):
         logging.error(f"Error closing browser: {e}")
 
 
+def analyze_render_image(image_path, output_type="", max_side=512, tolerance=8):
+    """
+    Flag screenshots that cannot support any VQA answer.
+
+    An image is blank only when no pixel at full resolution differs from
+    its white background, so a sparse render (one short line of text, a
+    small chart) is still usable. A solid non-white image may be a
+    legitimate render and is not flagged.
+
+    Args:
+        image_path: Path to the rendered PNG
+        output_type: Lowercase output type, selects the error banners to look for
+        max_side: Images are downscaled to at most this size to look for error banners
+        tolerance: Per-channel distance under which two colours are considered equal
+
+    Returns:
+        "blank", "error_banner", or None for a usable image
+    """
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        if img.width == 0 or img.height == 0:
+            return "blank"
+
+        # Bounding box of the pixels that differ from white
+        difference = ImageChops.difference(img, Image.new("RGB", img.size, (255, 255, 255)))
+        if difference.point(lambda v: 255 if v > tolerance else 0).getbbox() is None:
+            return "blank"
+
+        img.thumbnail((max_side, max_side))
+        pixels = np.asarray(img, dtype=np.int16).reshape(-1, 3)
+
+    for banner in ERROR_BANNERS.get(output_type, []):
+        if all(
+            (np.abs(pixels - np.array(color)) <= tolerance).all(axis=1).mean() >= min_ratio
+            for color, min_ratio in banner
+        ):
+            return "error_banner"
+
+    return None
+
+
+# Escape sequences understood by the unicode_escape codec. A \uD8xx\uDCxx
+# surrogate pair is matched as a whole so it decodes to one character.
+_ESCAPE_SEQUENCE = re.compile(
+    r"\\(?:"
+    r"u([dD][89abAB][0-9a-fA-F]{2})\\u([dD][c-fC-F][0-9a-fA-F]{2})"
+    r"|u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8})|x([0-9a-fA-F]{2})"
+    r"|N\{([^}\n]+)\}|([0-7]{1,3})|(.)"
+    r")",
+    re.DOTALL,
+)
+# Inputs the C codec would decode differently: a backslash before a non-ASCII
+# character, or surrogate escapes (decoded as a pair here)
+_CODEC_UNSAFE = re.compile(r"\\(?:[^\x00-\x7f]|u[dD][89a-fA-F])")
+_SIMPLE_ESCAPES = {
+    "\\": "\\", "'": "'", '"': '"', "a": "\a", "b": "\b", "f": "\f",
+    "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\n": "",
+}
+
+
+def _decode_escape(m):
+    high, low, u4, u8, x2, name, octal, simple = m.groups()
+    try:
+        if high:
+            return chr(0x10000 + ((int(high, 16) - 0xD800) << 10) + (int(low, 16) - 0xDC00))
+        if u4 or u8 or x2:
+            return chr(int(u4 or u8 or x2, 16))
+        if name:
+            return unicodedata.lookup(name)
+        if octal:
+            return chr(int(octal, 8))
+    except (ValueError, KeyError):
+        return m.group(0)
+    # Unknown escapes (e.g. "\\d" in a regex) are kept as written
+    return _SIMPLE_ESCAPES.get(simple, m.group(0))
+
+
+def safe_unicode_decode(text, partial=True):
+    """
+    Decode unicode escape sequences in text (\\n, \\uXXXX, ...) in a single pass.
+    Invalid or unknown escapes and real non-ASCII characters are kept as they are;
+    text without any escape is returned untouched.
+    With partial=False, text with an invalid escape is returned undecoded as a
+    whole, as the non-renderable path has always scored it.
+    """
+    #replace &lt; with < , and &gt; with >
+    if "&" in text:
+        text = text.replace("&lt;", "<").replace("&gt;", ">")
+
+    if "\\" not in text:
+        return text
+
+    # Fast path: the C codec, with real non-ASCII characters protected as escapes
+    codec_safe = not _CODEC_UNSAFE.search(text)
+    if codec_safe or not partial:
+        try:
+            decoded = codecs.decode(text.encode("ascii", "backslashreplace"), "unicode_escape")
+        except UnicodeDecodeError:
+            # invalid escape somewhere, decode escape by escape unless all-or-nothing
+            if not partial:
+                return text
+        else:
+            if codec_safe:
+                return decoded
+
+    return _ESCAPE_SEQUENCE.sub(_decode_escape, text)
+
+
 def determine_output_type(task_id):
     """
     Determine output type from task_id.
@@ -88,25 +260,9 @@ def extract_renderable_code(text: str, output_type: str = "") -> str:
       2. ```fenced``` block (any header, or matching `output_type`)
       3. Otherwise: raise
     """
-    # 1)  <|BEGIN_CODE|> … <|END_CODE|>   ─ closing tag optional
-    begin_end_pat = (
-        r"<\|BEGIN_CODE\|\>[ \t]*\n?"        # literal opener (pipes escaped)
-        r"(?P<payload1>.*?)"                 # everything after it…
-        r"(?:<\|END_CODE\|\>|$)"             # …until END tag *or* EOS
-    )
-
-    # 2)  ``` fenced block  (closing fence optional)
-    fence_pat = (
-        rf"```(?:{re.escape(output_type)}|[^\n]*)[ \t]*\n"  # header
-        r"(?P<payload2>.*?)"                               # payload
-        r"(?:```|$)"                                       # end fence or EOS
-    )
-
-    pattern = rf"(?:{begin_end_pat})|(?:{fence_pat})"
-    m = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-
-    if m:
-        return (m.group("payload1") or m.group("payload2")).strip()
+    match = extract_code(text)
+    if match:
+        return match.payload
 
     # If you purposely want raw HTML back:
     if text.lstrip().startswith(("<html>", "<div class")):
@@ -122,7 +278,7 @@ def extract_code_and_save(text, task_id, output_dir):
     Args:
         text: The input string possibly containing code blocks.
         task_id: Task identifier to infer output type and for filename.
-        output_dir: Directory to save extracted file.
+        output_dir: Directory to save extracted file, or None to skip saving.
 
     Returns:
         Tuple of (extracted code, filename, success flag)
@@ -130,44 +286,17 @@ def extract_code_and_save(text, task_id, output_dir):
     # Determine output type
     output_type = determine_output_type(task_id).lower()
 
-    # Decode unicode escape sequences
-    try:
-        text = text.replace("&lt;", "<").replace("&gt;", ">")
-        text = text.replace("<think>\n\n</think>\n\n", "")
-        text = codecs.decode(text, "unicode_escape")
-    except Exception:
-        pass  # If decoding fails, use the original string
-
-    # 1)  <|BEGIN_CODE|> … <|END_CODE|>   ─ closing tag optional
-    begin_end_pat = (
-        r"<\|BEGIN_CODE\|\>[ \t]*\n?"        # literal opener (pipes escaped)
-        r"(?P<payload1>.*?)"                 # everything after it…
-        r"(?:<\|END_CODE\|\>|$)"             # …until END tag *or* EOS
-    )
+    # Decode unicode escape sequences; text with an invalid escape is kept as is
+    text = text.replace("<think>\n\n</think>\n\n", "")
+    text = safe_unicode_decode(text, partial=False)
 
-    # 2)  ``` fenced block  (closing fence optional)
-    fence_pat = (
-        rf"```(?:{re.escape(output_type)}|[^\n]*)[ \t]*\n"  # header
-        r"(?P<payload2>.*?)"                               # payload
-        r"(?:```|$)"                                       # end fence or EOS
-    )
-
-    pattern = rf"(?:{begin_end_pat})|(?:{fence_pat})"
-    m = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-
-    if m:
-        # whichever group matched, return it
-        payload = m.group("payload1") or m.group("payload2")
-        code = payload.strip()
-    else:
-        # If still no match, fall back to entire text (trimmed) to avoid undefined variable
-        code = text.strip()
+    # A fenced block wins over <|BEGIN_CODE|>; fall back to the entire text (trimmed)
+    match = extract_code(text, prefer_fence=True)
+    code = match.payload if match else text.strip()
 
-    # check again for fence_pat
-    m = re.search(fence_pat, text, re.DOTALL | re.IGNORECASE)
-    if m:
-        payload = m.group("payload2")
-        code = payload.strip()
+    # Writing the file is optional, the evaluate stage can parse the code from memory
+    if output_dir is None:
+        return code, None, True
 
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
@@ -196,13 +325,15 @@ def extract_code_and_save(text, task_id, output_dir):
         return code, None, False
 
 
-def score_non_renderable(task, non_renderable_dir):
+def score_non_renderable(task, non_renderable_dir, save_file=True):
     """
-    Process and score a non-renderable task. Extracts code, saves to file, and validates format.
+    Process and score a non-renderable task. Extracts code, optionally saves it
+    to file, and validates format by parsing the code in memory.
 
     Args:
         task: The task to process
         non_renderable_dir: Directory to save non-renderable files
+        save_file: Whether to write the extracted code to non_renderable_dir
 
     Returns:
         Updated task with render_score
@@ -211,44 +342,26 @@ def score_non_renderable(task, non_renderable_dir):
     generation = task.get("generation", "")
     output_type = task.get("output_type", "unknown").lower()
 
-    # Extract code and save to file
+    # Extract code and (optionally) save to file
     code, file_path, success = extract_code_and_save(
-        generation, task_id, non_renderable_dir
+        generation, task_id, non_renderable_dir if save_file else None
     )
 
-    # Set file path in task for evaluation engine to use
+    # Code that is not saved to a file stays on the task for evaluation
     task["output_file"] = file_path if success else None
+    if task["output_file"] is None:
+        task["extracted_code"] = code
 
     score = 0.0
 
     if success:
-        try:
-            if output_type == "json":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    result = json.load(f)
-            elif output_type == "yaml":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    result = yaml.safe_load(f)
-            elif output_type == "toml":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    result = toml.load(f)
-            elif output_type == "xml":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    result = xmltodict.parse(f.read())
-            elif output_type == "csv":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    result = csv.DictReader(f)
-            else:
-                raise Valuerror("Unsupported file format.")
-
-            # if file not empty, but valid format files, then score = 1
-            if result:
-                score = 1
-
-        except Exception as e:
-            logging.error(f"Error loading file {file_path}: {str(e)}")
-            task["render_score"] = score
-            return None, 0
+        # Cached by content hash: in memory for an evaluation in this process,
+        # in the parse cache (use_parse_cache) for one in a later process
+        result, parsed = parse_structure(code, output_type)
+
+        # if file not empty, but valid format files, then score = 1
+        if parsed and result:
+            score = 1
 
     task["render_score"] = score
     return task
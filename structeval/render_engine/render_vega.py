@@ -1,13 +1,8 @@
 import os
-import re
 import json
 import logging
 from .render_utils import start_browser
 
-def extract_vega_json_from_code_tag(generation):
-    match = re.search(r"<code>(.*?)</code>", generation, re.DOTALL)
-    return match.group(1) if match else None
-
 async def render_vega_and_screenshot(task_id, vega_spec, img_output_path):
     """
     Renders a Vega visualization using the Vega CDN and captures a screenshot.
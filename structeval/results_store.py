@@ -0,0 +1,302 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+# Optional SQLite store of everything a run produces, one table per stage,
+# so runs can be compared without loading their JSON files. Stages write to
+# it as they go: inference per generation, render per task, evaluation per
+# finished batch. Scores carry the task's type code and input type so the
+# leaderboard queries are answered from indexes.
+
+LEADERBOARD_GROUPS = ("type_code", "input_type", "category")
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "run_id TEXT PRIMARY KEY, llm_model TEXT, vlm_model TEXT, created REAL, updated REAL)",
+    "CREATE TABLE IF NOT EXISTS run_files (path TEXT PRIMARY KEY, run_id TEXT)",
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    "task_id TEXT PRIMARY KEY, type_code TEXT, input_type TEXT, output_type TEXT, "
+    "task_name TEXT, rendering INTEGER)",
+    "CREATE TABLE IF NOT EXISTS generations ("
+    "run_id TEXT, task_id TEXT, base_task_id TEXT, sample_index INTEGER, generation TEXT, "
+    "max_tokens INTEGER, stop TEXT, created REAL, PRIMARY KEY (run_id, task_id))",
+    "CREATE TABLE IF NOT EXISTS renders ("
+    "run_id TEXT, task_id TEXT, render_score REAL, output_file TEXT, render_error TEXT, "
+    "created REAL, PRIMARY KEY (run_id, task_id))",
+    "CREATE TABLE IF NOT EXISTS vqa_verdicts ("
+    "run_id TEXT, task_id TEXT, question_index INTEGER, question TEXT, answer TEXT, verdict INTEGER, "
+    "PRIMARY KEY (run_id, task_id, question_index))",
+    "CREATE TABLE IF NOT EXISTS scores ("
+    "run_id TEXT, task_id TEXT, base_task_id TEXT, sample_index INTEGER, type_code TEXT, "
+    "input_type TEXT, rendering INTEGER, render_score REAL, vqa_score REAL, key_validation_score REAL, "
+    "raw_output_score REAL, final_eval_score REAL, created REAL, PRIMARY KEY (run_id, task_id))",
+    "CREATE INDEX IF NOT EXISTS runs_llm_model ON runs (llm_model)",
+    "CREATE INDEX IF NOT EXISTS tasks_type ON tasks (type_code, input_type)",
+    "CREATE INDEX IF NOT EXISTS generations_task ON generations (base_task_id, run_id)",
+    "CREATE INDEX IF NOT EXISTS scores_task ON scores (base_task_id, run_id)",
+    # Covers the leaderboard columns, so its queries never read the table rows
+    "CREATE INDEX IF NOT EXISTS scores_leaderboard ON scores "
+    "(run_id, type_code, input_type, rendering, final_eval_score, render_score)",
+    "CREATE INDEX IF NOT EXISTS scores_type ON scores (type_code, input_type)",
+]
+
+_CATEGORY = (
+    "CASE WHEN s.input_type = 'Text' THEN 'text' ELSE 'nontext' END || '_to_' || "
+    "CASE WHEN s.rendering THEN 'renderable' ELSE 'nonrenderable' END"
+)
+
+
+def _base_id(item: Dict[str, Any]) -> str:
+    return item.get("base_task_id", item["task_id"])
+
+
+class ResultsStore:
+    """
+    SQLite results store, safe to share between threads.
+
+    Args:
+        path: SQLite database file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def _write(self, fn) -> None:
+        with self._lock:
+            with self._conn:
+                fn(self._conn)
+
+    def start_run(
+        self,
+        run_id: str,
+        llm_model: Optional[str] = None,
+        vlm_model: Optional[str] = None,
+        paths: Iterable[str] = (),
+    ) -> None:
+        """Create or update a run; the files in paths are looked up by find_run."""
+        now = time.time()
+
+        def start(conn):
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?) ON CONFLICT (run_id) DO UPDATE SET "
+                "llm_model = COALESCE(excluded.llm_model, llm_model), "
+                "vlm_model = COALESCE(excluded.vlm_model, vlm_model), updated = excluded.updated",
+                (run_id, llm_model, vlm_model, now, now),
+            )
+            for path in paths:
+                conn.execute("INSERT OR REPLACE INTO run_files VALUES (?, ?)", (os.path.abspath(path), run_id))
+
+        self._write(start)
+
+    def find_run(self, path: str) -> Optional[str]:
+        """Run that wrote the file at path, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM run_files WHERE path = ?", (os.path.abspath(path),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_tasks(self, tasks: Iterable[Dict[str, Any]]) -> None:
+        rows = [
+            (
+                _base_id(task),
+                _base_id(task)[2:4],
+                task.get("input_type"),
+                task.get("output_type"),
+                task.get("task_name"),
+                int(bool(task.get("rendering", False))),
+            )
+            for task in tasks
+        ]
+        self._write(lambda conn: conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)", rows))
+
+    def record_generation(
+        self,
+        run_id: str,
+        task_id: str,
+        generation: Optional[str],
+        base_task_id: Optional[str] = None,
+        sample_index: int = 0,
+        max_tokens: Optional[int] = None,
+        stop: Optional[str] = None,
+    ) -> None:
+        self._write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, task_id, base_task_id or task_id, sample_index, generation, max_tokens, stop, time.time()),
+        ))
+
+    def record_generations(self, run_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Generation rows as returned by generate_dataset."""
+        now = time.time()
+        values = [
+            (
+                run_id,
+                row["task_id"],
+                _base_id(row),
+                row.get("sample_index", 0),
+                row.get("generation"),
+                row.get("generation_max_tokens"),
+                row.get("generation_stop"),
+                now,
+            )
+            for row in rows
+        ]
+        self._write(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values
+        ))
+
+    def update_generations(self, run_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Set the fields known once generation is done on already recorded generations."""
+        values = [
+            (row.get("generation_max_tokens"), row.get("generation_stop"), run_id, row["task_id"])
+            for row in rows
+        ]
+        self._write(lambda conn: conn.executemany(
+            "UPDATE generations SET max_tokens = ?, stop = ? WHERE run_id = ? AND task_id = ?", values
+        ))
+
+    def record_render(self, run_id: str, task: Dict[str, Any]) -> None:
+        self._write(lambda conn: self._insert_render(conn, run_id, task, time.time()))
+
+    @staticmethod
+    def _insert_render(conn, run_id: str, task: Dict[str, Any], now: float) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO renders VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, task["task_id"], task.get("render_score"), task.get("output_file"), task.get("render_error"), now),
+        )
+
+    def record_evaluation(self, run_id: str, results: Iterable[Dict[str, Any]]) -> None:
+        """Evaluated rows: their render, VQA verdicts and scores, in one transaction."""
+        results = list(results)
+        now = time.time()
+
+        def record(conn):
+            for item in results:
+                task_id = item["task_id"]
+                if "render_score" in item:
+                    self._insert_render(conn, run_id, item, now)
+                conn.execute("DELETE FROM vqa_verdicts WHERE run_id = ? AND task_id = ?", (run_id, task_id))
+                verdicts = item.get("VQAeval") or []
+                conn.executemany(
+                    "INSERT INTO vqa_verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            run_id,
+                            task_id,
+                            index,
+                            qa.get("question"),
+                            qa.get("answer"),
+                            None if index >= len(verdicts) or verdicts[index] is None else int(verdicts[index]),
+                        )
+                        for index, qa in enumerate(item.get("VQA") or [])
+                    ],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        task_id,
+                        _base_id(item),
+                        item.get("sample_index", 0),
+                        _base_id(item)[2:4],
+                        item.get("input_type"),
+                        int(bool(item.get("rendering", False))),
+                        item.get("render_score"),
+                        item.get("VQA_score"),
+                        item.get("key_validation_score"),
+                        item.get("raw_output_score"),
+                        item.get("final_eval_score"),
+                        now,
+                    ),
+                )
+
+        self._write(record)
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql, list(params))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def leaderboard(
+        self,
+        by: Optional[str] = None,
+        model: Optional[str] = None,
+        type_code: Optional[str] = None,
+        input_type: Optional[str] = None,
+        run_ids: Optional[List[str]] = None,
+        pass_threshold: float = 1.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Average scores per run, optionally per type code, input type or
+        category within each run, best first.
+
+        Args:
+            by: None or one of LEADERBOARD_GROUPS
+            model: Only runs of this LLM
+            type_code: Only tasks of this type code
+            input_type: Only tasks of this input type
+            run_ids: Only these runs
+            pass_threshold: final_eval_score at or above which a task passes
+
+        Returns:
+            Rows with run_id, llm_model, vlm_model, the group, num_tasks,
+            avg_score, render_rate and pass_rate
+        """
+        if by is not None and by not in LEADERBOARD_GROUPS:
+            raise ValueError(f"by must be one of {LEADERBOARD_GROUPS}, got {by!r}")
+        group = {"type_code": "s.type_code", "input_type": "s.input_type", "category": _CATEGORY}.get(by)
+
+        conditions, params = [], [pass_threshold]
+        for column, value in (("r.llm_model", model), ("s.type_code", type_code), ("s.input_type", input_type)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if run_ids:
+            conditions.append(f"s.run_id IN ({', '.join('?' * len(run_ids))})")
+            params.extend(run_ids)
+
+        select_group = f", {group} AS {by}" if group else ""
+        sql = (
+            f"SELECT s.run_id, r.llm_model, r.vlm_model{select_group}, COUNT(*) AS num_tasks, "
+            "ROUND(AVG(COALESCE(s.final_eval_score, 0)), 4) AS avg_score, "
+            "ROUND(AVG(s.render_score), 4) AS render_rate, "
+            "ROUND(AVG(COALESCE(s.final_eval_score, 0) >= ?), 4) AS pass_rate "
+            "FROM scores s JOIN runs r ON r.run_id = s.run_id"
+            + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+            + f" GROUP BY s.run_id{', ' + by if group else ''}"
+            + f" ORDER BY {by + ', ' if group else ''}avg_score DESC"
+        )
+        return self._query(sql, params)
+
+    def task_scores(self, task_id: str) -> List[Dict[str, Any]]:
+        """Scores of one task (all its samples) in every run, best first."""
+        return self._query(
+            "SELECT s.run_id, r.llm_model, s.task_id, s.sample_index, s.render_score, s.vqa_score, "
+            "s.key_validation_score, s.final_eval_score FROM scores s JOIN runs r ON r.run_id = s.run_id "
+            "WHERE s.base_task_id = ? ORDER BY s.final_eval_score DESC",
+            (task_id,),
+        )
+
+    def compare(self, run_a: str, run_b: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Tasks whose score differs most between two runs."""
+        return self._query(
+            "SELECT a.task_id, a.type_code, ROUND(a.final_eval_score, 4) AS score_a, "
+            "ROUND(b.final_eval_score, 4) AS score_b, "
+            "ROUND(COALESCE(b.final_eval_score, 0) - COALESCE(a.final_eval_score, 0), 4) AS delta "
+            "FROM scores a JOIN scores b ON b.task_id = a.task_id AND b.run_id = ? "
+            "WHERE a.run_id = ? ORDER BY ABS(delta) DESC, a.task_id LIMIT ?",
+            (run_b, run_a, limit),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
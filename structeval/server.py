@@ -0,0 +1,288 @@
+import os
+import json
+import inspect
+import time
+import asyncio
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from render_engine.main import render_task
+from render_engine.render_utils import warm_browser, shutdown_browser
+from render_engine.render_angular import prepare_angular_workspace
+from render_engine.render_latex import prepare_latex_format
+from eval_engine.main import evaluate_dataset
+from pipeline import render_and_evaluate
+
+
+class StructEvalServer:
+    """
+    Render and evaluate jobs on warm resources: one browser shared by all
+    renders, the Angular workspace installed once, the LaTeX preamble
+    precompiled, and every VLM loaded once and kept for later jobs.
+
+    Renders run one job at a time on the server's event loop (renderers
+    change the working directory); evaluations run concurrently.
+
+    Args:
+        vlm_model_name: VLM to load at startup (others are loaded on first use)
+        vlm_engine: Engine of that VLM
+        warm_angular: Install the Angular dependencies once at startup
+        warm_latex: Precompile the LaTeX preamble at startup
+        additional_args: Additional arguments to pass to the VLM
+    """
+
+    def __init__(
+        self,
+        vlm_model_name: Optional[str] = None,
+        vlm_engine: Optional[str] = None,
+        warm_angular: bool = True,
+        warm_latex: bool = True,
+        **vlm_kwargs,
+    ):
+        self.vlm_model_name = vlm_model_name
+        self.vlm_engine = vlm_engine
+        self.warm_angular = warm_angular
+        self.warm_latex = warm_latex
+        self.vlm_kwargs = vlm_kwargs
+        self.warm: Dict[str, Any] = {}
+        self.engines: Dict[tuple, Any] = {}
+        self._engines_lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, name="structeval-render", daemon=True)
+        self._render_lock: Optional[asyncio.Lock] = None
+
+    def _run(self, coro):
+        """Run a coroutine on the render loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self) -> None:
+        self._loop_thread.start()
+
+        async def setup():
+            self._render_lock = asyncio.Lock()
+            await warm_browser()
+
+        try:
+            self._run(setup())
+            self.warm["browser"] = True
+        except Exception as e:
+            logging.error(f"Could not start the shared browser, renders launch their own: {e}")
+            self.warm["browser"] = False
+        if self.warm_angular:
+            self.warm["angular_workspace"] = prepare_angular_workspace()
+        if self.warm_latex:
+            self.warm["latex_format"] = prepare_latex_format()
+        if self.vlm_model_name and self.vlm_engine:
+            self.get_engine(self.vlm_model_name, self.vlm_engine)
+
+    def close(self) -> None:
+        if self._loop_thread.is_alive():
+            self._run(shutdown_browser())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._loop_thread.join()
+
+    def get_engine(self, model_name: str, engine: str):
+        """LLMEngine with model_name loaded, loading it on first use."""
+        key = (model_name, engine)
+        with self._engines_lock:
+            if key not in self.engines:
+                from llm_engines import LLMEngine
+
+                llm = LLMEngine()
+                llm.load_model(model_name=model_name, engine=engine, use_cache=False, **self.vlm_kwargs)
+                self.engines[key] = llm
+                logging.info(f"Loaded VLM {model_name} ({engine})")
+            return self.engines[key]
+
+    def render(
+        self,
+        tasks: List[Dict[str, Any]],
+        img_output_path: str,
+        non_renderable_output_dir: str,
+        save_non_renderable_files: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Render tasks like `structeval render` and return them."""
+        os.makedirs(img_output_path, exist_ok=True)
+        os.makedirs(non_renderable_output_dir, exist_ok=True)
+
+        async def job():
+            async with self._render_lock:
+                for task in tasks:
+                    await render_task(task, img_output_path, non_renderable_output_dir, save_non_renderable_files)
+            return tasks
+
+        return self._run(job())
+
+    def evaluate(
+        self,
+        tasks: List[Dict[str, Any]],
+        img_path: str,
+        vlm_model_name: Optional[str] = None,
+        vlm_engine: Optional[str] = None,
+        non_renderable_output_dir: Optional[str] = None,
+        streaming_validation: bool = False,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        """Evaluate rendered tasks like `structeval evaluate` and return the results."""
+        vlm_model_name = vlm_model_name or self.vlm_model_name
+        vlm_engine = vlm_engine or self.vlm_engine
+        if vlm_model_name and vlm_engine:
+            kwargs["llm"] = self.get_engine(vlm_model_name, vlm_engine)
+
+        images = {
+            item["task_id"]: f"{img_path}/{item['task_id']}.png"
+            for item in tasks
+            if os.path.exists(f"{img_path}/{item['task_id']}.png")
+        }
+        non_renderable_dir = non_renderable_output_dir or os.path.join(
+            os.path.dirname(img_path), "non_renderable_format_files"
+        )
+        return evaluate_dataset(
+            tasks,
+            images,
+            vlm_model_name,
+            vlm_engine,
+            non_renderable_dir=non_renderable_dir,
+            streaming_validation=streaming_validation,
+            **kwargs,
+        )
+
+    def pipeline(
+        self,
+        tasks: List[Dict[str, Any]],
+        img_output_path: str,
+        non_renderable_output_dir: str,
+        vlm_model_name: Optional[str] = None,
+        vlm_engine: Optional[str] = None,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        """Render and evaluate in one pass like `structeval pipeline`."""
+        vlm_model_name = vlm_model_name or self.vlm_model_name
+        vlm_engine = vlm_engine or self.vlm_engine
+        if vlm_model_name and vlm_engine:
+            kwargs["llm"] = self.get_engine(vlm_model_name, vlm_engine)
+
+        async def job():
+            async with self._render_lock:
+                return await render_and_evaluate(
+                    tasks, img_output_path, non_renderable_output_dir, vlm_model_name, vlm_engine, **kwargs
+                )
+
+        return self._run(job())
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API:
+      GET  /health                            warm resources and loaded VLMs
+      POST /render, /evaluate, /pipeline      run a job, the body holds the
+           command's options plus "tasks" (inline) or "input_path", and an
+           optional "output_path" to also write the results to
+    """
+
+    server_version = "StructEval"
+    structeval: StructEvalServer = None
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            return self._reply(404, {"error": f"Unknown endpoint {self.path}"})
+        self._reply(200, {
+            "status": "ok",
+            "warm": self.structeval.warm,
+            "vlms": [list(key) for key in self.structeval.engines],
+        })
+
+    def do_POST(self):
+        jobs = {
+            "/render": self.structeval.render,
+            "/evaluate": self.structeval.evaluate,
+            "/pipeline": self.structeval.pipeline,
+        }
+        job = jobs.get(self.path.rstrip("/"))
+        if job is None:
+            return self._reply(404, {"error": f"Unknown endpoint {self.path}"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            options = json.loads(self.rfile.read(length) or b"{}")
+            input_path = options.pop("input_path", None)
+            output_path = options.pop("output_path", None)
+            tasks = options.pop("tasks", None)
+            if tasks is None and input_path:
+                with open(input_path, "r", encoding="utf-8") as f:
+                    tasks = json.load(f)
+            if not isinstance(tasks, list):
+                raise ValueError('Pass the tasks as "tasks" or "input_path"')
+            inspect.signature(job).bind(tasks, **options)
+        except (ValueError, TypeError, OSError) as e:
+            return self._reply(400, {"error": str(e)})
+
+        start = time.time()
+        try:
+            results = job(tasks, **options)
+        except Exception as e:
+            logging.exception(f"{self.path} job failed")
+            return self._reply(500, {"error": str(e)})
+
+        if output_path:
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        self._reply(200, {"results": results, "seconds": round(time.time() - start, 3)})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_forever(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[str] = None,
+    **server_kwargs,
+) -> None:
+    """
+    Start a StructEvalServer and answer API requests until interrupted.
+
+    Args:
+        host: Interface to listen on (local only by default)
+        port: TCP port
+        unix_socket: Listen on this Unix socket path instead of TCP
+        server_kwargs: Options of StructEvalServer
+    """
+    structeval = StructEvalServer(**server_kwargs)
+    structeval.start()
+    handler = type("RequestHandler", (_RequestHandler,), {"structeval": structeval})
+
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        httpd = _UnixHTTPServer(unix_socket, handler)
+        address = f"unix:{unix_socket}"
+    else:
+        httpd = ThreadingHTTPServer((host, port), handler)
+        address = f"http://{host}:{port}"
+
+    print(f"StructEval server listening on {address}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        structeval.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
@@ -0,0 +1,113 @@
+import os
+import hashlib
+from typing import Any, Dict, List
+from render_engine.render_utils import determine_output_type
+
+# Relative render + evaluation cost per output type (determine_output_type
+# names), used to balance shards. Angular builds a project per task, the other
+# frameworks start a dev page, non-renderable types are only parsed.
+SHARD_COST_BY_TYPE = {
+    "angular": 20.0,
+    "react": 4.0,
+    "vue": 4.0,
+    "latex": 3.0,
+    "tikz": 3.0,
+    "typst": 2.5,
+    "matplotlib": 2.5,
+    "mermaid": 2.5,
+    "vega": 2.5,
+    "html": 2.0,
+    "svg": 2.0,
+    "canvas": 2.0,
+    "markdown": 2.0,
+}
+DEFAULT_SHARD_COST = 1.0
+
+
+def stable_hash(task_id: str) -> int:
+    """Hash of a task_id that is the same on every machine and Python run."""
+    return int.from_bytes(hashlib.sha1(task_id.encode("utf-8")).digest()[:8], "big")
+
+
+def _shard_key(task: Dict[str, Any]) -> str:
+    # All samples of a task stay together
+    return task.get("base_task_id", task["task_id"])
+
+
+def task_cost(task: Dict[str, Any]) -> float:
+    return SHARD_COST_BY_TYPE.get(determine_output_type(_shard_key(task)), DEFAULT_SHARD_COST)
+
+
+def assign_shards(tasks: List[Dict[str, Any]], num_shards: int, balance: bool = False) -> List[int]:
+    """
+    Shard of every task.
+
+    Args:
+        tasks: Tasks of the full dataset
+        num_shards: Number of shards
+        balance: Balance the expected cost per shard instead of the task count
+
+    Returns:
+        Shard index per task, in the order of tasks
+    """
+    keys = [_shard_key(task) for task in tasks]
+    if not balance:
+        return [stable_hash(key) % num_shards for key in keys]
+
+    # Largest cost first onto the least loaded shard; ties are broken by the
+    # hash, so the assignment only depends on the set of tasks
+    groups: Dict[str, List[int]] = {}
+    for idx, key in enumerate(keys):
+        groups.setdefault(key, []).append(idx)
+    order = sorted(
+        groups,
+        key=lambda key: (-sum(task_cost(tasks[idx]) for idx in groups[key]), stable_hash(key), key),
+    )
+    loads = [0.0] * num_shards
+    shards = [0] * len(tasks)
+    for key in order:
+        target = min(range(num_shards), key=lambda shard: (loads[shard], shard))
+        for idx in groups[key]:
+            shards[idx] = target
+            loads[target] += task_cost(tasks[idx])
+    return shards
+
+
+def select_shard(
+    tasks: List[Dict[str, Any]],
+    shard_index: int,
+    num_shards: int,
+    balance: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Tasks of one shard, each marked with "shard": "{index}/{num_shards}".
+    Tasks already marked for num_shards shards (the output of an earlier
+    sharded stage) keep their shard, so later stages select the same tasks.
+
+    Args:
+        tasks: Tasks of the dataset (or of an earlier stage's output)
+        shard_index: Shard to select, 0-based
+        num_shards: Number of shards
+        balance: Balance the expected cost per shard (see assign_shards)
+
+    Returns:
+        The shard's tasks in their original order
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+
+    if tasks and all(str(task.get("shard", "")).endswith(f"/{num_shards}") for task in tasks):
+        return [task for task in tasks if task["shard"] == f"{shard_index}/{num_shards}"]
+
+    selected = []
+    for task, shard in zip(tasks, assign_shards(tasks, num_shards, balance)):
+        if shard == shard_index:
+            task["shard"] = f"{shard_index}/{num_shards}"
+            selected.append(task)
+    return selected
+
+
+def shard_path(path: str, shard_index: int, num_shards: int) -> str:
+    """File of one shard: results.json -> results.shard2-of-8.json."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_index}-of-{num_shards}{ext}"
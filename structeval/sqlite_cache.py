@@ -0,0 +1,68 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Base of the on-disk caches (generations, VQA verdicts, parsed structures):
+# one SQLite table keyed by a content hash, shared by the threads of a run.
+
+
+class SQLiteCache:
+    """
+    SQLite-backed key-value cache, safe to share between threads.
+
+    Subclasses set the table, its columns between the key and the creation
+    time, and the column get() returns.
+
+    Args:
+        path: SQLite database file
+    """
+
+    table: str = ""
+    columns: Tuple[str, ...] = ()
+    value_column: str = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            f"(key TEXT PRIMARY KEY, {', '.join(self.columns)}, created REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self.value_column} FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def _put(self, key: str, values: Tuple[Any, ...]) -> None:
+        """Store a row; values fill the subclass columns in order."""
+        placeholders = ", ".join("?" * (len(values) + 2))
+        with self._lock:
+            try:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})",
+                    (key, *values, time.time()),
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to write {self.table} cache entry: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
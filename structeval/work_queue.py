@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import socket
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from sharding import task_cost
+from server import StructEvalServer
+
+# Durable queue of render + evaluation jobs, one job per task, shared by any
+# number of `structeval worker` processes. A worker leases jobs for a
+# visibility timeout and keeps extending the lease while it works; the lease
+# of a worker that died runs out and the job is handed to the next worker.
+# Expensive output types are leased first so they do not trail the run.
+#
+# The database uses SQLite's rollback journal rather than WAL, so workers on
+# several machines can share it on a filesystem with working POSIX locks.
+
+JOB_STATES = ("pending", "leased", "done", "failed")
+
+
+class WorkQueue:
+    """
+    SQLite-backed job queue with leases.
+
+    Args:
+        path: SQLite database file
+        visibility_timeout: Seconds a lease lasts unless extended
+        max_attempts: Leases of a job before it is marked failed
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit; write transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, task_id TEXT UNIQUE, payload TEXT, cost REAL, "
+            "state TEXT, worker TEXT, lease_expires REAL, attempts INTEGER DEFAULT 0, "
+            "result TEXT, error TEXT, updated REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, cost DESC, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _write(self, fn):
+        """Run fn(conn) in one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def publish(self, tasks: List[Dict[str, Any]], options: Dict[str, Any]) -> int:
+        """
+        Add a job per task and store the options workers run them with.
+        Tasks already in the queue are kept as they are, so publishing the
+        same input again only adds what is missing.
+
+        Returns:
+            Number of jobs added
+        """
+        now = time.time()
+
+        def publish(conn):
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('options', ?)", (json.dumps(options),))
+            added = 0
+            for task in tasks:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (task_id, payload, cost, state, updated) VALUES (?, ?, ?, 'pending', ?)",
+                    (task["task_id"], json.dumps(task), task_cost(task), now),
+                )
+                added += cursor.rowcount
+            return added
+
+        return self._write(publish)
+
+    def options(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'options'").fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def lease(self, worker: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        Lease up to limit jobs: pending ones, and leased ones whose lease ran
+        out. A job whose lease ran out max_attempts times is marked failed.
+
+        Returns:
+            [{"id": ..., "task": ...}] of the leased jobs
+        """
+        now = time.time()
+
+        def lease(conn):
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'lease expired', worker = NULL, updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT id, payload FROM jobs "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY cost DESC, id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            for job_id, _ in rows:
+                conn.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker, now + self.visibility_timeout, now, job_id),
+                )
+            return [{"id": job_id, "task": json.loads(payload)} for job_id, payload in rows]
+
+        return self._write(lease)
+
+    def extend(self, job_ids: List[int], worker: str) -> int:
+        """Extend the leases worker still holds; returns how many it holds."""
+        now = time.time()
+
+        def extend(conn):
+            held = 0
+            for job_id in job_ids:
+                cursor = conn.execute(
+                    "UPDATE jobs SET lease_expires = ?, updated = ? "
+                    "WHERE id = ? AND state = 'leased' AND worker = ?",
+                    (now + self.visibility_timeout, now, job_id, worker),
+                )
+                held += cursor.rowcount
+            return held
+
+        return self._write(extend)
+
+    def complete(self, job_id: int, result: Dict[str, Any]) -> bool:
+        """
+        Store the result of a job. A job whose lease was reclaimed still
+        accepts the result until another worker completes it first.
+        """
+
+        def complete(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'done', result = ?, error = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state IN ('pending', 'leased')",
+                (json.dumps(result), time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+        return self._write(complete)
+
+    def fail(self, job_id: int, worker: str, error: str) -> None:
+        """Release a job after an error; it is retried until max_attempts."""
+
+        def fail(conn):
+            conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, worker = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                (self.max_attempts, error, time.time(), job_id, worker),
+            )
+
+        self._write(fail)
+
+    def reset_failed(self) -> int:
+        """Put failed jobs back to pending with fresh attempts."""
+
+        def reset(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, error = NULL, updated = ? WHERE state = 'failed'",
+                (time.time(),),
+            )
+            return cursor.rowcount
+
+        return self._write(reset)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(rows)
+        return counts
+
+    def results(self) -> List[Dict[str, Any]]:
+        """
+        Results in publish order. Jobs without a result are returned as
+        published, failed ones with their last error in "queue_error".
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT payload, state, result, error FROM jobs ORDER BY id").fetchall()
+        results = []
+        for payload, state, result, error in rows:
+            item = json.loads(result if state == "done" else payload)
+            if state == "failed":
+                item["queue_error"] = error
+            results.append(item)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _run_jobs(
+    server: StructEvalServer,
+    jobs: List[Dict[str, Any]],
+    img_output_path: str,
+    non_renderable_output_dir: str,
+    options: Dict[str, Any],
+) -> List[tuple]:
+    """
+    (job, result or exception) per job. A failed batch is rerun job by job,
+    so one broken task does not fail the others.
+    """
+    tasks = [job["task"] for job in jobs]
+    try:
+        return list(zip(jobs, server.pipeline(tasks, img_output_path, non_renderable_output_dir, **options)))
+    except Exception as e:
+        if len(jobs) == 1:
+            return [(jobs[0], e)]
+    finished = []
+    for job in jobs:
+        finished.extend(_run_jobs(server, [job], img_output_path, non_renderable_output_dir, options))
+    return finished
+
+
+def run_worker(
+    queue_path: str,
+    worker_id: Optional[str] = None,
+    batch_size: int = 1,
+    poll_interval: float = 5.0,
+    exit_when_empty: bool = True,
+    visibility_timeout: float = 300.0,
+    max_attempts: int = 3,
+    warm_angular: bool = True,
+    warm_latex: bool = True,
+) -> Dict[str, int]:
+    """
+    Lease jobs from the queue and render and evaluate them until the queue
+    is drained, on warm resources (see StructEvalServer). Leases are extended
+    in the background while a batch runs, so only a dead worker loses them.
+
+    Args:
+        queue_path: SQLite file of the queue
+        worker_id: Name recorded on leases (default: host-pid)
+        batch_size: Jobs leased at once; their VQA requests run concurrently
+        poll_interval: Seconds between polls while other workers hold the remaining jobs
+        exit_when_empty: Exit once no job is pending or leased; False keeps polling
+        visibility_timeout: Seconds a lease lasts without being extended
+        max_attempts: Leases of a job before it is marked failed
+
+    Returns:
+        Number of jobs this worker completed and failed
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    work_queue = WorkQueue(queue_path, visibility_timeout, max_attempts)
+    options = work_queue.options()
+    if not options:
+        raise ValueError(f"{queue_path} has no published jobs")
+
+    options = dict(options)
+    server = StructEvalServer(
+        options.pop("vlm_model_name", None),
+        options.pop("vlm_engine", None),
+        warm_angular=warm_angular,
+        warm_latex=warm_latex,
+    )
+    server.start()
+    img_output_path = options.pop("img_output_path")
+    non_renderable_output_dir = options.pop("non_renderable_output_dir")
+
+    stats = {"completed": 0, "failed": 0}
+    try:
+        while True:
+            jobs = work_queue.lease(worker_id, batch_size)
+            if not jobs:
+                counts = work_queue.counts()
+                if exit_when_empty and counts["pending"] == 0 and counts["leased"] == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            job_ids = [job["id"] for job in jobs]
+            done = threading.Event()
+
+            def heartbeat():
+                while not done.wait(visibility_timeout / 3):
+                    if work_queue.extend(job_ids, worker_id) < len(job_ids):
+                        logging.warning(f"{worker_id}: lost the lease of some of jobs {job_ids}")
+
+            beat = threading.Thread(target=heartbeat, name="structeval-lease", daemon=True)
+            beat.start()
+            try:
+                finished = _run_jobs(server, jobs, img_output_path, non_renderable_output_dir, options)
+            finally:
+                done.set()
+                beat.join()
+
+            for job, result in finished:
+                if isinstance(result, Exception):
+                    logging.error(f"{worker_id}: job {job['id']} ({job['task']['task_id']}) failed: {result}")
+                    work_queue.fail(job["id"], worker_id, f"{type(result).__name__}: {result}")
+                    stats["failed"] += 1
+                elif work_queue.complete(job["id"], result):
+                    stats["completed"] += 1
+            counts = work_queue.counts()
+            print(
+                f"{worker_id}: {stats['completed']} jobs done here; queue: {counts['done']} done, "
+                f"{counts['pending']} pending, {counts['leased']} leased, {counts['failed']} failed"
+            )
+    finally:
+        server.close()
+        work_queue.close()
+    return stats
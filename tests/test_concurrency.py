@@ -0,0 +1,84 @@
+"""
+A None from llm_engines' call_model is a failed request: the limiter must
+retry it within its own budget, and a hedged request must let the other
+response win.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from concurrency import AdaptiveLimiter, Hedger, take_retry_budget  # noqa: E402
+
+
+def counting(result):
+    calls = []
+
+    def fn(*args, **kwargs):
+        calls.append(args)
+        return result
+
+    return fn, calls
+
+
+def test_limiter_retries_none_up_to_budget():
+    fn, calls = counting(None)
+    limiter = AdaptiveLimiter(2, max_retries=3, backoff_base=0.001, report_interval=0)
+    assert limiter.call(fn, "messages") is None
+    assert len(calls) == 4
+    assert limiter.failed == 4
+
+
+def test_limiter_returns_first_response():
+    fn, calls = counting("text")
+    limiter = AdaptiveLimiter(2, report_interval=0)
+    assert limiter.call(fn, "messages") == "text"
+    assert len(calls) == 1
+
+
+def test_retry_budget_replaces_engine_retries():
+    kwargs = {"max_retry": 2, "api_key": "k"}
+    assert take_retry_budget(kwargs) == 2
+    # Removed so the engine makes one attempt per call
+    assert kwargs == {"api_key": "k"}
+    assert take_retry_budget({}) == 5
+
+
+def hedger():
+    hedger = Hedger(50, budget=1.0, min_samples=1)
+    hedger._latencies.extend([0.01] * 5)
+    return hedger
+
+
+def slow(result, delay=0.2):
+    def fn():
+        time.sleep(delay)
+        return result
+    return fn
+
+
+def test_hedge_returning_none_does_not_win():
+    assert hedger().call(slow("answer"), lambda: None) == "answer"
+
+
+def test_primary_returning_none_lets_hedge_win():
+    h = hedger()
+    assert h.call(slow(None, 0.05), slow("answer", 0.2)) == "answer"
+    assert h.hedges_won == 1
+
+
+def test_all_none_returns_none():
+    assert hedger().call(slow(None, 0.05), lambda: None) is None
+
+
+def test_error_raised_when_nothing_succeeds():
+    def boom():
+        raise ValueError("engine down")
+
+    with pytest.raises(ValueError):
+        hedger().call(slow(None, 0.05), boom)
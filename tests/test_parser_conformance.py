@@ -0,0 +1,106 @@
+"""
+Every parser backend in PARSER_BACKENDS must produce the same structure as
+the reference (last) backend of its format, or fail where it fails.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from eval_engine.eval_utils import PARSER_BACKENDS  # noqa: E402
+
+
+CORPUS = {
+    "json": {
+        "big_int": '{"id": 123456789012345678901234567890, "neg": -98765432109876543210}',
+        "int64_edges": '[9223372036854775807, -9223372036854775808, 18446744073709551615]',
+        "duplicate_keys": '{"a": 1, "b": 2, "a": 3}',
+        "nan_infinity": '{"x": NaN, "y": Infinity, "z": -Infinity}',
+        "floats": '[1.0, 1e400, -0.0, 0.1, 1E-7]',
+        "unicode": '{"name": "caf\\u00e9 \\ud83d\\ude00", "raw": "日本"}',
+        "nested": '{"a": [{"b": {"c": [null, true, false, ""]}}]}',
+        "top_level_scalar": '"just a string"',
+        "trailing_comma": '{"a": 1,}',
+        "empty": "",
+    },
+    "yaml": {
+        "anchors": "base: &b\n  x: 1\n  y: [1, 2]\ncopy: *b\nother:\n  <<: *b\n  y: 3\n",
+        "dates": "day: 2024-02-29\nstamp: 2001-12-14t21:59:43.10-05:00\nnaive: 2001-12-14 21:59:43\nquoted: '2024-02-29'\n",
+        "scalars": "a: yes\nb: off\nc: ~\nd: 0o17\ne: 0x1F\nf: 1_000\ng: .inf\nh: -.NaN\ni: 1e3\n",
+        "block_strings": "lit: |\n  line one\n  line two\nfolded: >-\n  folded\n  text\n",
+        "multi_document": "a: 1\n---\nb: 2\n",
+        "duplicate_keys": "a: 1\na: 2\n",
+        "unicode": "name: \"caf\\u00e9\"\nraw: 日本\n",
+        "bad_indent": "a:\n  b: 1\n c: 2\n",
+    },
+    "toml": {
+        "datetimes": (
+            "odt = 1979-05-27T07:32:00Z\n"
+            "offset = 1979-05-27T00:32:00.999999-07:00\n"
+            "ldt = 1979-05-27T07:32:00\n"
+            "ld = 1979-05-27\n"
+            "lt = 07:32:00\n"
+        ),
+        "tables": '[server]\nhost = "a"\n[server.limits]\nmax = 10\n[[items]]\nn = 1\n[[items]]\nn = 2\n',
+        "inline": 'point = { x = 1, y = 2 }\nmixed = [1, 2, 3]\nnested = [[1, 2], ["a"]]\n',
+        "numbers": "hex = 0xDEADBEEF\noct = 0o755\nbin = 0b1101\nunderscore = 1_000\nflt = 6.626e-34\ninf = inf\n",
+        "strings": 'basic = "tab\\there"\nliteral = \'C:\\path\'\nmulti = """\nline\nnext"""\n',
+        "duplicate_keys": "a = 1\na = 2\n",
+        "missing_value": "a =\n",
+    },
+    "xml": {
+        "mixed_content": "<p>Hello <b>bold</b> and <i>italic</i> world</p>",
+        "cdata": "<root><code><![CDATA[if (a < b && c > d) {}]]></code><text>x <![CDATA[<y>]]> z</text></root>",
+        "attributes": '<root id="1" lang="en"><item key="a">v</item><empty flag="true"/></root>',
+        "repeated_tags": "<list><item>1</item><other>x</other><item>2</item><item>3</item></list>",
+        "repeated_with_attributes": '<list><item n="1"/><item n="2">two</item><item>three</item></list>',
+        "whitespace": "<root>\n  <a>  padded  </a>\n  <b>\n  </b>\n</root>",
+        "entities": "<root><a>&lt;tag&gt; &amp; &quot;q&quot; &#233;</a></root>",
+        "comments_and_pi": "<?xml version=\"1.0\"?><!-- c --><root><?pi data?><a>1</a><!-- d --></root>",
+        "namespaces": '<root xmlns:h="http://www.w3.org/TR/html4/"><h:td>cell</h:td></root>',
+        "unclosed": "<root><a>1</root>",
+    },
+    "csv": {
+        "quoted": 'name,note\n"Smith, J","said ""hi"""\nDoe,plain\n',
+        "ragged": "a,b\n1\n2,3,4\n",
+        "empty": "",
+    },
+}
+
+
+def _outcome(parse, text):
+    try:
+        return "ok", parse(text)
+    except Exception as e:
+        return "error", type(e).__name__
+
+
+def _cases():
+    return [
+        pytest.param(format_type, name, is_available, parse, text, id=f"{format_type}-{name}-{case}")
+        for format_type, backends in PARSER_BACKENDS.items()
+        for name, is_available, parse in backends[:-1]
+        for case, text in CORPUS.get(format_type, {}).items()
+    ]
+
+
+@pytest.mark.parametrize("format_type,name,is_available,parse,text", _cases())
+def test_backend_matches_reference(format_type, name, is_available, parse, text):
+    if not is_available():
+        pytest.skip(f"{name} is not installed")
+    reference = PARSER_BACKENDS[format_type][-1][2]
+    expected_status, expected = _outcome(reference, text)
+    status, result = _outcome(parse, text)
+    assert status == expected_status, f"{name}: {status} ({result!r}), reference: {expected_status} ({expected!r})"
+    if expected_status == "ok":
+        assert result == expected
+        assert type(result) is type(expected)
+
+
+@pytest.mark.parametrize("format_type", sorted(PARSER_BACKENDS))
+def test_corpus_covers_format(format_type):
+    assert CORPUS.get(format_type), f"no conformance corpus for {format_type}"
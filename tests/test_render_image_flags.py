@@ -0,0 +1,96 @@
+"""
+analyze_render_image must flag screenshots that cannot support any VQA
+answer (blank pages, renderer error screens) and nothing else.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from render_engine.render_utils import ERROR_BANNERS, analyze_render_image  # noqa: E402
+
+
+def mermaid_error_screen():
+    """
+    The 1280x720 page render_mermaid screenshots when a diagram fails:
+    body padding 32px, the #f8f8f8 container holding the syntax error, and
+    the ".render-error" status box 20px below it.
+    """
+    img = Image.new("RGB", (1280, 720), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((32, 32, 1247, 32 + 2 + 40 + 32), fill=(0xF8, 0xF8, 0xF8), outline=(0xCC, 0xCC, 0xCC))
+    draw.text((53, 53), "Syntax error in mermaid diagram:", fill="black")
+    draw.text((53, 69), "Parse error on line 2: Expecting 'SEMI', 'NEWLINE', got 'ARROW'", fill="black")
+    top = 32 + 2 + 40 + 32 + 20
+    draw.rectangle((32, top, 1247, top + 38), fill=(0xF2, 0xDE, 0xDE))
+    draw.text((42, top + 12), "Error: Parse error on line 2", fill=(0xA9, 0x44, 0x42))
+    return img
+
+
+def mermaid_diagram():
+    img = Image.new("RGB", (1280, 720), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((100, 100, 300, 160), fill=(0xEC, 0xEC, 0xFF), outline=(0x93, 0x70, 0xDB))
+    draw.line((300, 130, 500, 130), fill=(0x33, 0x33, 0x33), width=2)
+    draw.rectangle((500, 100, 700, 160), fill=(0xEC, 0xEC, 0xFF), outline=(0x93, 0x70, 0xDB))
+    draw.text((150, 125), "Start", fill="black")
+    draw.text((560, 125), "End", fill="black")
+    return img
+
+
+def sparse_render():
+    img = Image.new("RGB", (1280, 2000), "white")
+    img.putpixel((640, 1000), (0, 0, 0))
+    img.putpixel((641, 1000), (0, 0, 0))
+    return img
+
+
+@pytest.fixture
+def save(tmp_path):
+    def save(img, name="render.png"):
+        path = tmp_path / name
+        img.save(path)
+        return str(path)
+    return save
+
+
+def test_mermaid_error_screen_is_flagged(save):
+    assert analyze_render_image(save(mermaid_error_screen()), "mermaid") == "error_banner"
+
+
+def test_mermaid_banner_threshold_is_measured():
+    (color, min_ratio), = ERROR_BANNERS["mermaid"][0]
+    img = mermaid_error_screen()
+    # The banner is looked for on the image downscaled to 512px
+    img.thumbnail((512, 512))
+    ratio = (np.asarray(img) == color).all(axis=2).mean()
+    # Well above the threshold, so a longer error message cannot push it under
+    assert ratio >= 4 * min_ratio
+
+
+def test_mermaid_diagram_is_usable(save):
+    assert analyze_render_image(save(mermaid_diagram()), "mermaid") is None
+
+
+def test_error_banner_only_checked_for_its_type(save):
+    assert analyze_render_image(save(mermaid_error_screen()), "html") is None
+
+
+@pytest.mark.parametrize("size", [(1280, 720), (1, 1)])
+def test_white_page_is_blank(save, size):
+    assert analyze_render_image(save(Image.new("RGB", size, "white"))) == "blank"
+
+
+def test_sparse_render_is_usable(save):
+    assert analyze_render_image(save(sparse_render())) is None
+
+
+@pytest.mark.parametrize("color", [(0x26, 0x26, 0x26), (0x1E, 0x90, 0xFF)])
+def test_solid_colour_render_is_usable(save, color):
+    assert analyze_render_image(save(Image.new("RGB", (800, 600), color)), "angular") is None
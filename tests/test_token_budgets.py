@@ -0,0 +1,38 @@
+"""
+scripts/token_budgets.py must derive per-type budgets from completed
+generations only, in the format `--max_tokens` reads.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from token_budgets import budgets, percentile, token_lengths  # noqa: E402
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([7], 95) == 7
+
+
+def test_budgets_skip_cut_generations_and_rare_types(tmp_path):
+    rows = [
+        {"task_id": f"0005{i:02d}", "generation": "x" * 350 * (i + 1), "generation_stop": "stop"}
+        for i in range(20)
+    ]
+    # Cut by its budget, so its length says nothing about a complete answer
+    rows.append({"task_id": "000599", "generation": "x" * 350000, "generation_stop": "max_tokens"})
+    rows.append({"task_id": "001800", "generation": "x" * 350, "generation_stop": "stop"})
+    rows.append({"task_id": "000598", "generation": None, "generation_stop": None})
+    path = tmp_path / "output.json"
+    path.write_text(json.dumps(rows))
+
+    lengths = token_lengths([str(path)])
+    assert len(lengths["json"]) == 20 and len(lengths["yaml"]) == 1
+    # p95 of 100..2000 tokens is 1900, x1.5 headroom rounded up to 256
+    assert budgets(lengths) == {"json": 3072}
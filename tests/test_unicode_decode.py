@@ -0,0 +1,55 @@
+"""
+safe_unicode_decode must decode escapes without touching real non-ASCII
+text, and the non-renderable path must keep leaving text with an invalid
+escape undecoded, so its render_score does not change.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from render_engine.render_utils import extract_code_and_save, safe_unicode_decode  # noqa: E402
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("a\\nb\\tc", "a\nb\tc"),
+    ("caf\\u00e9 \\x41 \\101", "café A A"),
+    ("\\ud83d\\ude00", "\U0001F600"),
+    ("\\N{BULLET} item", "\u2022 item"),
+    ("日本 \\n café", "日本 \n café"),
+    ("regex \\d+ \\s", "regex \\d+ \\s"),
+    ("&lt;div&gt;\\n", "<div>\n"),
+])
+def test_decodes_escapes(text, expected):
+    assert safe_unicode_decode(text) == expected
+    assert safe_unicode_decode(text, partial=False) == expected
+
+
+def test_text_without_escapes_is_returned_as_is():
+    text = "plain 日本 text " * 1000
+    assert safe_unicode_decode(text) is text
+
+
+@pytest.mark.parametrize("text", ["bad \\x4 then \\n", "bad \\u12 then \\n", "trailing \\n\\"])
+def test_invalid_escape(text):
+    # Partial decoding keeps the invalid escape and decodes the others
+    assert "\n" in safe_unicode_decode(text)
+    # All-or-nothing leaves the whole text undecoded
+    assert safe_unicode_decode(text, partial=False) == text
+
+
+def test_non_renderable_keeps_text_with_invalid_escape():
+    generation = '```json\n{"path": "C:\\x4", "note": "line\\nbreak"}\n```'
+    code, _, success = extract_code_and_save(generation, "000500", None)
+    assert success
+    assert code == '{"path": "C:\\x4", "note": "line\\nbreak"}'
+
+
+def test_non_renderable_decodes_valid_escapes():
+    generation = '```yaml\\nname: caf\\u00e9\\ncity: 東京\\n```'
+    code, _, _ = extract_code_and_save(generation, "001800", None)
+    assert code == "name: café\ncity: 東京"
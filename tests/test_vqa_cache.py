@@ -0,0 +1,103 @@
+"""
+VQACache must key verdicts by task, so tasks with the same image never
+share them, and a re-run must answer from the cache without asking the VLM.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import json
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from eval_engine.eval_vqa import VQA_DECODING_PARAMS, VQA_PROMPT_VERSION, vqa_eval  # noqa: E402
+from eval_engine.vqa_cache import VQACache  # noqa: E402
+
+QUESTIONS = [{"question": "Is there a title?", "answer": "Yes"}, {"question": "Is it red?", "answer": "No"}]
+
+
+def render(shift=0, speck=False):
+    img = Image.new("RGB", (320, 200), "white")
+    ImageDraw.Draw(img).rectangle((40 + shift, 40, 200 + shift, 120), fill=(30, 30, 30))
+    if speck:
+        # An anti-aliasing difference: one pixel a shade off
+        img.putpixel((250, 160), (245, 245, 245))
+    return img
+
+
+def key(cache, task_id, image, questions=QUESTIONS):
+    return cache.make_key(
+        task_id, "vlm", VQA_DECODING_PARAMS, cache.image_hash(image), VQA_PROMPT_VERSION, questions
+    )
+
+
+def test_key_depends_on_task_image_and_questions(tmp_path):
+    cache = VQACache(str(tmp_path / "vqa.sqlite"))
+    base = key(cache, "000100", render())
+    assert key(cache, "000100", render()) == base
+    assert key(cache, "000101", render()) != base
+    assert key(cache, "000100", render(shift=1)) != base
+    assert key(cache, "000100", render(), QUESTIONS[:1]) != base
+    cache.close()
+
+
+def test_phash_is_opt_in_and_still_per_task(tmp_path):
+    exact = VQACache(str(tmp_path / "exact.sqlite"))
+    phash = VQACache(str(tmp_path / "phash.sqlite"), "phash")
+    assert exact.image_hash(render()) != exact.image_hash(render(speck=True))
+    # Near-identical images share the hash, but not the verdicts of another task
+    assert phash.image_hash(render()) == phash.image_hash(render(speck=True))
+    assert key(phash, "000100", render()) != key(phash, "000101", render(speck=True))
+    with pytest.raises(ValueError):
+        VQACache(str(tmp_path / "bad.sqlite"), "fuzzy")
+
+
+def test_verdicts_persist_across_instances(tmp_path):
+    path = str(tmp_path / "vqa.sqlite")
+    cache = VQACache(path)
+    cache.put(key(cache, "000100", render()), "vlm", cache.image_hash(render()), [True, None])
+    cache.close()
+
+    cache = VQACache(path)
+    assert cache.get(key(cache, "000100", render())) == [True, None]
+    assert cache.get(key(cache, "000101", render())) is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+class CountingVLM:
+    """Stands in for a loaded LLMEngine: answers yes to question 1 only."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def call_model(self, model_name, messages, **kwargs):
+        self.calls += 1
+        return json.dumps({"1": True, "2": False})
+
+
+def test_rerun_is_answered_from_cache(tmp_path):
+    image_path = str(tmp_path / "render.png")
+    render().save(image_path)
+    # Two tasks rendering the same image
+    images = {"000100": image_path, "000101": image_path}
+    cache_path = str(tmp_path / "vqa.sqlite")
+
+    def run(vlm):
+        data = [{"task_id": task_id, "VQA": QUESTIONS} for task_id in images]
+        return vqa_eval("vlm", "fake", data, images, vqa_cache_path=cache_path, llm=vlm)
+
+    first = CountingVLM()
+    output = run(first)
+    # Same image, different tasks: both are asked
+    assert first.calls == 2
+    assert [item["VQA_cache_hit"] for item in output] == [False, False]
+
+    second = CountingVLM()
+    output = run(second)
+    assert second.calls == 0
+    assert [item["VQA_cache_hit"] for item in output] == [True, True]
+    assert [item["VQAeval"] for item in output] == [[True, False], [True, False]]
+    assert [item["VQA_score"] for item in output] == [0.5, 0.5]
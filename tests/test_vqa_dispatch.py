@@ -0,0 +1,94 @@
+"""
+vqa_eval sends the VLM requests of several tasks at once; whatever order
+they complete in, every task must get its own verdicts and the output must
+keep the order of the input.
+
+Run with `python -m pytest tests` from the repository root.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "structeval"))
+
+from eval_engine.eval_vqa import vqa_eval  # noqa: E402
+
+NUM_TASKS = 12
+NUM_QUESTIONS = 4
+
+
+class FakeVLM:
+    """
+    Stands in for a loaded LLMEngine. Task i answers its first i % 5
+    questions true, and later tasks answer sooner, so requests complete in
+    roughly the reverse of the order they were sent.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = []
+
+    def call_model(self, model_name, messages, **kwargs):
+        text = messages[0]["content"][0]["text"]
+        index = int(re.search(r"about task (\d+)", text).group(1))
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01 * (NUM_TASKS - index))
+        with self.lock:
+            self.in_flight -= 1
+            self.completed.append(index)
+        return json.dumps({str(q + 1): q < index % 5 for q in range(NUM_QUESTIONS)})
+
+
+def task(index):
+    questions = [{"question": f"Question {q} about task {index}?", "answer": "yes"} for q in range(NUM_QUESTIONS)]
+    return {"task_id": f"task{index:02d}", "VQA": questions}
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = {}
+    for index in range(NUM_TASKS):
+        img = Image.new("RGB", (200, 100), "white")
+        ImageDraw.Draw(img).rectangle((20, 20, 60 + 10 * index, 80), fill=(40, 40, 40))
+        path = tmp_path / f"task{index:02d}.png"
+        img.save(path)
+        paths[f"task{index:02d}"] = str(path)
+    return paths
+
+
+def expected_score(index):
+    return (index % 5) / NUM_QUESTIONS
+
+
+def check(output, vlm):
+    assert [item["task_id"] for item in output] == [f"task{i:02d}" for i in range(NUM_TASKS)]
+    for index, item in enumerate(output):
+        assert item["VQA_score"] == expected_score(index)
+        assert item["VQAeval"] == [q < index % 5 for q in range(NUM_QUESTIONS)]
+    # The requests really were concurrent and completed out of order
+    assert vlm.max_in_flight > 1
+    assert vlm.completed != sorted(vlm.completed)
+
+
+def test_scores_follow_their_tasks(images):
+    vlm = FakeVLM()
+    data = [task(i) for i in range(NUM_TASKS)]
+    output = vqa_eval("vlm", "fake", data, images, vqa_num_proc=4, llm=vlm)
+    check(output, vlm)
+
+
+def test_streamed_tasks_keep_their_order(images):
+    # The pipeline feeds tasks as they are rendered, without a length
+    vlm = FakeVLM()
+    output = vqa_eval("vlm", "fake", (task(i) for i in range(NUM_TASKS)), images, vqa_num_proc=4, llm=vlm)
+    check(output, vlm)